@@ -4,40 +4,40 @@ from __future__ import division
 
 import itertools as it
 import json
+import threading
+import time
+import warnings
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 import arrow
 import requests
+from requests.adapters import HTTPAdapter
 from requests.exceptions import HTTPError
+try:
+    from urllib3.util.retry import Retry
+except ImportError:
+    from requests.packages.urllib3.util.retry import Retry
 import pandas as pd
 import numpy as np
 
 from os.path import dirname, abspath
 
-_hero_path = dirname(abspath(__file__)) + "/heroes_parsed.json"
-_current_hero_path = dirname(abspath(__file__)) + "/current_heroes.json"
-_abilities_path = dirname(abspath(__file__)) + "/abilities_parsed.json"
-_items_path = dirname(abspath(__file__)) + "/items_parsed.json"
-
-with open(_hero_path) as f:
-    _heroes = json.load(f)
-    _hero_roles = {x: _heroes[x].get('Role') for x in _heroes}
-    _hero_roles = {hero: role.split(',') for hero, role in _hero_roles.items()
-                   if role is not None}  # drops base
-    # updated hero list
-with open(_current_hero_path) as f:
-    d = json.load(f)['heroes']
-    _hero_names_to_id = {x['name'].split('npc_dota_hero_')[1]: x['id'] for x in d}
-    _hero_id_to_names = {v: k for k, v in _hero_names_to_id.items()}
-
-with open(_abilities_path) as f:
-    _abilities = json.load(f)
-    _ability_id_to_name = {v['ID']: k for k, v in _abilities.items()}
-    _ability_name_to_id = {k: v['ID'] for k, v in _abilities.items()}
-
-with open(_items_path) as f:
-    _items = json.load(f)
-    _item_id_to_name = {v['ID']: k for k, v in _items.items()}
-    _item_name_to_id = {k: v['ID'] for k, v in _items.items()}
+from dota import static, registry
+from dota.cache import ResponseCache
+
+_hero_path = static.SOURCES['heroes']
+_current_hero_path = static.SOURCES['current_heroes']
+_abilities_path = static.SOURCES['abilities']
+_items_path = static.SOURCES['items']
+
+
+def __getattr__(name):
+    # static tables (_heroes, _hero_names_to_id, ...) load on first access
+    try:
+        return static.load(name)
+    except KeyError:
+        raise AttributeError("module {!r} has no attribute {!r}".format(
+            __name__, name))
 
 
 try:
@@ -47,6 +47,12 @@ except ImportError:
 
 _PRIVATE = 4294967295  # privacy option in client
 
+REPORT_KEYS = ['level', 'kills', 'deaths', 'assists',
+               'last_hits', 'denies', 'gold', 'gold_spent', 'player_slot',
+               'account_id', 'hero_damage', 'hero_healing',
+               'item_0', 'item_1', 'item_2', 'item_3', 'item_4',
+               'item_5']
+
 
 def flatten(iterable):
     return it.chain.from_iterable(iterable)
@@ -60,11 +66,84 @@ def id_32(id_64):
     return id_64 - 76561197960265728
 
 
+def _is_finished(resp):
+    """
+    Whether a GetMatchDetails result describes a game that has ended (and
+    so will never change).
+    """
+    return 'error' not in resp and 'radiant_win' in resp
+
+
+_clock = getattr(time, 'monotonic', time.time)
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket for rate limiting requests.
+
+    Parameters
+    ----------
+    rate : float
+        tokens (requests) refilled per second
+    capacity : int
+        maximum burst size. Defaults to 1, i.e. evenly spaced requests.
+
+    Notes
+    -----
+    Share a single bucket between all workers hitting the same API key.
+    """
+
+    def __init__(self, rate, capacity=1, clock=_clock, sleep=time.sleep):
+        if rate <= 0:
+            raise ValueError("rate must be positive. Got {}".format(rate))
+        self.rate = rate
+        self.capacity = capacity
+        self._clock = clock
+        self._sleep = sleep
+        self._tokens = capacity
+        self._last = clock()
+        self._lock = threading.Lock()
+
+    def acquire(self, n=1):
+        """
+        Block until ``n`` tokens are available and take them.
+        """
+        while True:
+            with self._lock:
+                now = self._clock()
+                self._tokens = min(self.capacity,
+                                   self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                if self._tokens >= n:
+                    self._tokens -= n
+                    return
+                wait = (n - self._tokens) / self.rate
+            self._sleep(wait)
+
+
 # MYSTEAMID = "76561198025007092"
 # LAST_MATCH_ID = "478948089"
 #-----------------------------------------------------------------------------
 
 
+class _BucketRetry(Retry):
+    """
+    Retry policy that takes a token from ``bucket`` before every retry, so
+    retried requests count against the same rate limit as first attempts.
+    """
+    bucket = None
+
+    def new(self, **kw):
+        new = super(_BucketRetry, self).new(**kw)
+        new.bucket = self.bucket
+        return new
+
+    def sleep(self, *args, **kwargs):
+        super(_BucketRetry, self).sleep(*args, **kwargs)
+        if self.bucket is not None:
+            self.bucket.acquire()
+
+
 class API:
     """
     The network side of things.
@@ -73,6 +152,19 @@ class API:
     Parameters
     ----------
     key: value API key
+    pool_size: int
+        maximum number of keep-alive connections kept open per host.
+        Set this to at least the number of threads sharing the API.
+    retries: int
+        number of times to retry a request that failed to connect or
+        returned one of ``RETRY_STATUSES``.
+    backoff_factor: float
+        sleep ``backoff_factor * 2 ** (n_retry - 1)`` seconds between retries.
+        ``Retry-After`` headers on 429s are respected.
+    rate: float, optional
+        maximum requests per second. Every attempt sent over the network,
+        retries included, takes a token from ``self.bucket``. Defaults to
+        no limit.
 
     Returns
     -------
@@ -81,17 +173,80 @@ class API:
     Notes
     -----
     Call specific keyword args should go into their respective functions.
+
+    All requests go through a single ``requests.Session`` so connections to
+    api.steampowered.com are reused. See ``connection_stats``.
     """
     HISTORY_URL = "https://api.steampowered.com/IDOTA2Match_570/GetMatchHistory/V001/"
     MATCH_URL = "https://api.steampowered.com/IDOTA2Match_570/GetMatchDetails/V001/"
     TEAM_URL = "https://api.steampowered.com/IDOTA2Match_570/GetTeamInfoByTeamID/v001/"
+    HEROES_URL = "https://api.steampowered.com/IEconDOTA2_570/GetHeroes/v0001/"
+    SEQUENCE_URL = "https://api.steampowered.com/IDOTA2Match_570/GetMatchHistoryBySequenceNum/V001/"
+    RETRY_STATUSES = (429, 500, 502, 503, 504)
 
-    def __init__(self, key):
+    def __init__(self, key, pool_size=10, retries=3, backoff_factor=0.5,
+                 rate=None, cache=None):
         self.key = key
+        if cache is not None and not isinstance(cache, ResponseCache):
+            cache = ResponseCache(cache)
+        self.cache = cache
+        self.bucket = TokenBucket(rate) if rate is not None else None
+        self.session = self._make_session(pool_size, retries, backoff_factor)
+
+    def _make_session(self, pool_size, retries, backoff_factor):
+        retry = _BucketRetry(total=retries, backoff_factor=backoff_factor,
+                             status_forcelist=self.RETRY_STATUSES,
+                             raise_on_status=False)
+        retry.bucket = self.bucket
+        # pool_connections is the number of *hosts* cached, which we leave
+        # at the default; pool_size bounds the connections kept per host.
+        adapter = HTTPAdapter(pool_maxsize=pool_size, max_retries=retry)
+        session = requests.Session()
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        return session
+
+    def _get(self, url, params):
+        """
+        GET ``url``, raising an HTTPError for any 4xx/5xx status left once
+        retries are exhausted.
+        """
+        if self.bucket is not None:
+            self.bucket.acquire()
+        r = self.session.get(url, params=params)
+        r.raise_for_status()
+        return r
+
+    def connection_stats(self):
+        """
+        Connection reuse for this API's session.
 
-        # ordinal times of patch releases (roughly)
-        _679 = 1381989600
-        _680 = 1390802400
+        Returns
+        -------
+        stats : dict
+            requests : number of HTTP requests sent (including retries)
+            connections : number of new connections (TCP + TLS handshakes)
+            reused : requests sent over an already open connection
+
+        Notes
+        -----
+        Counts come from the connection pools urllib3 currently holds. A
+        pool evicted from the pool manager (only after requests to more than
+        ``pool_connections`` distinct hosts) drops out of the totals.
+        """
+        n_requests, n_connections = 0, 0
+        adapters = {id(a): a for a in self.session.adapters.values()}
+        for adapter in adapters.values():
+            pools = adapter.poolmanager.pools
+            for pool_key in pools.keys():
+                pool = pools[pool_key]
+                n_requests += pool.num_requests
+                n_connections += pool.num_connections
+        return {'requests': n_requests, 'connections': n_connections,
+                'reused': n_requests - n_connections}
+
+    def close(self):
+        self.session.close()
 
     def get_match_history(self, **kwargs):
         """
@@ -135,33 +290,87 @@ class API:
                                       date_max=now.strftime('%s'))
 
         """
+        hist = HistoryAccumulator(helper=self)
+        for page in self.iter_history_pages(**kwargs):
+            hist.add(page)
+        return hist.result()
+
+    def iter_history_pages(self, **kwargs):
+        """
+        Lazily page through ``get_match_history``.
+
+        Takes the same parameters as ``get_match_history``. Each page is
+        requested only when the previous one has been consumed, so only
+        one page is held in memory.
+
+        Yields
+        ------
+        page : HistoryResponse
+            one response of at most 25 matches.
+        """
         # inpsect query so you can finish out the results.
         self.query = kwargs
         kwargs['key'] = self.key
-        r = requests.get(self.HISTORY_URL, params=kwargs)
-        hist = HistoryResponse(r.json()['result'], helper=self)
-        # at time of implementation the date_min/max kwargs are browken
-        # using start_at_match_id as a workaround
-        while (hist.results_remaining > 0 and
-               kwargs.get('matches_requested') is None):
-            new_kwargs = kwargs.copy()
-            new_start_match_id = min([m['match_id'] for m in hist.matches]) - 1
-            new_kwargs['start_at_match_id'] = new_start_match_id
-            r = requests.get(self.HISTORY_URL, params=new_kwargs)
-            hist += HistoryResponse(r.json()['result'], helper=self)
-        return hist
+        params = kwargs
+        while True:
+            r = self._get(self.HISTORY_URL, params)
+            page = HistoryResponse(r.json()['result'], helper=self)
+            yield page
+            # at time of implementation the date_min/max kwargs are browken
+            # using start_at_match_id as a workaround
+            if (page.results_remaining <= 0 or len(page) == 0 or
+                    kwargs.get('matches_requested') is not None):
+                break
+            params = kwargs.copy()
+            params['start_at_match_id'] = min(page.match_ids) - 1
+
+    def iter_matches(self, **kwargs):
+        """
+        Like ``iter_history_pages``, but yield the individual match dicts.
+        """
+        for page in self.iter_history_pages(**kwargs):
+            for match in page.matches:
+                yield match
 
     def get_match_details(self, match_id, **kwargs):
         kwargs['key'] = self.key
         kwargs['match_id'] = match_id
-        r = requests.get(self.MATCH_URL, params=kwargs)
-        if r.status_code == 503:
-            raise HTTPError
-        return DetailsResponse(r.json()['result'])
+        if self.cache is not None:
+            resp = self.cache.get(self.MATCH_URL, kwargs)
+            if resp is not None:
+                return DetailsResponse(resp)
+        r = self._get(self.MATCH_URL, kwargs)
+        resp = r.json()['result']
+        if self.cache is not None and _is_finished(resp):
+            self.cache.set(self.MATCH_URL, kwargs, resp)
+        return DetailsResponse(resp)
+
+    def get_match_history_by_seq_num(self, start_at_match_seq_num,
+                                     matches_requested=100, **kwargs):
+        """
+        Full match details for matches in the order they were recorded.
+
+        Parameters
+        ----------
+        start_at_match_seq_num : int
+            first sequence number to return (inclusive).
+        matches_requested : int
+            at most 100.
+
+        Returns
+        -------
+        matches : list of dict
+            each formatted like a GetMatchDetails result, sorted by
+            ``match_seq_num``. Empty when there are no newer matches.
+        """
+        kwargs['key'] = self.key
+        kwargs['start_at_match_seq_num'] = start_at_match_seq_num
+        kwargs['matches_requested'] = matches_requested
+        r = self._get(self.SEQUENCE_URL, kwargs)
+        return r.json()['result'].get('matches', [])
 
     def get_heroes(self, to_disk=False):
-        url = "https://api.steampowered.com/IEconDOTA2_570/GetHeroes/v0001/"
-        r = requests.get(url, params={'key': self.key})
+        r = self._get(self.HEROES_URL, {'key': self.key})
         if to_disk:
             with open(_hero_path, 'w') as f:
                 json.dump(r['result'], f)
@@ -204,7 +413,7 @@ class API:
         """
         params = {'key': self.key, 'start_at_team_id': id,
                   'teams_requested': 1}
-        r = requests.get(self.TEAM_URL, params=params)
+        r = self._get(self.TEAM_URL, params)
         return TeamResponse(r.json()['result']['teams'][0])
 
 
@@ -212,7 +421,29 @@ class Response:
     """
     The local side.
     """
-    pass
+    __slots__ = ()
+
+
+class _cached_slot:
+    """
+    Like a property, but the result is computed once and stored in the
+    slot named ``'_' + func.__name__``.
+    """
+
+    def __init__(self, func):
+        self.func = func
+        self.slot = '_' + func.__name__
+        self.__doc__ = func.__doc__
+
+    def __get__(self, obj, cls):
+        if obj is None:
+            return self
+        try:
+            return getattr(obj, self.slot)
+        except AttributeError:
+            value = self.func(obj)
+            setattr(obj, self.slot, value)
+            return value
 
 
 class HistoryResponse(Response):
@@ -270,25 +501,80 @@ class HistoryResponse(Response):
     def __len__(self):
         return len(self.match_ids)
 
-    def get_all_match_details(self, helper=None):
+    def get_all_match_details(self, helper=None, n_jobs=1, rate=4,
+                              bucket=None):
+        """
+        Fetch the details of every match in ``self.match_ids``.
 
-        import time
+        Parameters
+        ----------
+        helper : API
+            defaults to ``self.helper``
+        n_jobs : int
+            number of worker threads issuing requests. Defaults to 1.
+        rate : float
+            maximum requests per second, shared by all workers. Ignored if
+            ``helper`` was created with its own ``rate``.
+        bucket : TokenBucket, optional
+            use an existing bucket (e.g. one shared with other fetchers)
+            instead of creating one from ``rate``. Can't be combined with
+            a helper that has its own bucket.
+
+        Returns
+        -------
+        responses : dict
+            {match_id : DetailsResponse}. Matches raising an HTTPError
+            are skipped with a warning.
+
+        Notes
+        -----
+        When the helper has a bucket (``API(key, rate=...)``) every attempt
+        it sends, retries included, is throttled by it. Otherwise one token
+        is taken per match here, and retries made by the session go out
+        without waiting on the bucket.
+        """
         details = {}
         N = len(self.match_ids)
 
         helper = helper or self.helper
         self._check_helper(helper=helper)
+        if getattr(helper, 'bucket', None) is not None:
+            if bucket is not None:
+                raise ValueError("helper already throttles with its own "
+                                 "bucket; don't pass another.")
+        else:
+            bucket = bucket or TokenBucket(rate)
 
-        for i, match in enumerate(self.match_ids):
+        def fetch(match):
+            if bucket is not None:
+                bucket.acquire()
             try:
-                details[match] = helper.get_match_details(match)
+                return match, helper.get_match_details(match)
             except HTTPError:
-                import warnings
-                warnings.warn("HTTPError on {}".format(match))
-            time.sleep(.25)  # rate limiting
-            # TODO: progress bar
-            if round((i / N) * 100) % 10 == 0:
-                print("\rAdded {} ({}%)".format(match, 100 * i / N))
+                return match, None
+
+        if n_jobs == 1:
+            results = map(fetch, self.match_ids)
+        else:
+            pool = ThreadPoolExecutor(max_workers=n_jobs)
+            futures = [pool.submit(fetch, match) for match in self.match_ids]
+            results = (future.result() for future in as_completed(futures))
+
+        try:
+            for i, (match, dr) in enumerate(results):
+                if dr is None:
+                    warnings.warn("HTTPError on {}".format(match))
+                else:
+                    details[match] = dr
+                # TODO: progress bar
+                if round((i / N) * 100) % 10 == 0:
+                    print("\rAdded {} ({}%)".format(match, 100 * i / N))
+        finally:
+            if n_jobs != 1:
+                # don't keep fetching the backlog after an unexpected error
+                for future in futures:
+                    future.cancel()
+                pool.shutdown(wait=True)
 
         responses = {k: v for k, v in details.items()}
         return responses
@@ -331,21 +617,87 @@ class HistoryResponse(Response):
                 json.dump(obj, f)
 
 
+class HistoryAccumulator:
+    """
+    Collect ``HistoryResponse`` pages in linear time.
+
+    Equivalent to summing the pages with ``+``, which copies every match
+    seen so far on each addition, but the combined ``HistoryResponse`` is
+    only built when ``result`` is called.
+
+    Examples
+    --------
+    acc = HistoryAccumulator()
+    for page in api.iter_history_pages(account_id=steam_id):
+        acc.add(page)
+    hist = acc.result()
+    """
+
+    def __init__(self, helper=None):
+        self.helper = helper
+        self.matches = []
+        self.status = None
+        self.total_results = None
+        self.results_remaining = None
+        self.n_pages = 0
+
+    def add(self, page):
+        """
+        Parameters
+        ----------
+        page : HistoryResponse
+        """
+        self.helper = self.helper or page.helper
+        self.matches.extend(page.matches)
+        if self.n_pages == 0:
+            self.status = page.status
+            self.total_results = page.total_results
+            self.results_remaining = page.results_remaining
+        else:
+            self.status = max(self.status, page.status)
+            if self.total_results == page.total_results:
+                self.results_remaining = min(self.results_remaining,
+                                             page.results_remaining)
+            else:
+                self.total_results = np.nan
+                self.results_remaining = np.nan
+        self.n_pages += 1
+        return self
+
+    def __len__(self):
+        return len(self.matches)
+
+    def result(self):
+        """
+        Returns
+        -------
+        hist : HistoryResponse
+        """
+        if self.n_pages == 0:
+            raise ValueError("No pages added.")
+        resp = {'status': self.status,
+                'results_remaining': self.results_remaining,
+                'num_results': len(self.matches),
+                'total_results': self.total_results,
+                'matches': list(self.matches)}
+        return HistoryResponse(resp, helper=self.helper)
+
+
 class DetailsResponse(Response):
 
-    game_mode = {1: 'All Pick',
-                 2: 'Captains Mode',
-                 3: 'Random Draft',
-                 4: 'Single Draft',
-                 5: 'All Random',
-                 6: 'Intro?',
-                 7: 'Diretide',
-                 8: 'Reverse Captains Mode',
-                 9: 'Greeviling',
-                 10: 'Tutorial',
-                 11: 'Mid Only',
-                 12: 'Least Played',
-                 13: 'New Player Pool'}
+    game_modes = {1: 'All Pick',
+                  2: 'Captains Mode',
+                  3: 'Random Draft',
+                  4: 'Single Draft',
+                  5: 'All Random',
+                  6: 'Intro?',
+                  7: 'Diretide',
+                  8: 'Reverse Captains Mode',
+                  9: 'Greeviling',
+                  10: 'Tutorial',
+                  11: 'Mid Only',
+                  12: 'Least Played',
+                  13: 'New Player Pool'}
 
     """
     Detailed response of an individual game.
@@ -364,50 +716,83 @@ class DetailsResponse(Response):
     'match_id': int
     'players': array
 
+    Only ``match_id`` and ``winner`` are set up front. Everything else is
+    read from ``resp`` on access; derived attributes (``start_time``,
+    ``picks_bans``, ``player_ids``) are computed once and cached. Private
+    account ids are replaced with NaN the first time ``resp`` is accessed.
     """
 
+    __slots__ = ('_resp', '_normalized', 'match_id', 'winner',
+                 '_start_time', '_picks_bans', '_player_ids')
+
     def __init__(self, resp):
 
-        self.resp = resp
+        self._resp = resp
+        self._normalized = False
         if resp['radiant_win']:
             self.winner = 'Radiant'
         else:
             self.winner = 'Dire'
         self.match_id = resp['match_id']
-        for p in resp['players']:
-            if p.get('account_id') == _PRIVATE:
-                p['account_id'] = np.nan
-        self.player_ids = {'radiant': [], 'dire': []}
-        for player in resp['players']:
+
+    @property
+    def resp(self):
+        if not self._normalized:
+            for p in self._resp.get('players', []):
+                if p.get('account_id') == _PRIVATE:
+                    p['account_id'] = np.nan
+            self._normalized = True
+        return self._resp
+
+    @_cached_slot
+    def player_ids(self):
+        player_ids = {'radiant': [], 'dire': []}
+        for player in self.resp['players']:
             if player['player_slot'] < 5:
-                self.player_ids['radiant'].append(player.get('account_id', np.nan))
+                player_ids['radiant'].append(player.get('account_id', np.nan))
             else:
-                self.player_ids['dire'].append(player.get('account_id', np.nan))
-
-        self.hero_name_to_id = _hero_names_to_id
-        self.hero_id_to_names = {v: k for k, v in _hero_names_to_id.items()}
-
-        self.negative_votes = self.resp['negative_votes']
-        self.positive_votes = self.resp['positive_votes']
-        self.lobby_type = self.resp['lobby_type']
-        self.duration = self.resp['duration']
-        self.first_blood_time = self.resp['first_blood_time']
-        self.league_id = self.resp['leagueid']
-        self.start_time = arrow.get(self.resp['start_time'])
-        self.dire_name = resp.get('dire_name')
-        self.radiant_name = resp.get('radiant_name')
-        self.dire_team_id = resp.get('dire_team_id')
-        self.radiant_team_id = resp.get('radiant_team_id')
-        self.game_mode = resp.get('game_mode')
-        self.picks_bans = self._parse_picks_bans(resp.get('picks_bans'))
+                player_ids['dire'].append(player.get('account_id', np.nan))
+        return player_ids
+
+    @_cached_slot
+    def start_time(self):
+        return arrow.get(self._resp['start_time'])
+
+    @_cached_slot
+    def picks_bans(self):
+        return self._parse_picks_bans(self._resp.get('picks_bans'))
+
+    # shared lookup tables, not copied per instance
+    hero_name_to_id = property(
+        lambda self: static.load('_hero_names_to_id'))
+    hero_id_to_names = property(
+        lambda self: static.load('_hero_id_to_names'))
+
+    negative_votes = property(lambda self: self._resp['negative_votes'])
+    positive_votes = property(lambda self: self._resp['positive_votes'])
+    lobby_type = property(lambda self: self._resp['lobby_type'])
+    duration = property(lambda self: self._resp['duration'])
+    first_blood_time = property(lambda self: self._resp['first_blood_time'])
+    league_id = property(lambda self: self._resp['leagueid'])
+    dire_name = property(lambda self: self._resp.get('dire_name'))
+    radiant_name = property(lambda self: self._resp.get('radiant_name'))
+    dire_team_id = property(lambda self: self._resp.get('dire_team_id'))
+    radiant_team_id = property(lambda self: self._resp.get('radiant_team_id'))
+    game_mode = property(lambda self: self._resp.get('game_mode'))
 
     @staticmethod
     def from_json(f_obj):
         """
         Initialize from a JSON file.
-        """
 
-        with open(f_obj) as f:
+        ``f_obj`` is a path, or anything with an ``open()`` method such as
+        a Path or a ``dota.archive.ArchiveEntry``.
+        """
+        if hasattr(f_obj, 'open'):
+            f = f_obj.open()
+        else:
+            f = open(f_obj)
+        with f:
             return DetailsResponse(json.load(f))
 
     @staticmethod
@@ -442,11 +827,7 @@ class DetailsResponse(Response):
 
     def match_report(self):
         # TODO: ability upgrades
-        keys = ['level', 'kills', 'deaths', 'assists',
-                'last_hits', 'denies', 'gold', 'gold_spent', 'player_slot',
-                'account_id', 'hero_damage', 'hero_healing',
-                'item_0', 'item_1', 'item_2', 'item_3', 'item_4',
-                'item_5']
+        keys = REPORT_KEYS
         df = pd.concat([pd.Series(self.by_player(key))
                         for key in keys], axis=1, keys=keys)
         df = self.format_df(df, self.winner, self.match_id)
@@ -470,9 +851,8 @@ class DetailsResponse(Response):
             df = df.set_index('hero_id')
         except KeyError:
             pass
-        df = df.rename(index=lambda x:
-                       _hero_id_to_names.get(int(x),
-                                             str(x)))
+        df.index = pd.Index(registry.heroes().names(df.index.values,
+                                                    default=str))
         df.index.set_names(['hero'], inplace=True)
 
         df['team'] = df['player_slot'].apply(DetailsResponse.rep_team)
@@ -529,26 +909,29 @@ class DetailsResponse(Response):
 
     def skill_build(self, hero='all'):
         """
-        Display the skill build as a _.
+        Display the skill build as a DataFrame.
 
         Parameters
         ----------
 
-        hero : str
+        hero : str or int
+            hero name (e.g. 'antimage') or id, or 'all' for every hero.
+
+        Returns
+        -------
+        build : DataFrame
+            ability, level and time of each skill point; with a hero
+            column for ``hero='all'``. See ``skill_builds``.
 
         TODO: http://cdn.dota2.com/apps/dota2/images/abilities/antimage_blink_lg.png
         """
+        df = skill_builds([self.resp])
         if hero == 'all':
-            raise ValueError("Not  Implemented")
-        else:
-            if not isinstance(hero, int):
-                hero_id = self.hero_name_to_id['npc_dota_hero_' + hero]
-            f = lambda x: x['hero_id'] == hero_id
-            # should be unique
-            skills = list(filter(f, self.resp['players']))[0]['ability_upgrades']
-            df = pd.DataFrame(skills)
-            df['ability'] = df.ability.astype(str).map(_ability_id_to_name)
-        return df
+            return df[['hero', 'ability', 'level', 'time']]
+        hero_id = hero if isinstance(hero, int) else \
+            self.hero_name_to_id[hero]
+        df = df[df.hero_id == hero_id]
+        return df[['ability', 'level', 'time']].reset_index(drop=True)
 
 
 class TeamResponse(Response):
@@ -569,6 +952,136 @@ class TeamResponse(Response):
                             "player_4_account_id"]]
 
 
+def _as_resp(match):
+    if isinstance(match, DetailsResponse):
+        return match.resp
+    return match
+
+
+def player_columns(matches, keys=REPORT_KEYS):
+    """
+    Gather per-player fields of many matches into one array per field.
+
+    Parameters
+    ----------
+    matches : iterable of dict or DetailsResponse
+    keys : list of str
+        player fields to extract. Missing fields are NaN.
+
+    Returns
+    -------
+    columns : dict
+        ``keys`` plus 'match_id', 'hero_id' and 'radiant_win' (of the
+        player's match), each an array with one entry per player.
+        Private account ids are NaN.
+    """
+    keys = list(keys)
+    fields = keys + [k for k in ('hero_id',) if k not in keys]
+    cols = {k: [] for k in fields}
+    match_ids, radiant_win = [], []
+    for match in matches:
+        resp = _as_resp(match)
+        players = resp['players']
+        match_ids.extend([resp['match_id']] * len(players))
+        radiant_win.extend([bool(resp['radiant_win'])] * len(players))
+        for key in fields:
+            cols[key].extend([p.get(key, np.nan) for p in players])
+
+    columns = {k: np.array(v) for k, v in cols.items()}
+    if 'account_id' in columns:
+        account_id = columns['account_id'].astype(np.float64)
+        account_id[account_id == _PRIVATE] = np.nan
+        if not np.isnan(account_id).any():
+            account_id = account_id.astype(np.int64)
+        columns['account_id'] = account_id
+    columns['match_id'] = np.array(match_ids, dtype=np.int64)
+    columns['radiant_win'] = np.array(radiant_win, dtype=bool)
+    return columns
+
+
+def match_reports(matches):
+    """
+    Build the ``match_report`` of many matches in one columnar pass.
+
+    Parameters
+    ----------
+    matches : iterable of dict or DetailsResponse
+
+    Returns
+    -------
+    report : DataFrame
+        indexed by ``(match_id, team, hero)``, sorted. The same as
+        concatenating each ``DetailsResponse.match_report()`` and sorting.
+    """
+    cols = player_columns(matches)
+    radiant = cols['player_slot'] < 5
+    team = np.where(radiant, 'Radiant', 'Dire').astype(object)
+
+    df = pd.DataFrame({k: cols[k] for k in REPORT_KEYS},
+                      columns=REPORT_KEYS)
+    df['win'] = radiant == cols['radiant_win']
+    index = pd.MultiIndex.from_arrays([cols['match_id'], team,
+                                       registry.heroes().names(
+                                           cols['hero_id'], default=str)],
+                                      names=['match_id', 'team', 'hero'])
+    df.index = index
+    return df.sort_index()
+
+
+UPGRADE_KEYS = ['match_id', 'account_id', 'hero_id', 'level', 'ability_id',
+                'time']
+
+
+def upgrade_columns(matches):
+    """
+    Flatten the ``ability_upgrades`` of every player of many matches into
+    one integer array per field of ``UPGRADE_KEYS``. Private account ids
+    are -1.
+    """
+    cols = {k: [] for k in UPGRADE_KEYS}
+    for match in matches:
+        resp = _as_resp(match)
+        for p in resp['players']:
+            upgrades = p.get('ability_upgrades') or []
+            n = len(upgrades)
+            account_id = p.get('account_id')
+            if account_id is None or pd.isnull(account_id) or \
+                    account_id == _PRIVATE:
+                account_id = -1
+            cols['match_id'].extend([resp['match_id']] * n)
+            cols['account_id'].extend([account_id] * n)
+            cols['hero_id'].extend([p['hero_id']] * n)
+            cols['level'].extend([u['level'] for u in upgrades])
+            cols['ability_id'].extend([u['ability'] for u in upgrades])
+            cols['time'].extend([u['time'] for u in upgrades])
+    return {k: np.array(v, dtype=np.int64) for k, v in cols.items()}
+
+
+def skill_builds(matches):
+    """
+    Skill builds of every hero of many matches in one frame.
+
+    Parameters
+    ----------
+    matches : iterable of dict or DetailsResponse
+
+    Returns
+    -------
+    builds : DataFrame
+        one row per skill point, sorted by ``(match_id, hero_id, level)``,
+        with the ``UPGRADE_KEYS`` plus ``hero`` and ``ability`` names.
+        ``account_id`` is NaN for private accounts.
+    """
+    cols = upgrade_columns(matches)
+    df = pd.DataFrame(cols, columns=UPGRADE_KEYS)
+    df['account_id'] = df['account_id'].where(df['account_id'] >= 0)
+    df['hero'] = registry.heroes().names(cols['hero_id'], default=str)
+    df['ability'] = registry.abilities().names(cols['ability_id'],
+                                               default=str)
+    df = df.sort_values(['match_id', 'hero_id', 'level'], kind='mergesort')
+    return df.reset_index(drop=True)
+
+
 def update_hero_names(key):
     h = API(key)
     with open(dirname(abspath(__file__)) + 'current_heroes.json', 'w') as f:
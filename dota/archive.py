@@ -0,0 +1,248 @@
+# -*- coding: utf-8 -*-
+"""
+Append-only archive of match details.
+
+An archive is a directory holding compressed segment files and an index::
+
+    archive/
+        index.txt           # match_id segment offset length, one per line
+        segment-00000.dat   # zlib-compressed JSON records, back to back
+        segment-00001.dat
+
+Matches are appended to the newest segment until it reaches
+``segment_bytes``, then a new segment is started. Records are compressed
+individually, so any match can be read with one seek, and the archive can
+be streamed in order segment by segment.
+
+``helpers.cached_games`` returns ``ArchiveEntry`` objects for an archive
+directory. They have a ``stem`` and an ``open()`` like the Paths returned
+for a directory of JSON files, so ``DetailsResponse.from_json`` and the
+scripts read from either.
+"""
+import io
+import os
+import json
+import zlib
+import pathlib
+
+INDEX = 'index.txt'
+
+
+def is_archive(path):
+    return (pathlib.Path(str(path)) / INDEX).exists()
+
+
+class ArchiveEntry:
+    """
+    One match in an archive, usable where a ``<match_id>.json`` Path is.
+
+    Carries its own location so it can be read (e.g. in another process)
+    without loading the index.
+    """
+
+    __slots__ = ('path', 'match_id', 'segment', 'offset', 'length')
+
+    def __init__(self, path, match_id, segment, offset, length):
+        self.path = path
+        self.match_id = match_id
+        self.segment = segment
+        self.offset = offset
+        self.length = length
+
+    def __repr__(self):
+        return "ArchiveEntry({!r}, {})".format(str(self.path), self.match_id)
+
+    def __str__(self):
+        return str(self.path / self.name)
+
+    def __getstate__(self):
+        return tuple(getattr(self, k) for k in self.__slots__)
+
+    def __setstate__(self, state):
+        for k, v in zip(self.__slots__, state):
+            setattr(self, k, v)
+
+    @property
+    def stem(self):
+        return str(self.match_id)
+
+    @property
+    def name(self):
+        return self.stem + '.json'
+
+    def read_bytes(self):
+        with (self.path / _segment_name(self.segment)).open('rb') as f:
+            f.seek(self.offset)
+            return zlib.decompress(f.read(self.length))
+
+    def read_text(self):
+        return self.read_bytes().decode('utf-8')
+
+    def open(self, mode='r'):
+        if mode not in ('r', 'rt'):
+            raise ValueError("Archive entries are read only.")
+        return io.StringIO(self.read_text())
+
+    def load(self):
+        return json.loads(self.read_text())
+
+
+def _segment_name(segment):
+    return 'segment-{:05d}.dat'.format(segment)
+
+
+class MatchArchive:
+    """
+    Parameters
+    ----------
+    path : str or Path
+        archive directory. Created (with an empty index) if missing.
+    segment_bytes : int
+        start a new segment once the current one is this large.
+    level : int
+        zlib compression level.
+
+    Examples
+    --------
+    archive = MatchArchive('~/sandbox/dota/data/pro.archive')
+    archive.append(dr.resp)
+    resp = archive.get(547519680)
+    for match_id, resp in archive:
+        ...
+    """
+
+    def __init__(self, path, segment_bytes=2 ** 26, level=6):
+        self.path = pathlib.Path(os.path.expanduser(str(path)))
+        self.segment_bytes = segment_bytes
+        self.level = level
+        if not self.path.exists():
+            self.path.mkdir(parents=True)
+        index = self.path / INDEX
+        if not index.exists():
+            index.touch()
+        self._index = {}
+        self._segment = 0
+        sizes = {}
+        for line in self._read_index(index):
+            try:
+                match_id, segment, offset, length = map(int, line.split())
+            except ValueError:
+                continue
+            if segment not in sizes:
+                seg_path = self.path / _segment_name(segment)
+                sizes[segment] = seg_path.stat().st_size \
+                    if seg_path.exists() else 0
+            if offset + length > sizes[segment]:  # record never written
+                continue
+            self._index[match_id] = (segment, offset, length)
+            self._segment = max(self._segment, segment)
+
+    @staticmethod
+    def _read_index(index):
+        """
+        Lines of the index. A torn final line from a crash is cut off the
+        file, so the next append starts on a line of its own.
+        """
+        with index.open('rb+') as f:
+            data = f.read()
+            end = data.rfind(b'\n') + 1
+            if end < len(data):
+                f.truncate(end)
+        return data[:end].decode('utf-8').splitlines()
+
+    def __len__(self):
+        return len(self._index)
+
+    def __contains__(self, match_id):
+        return int(match_id) in self._index
+
+    def match_ids(self):
+        return list(self._index)
+
+    def entry(self, match_id):
+        segment, offset, length = self._index[int(match_id)]
+        return ArchiveEntry(self.path, int(match_id), segment, offset, length)
+
+    def entries(self):
+        """
+        ArchiveEntries in storage order.
+        """
+        order = sorted(self._index.items(), key=lambda x: x[1])
+        return [ArchiveEntry(self.path, match_id, *loc)
+                for match_id, loc in order]
+
+    def get(self, match_id):
+        """
+        The stored response for ``match_id``. Raises KeyError if missing.
+        """
+        return self.entry(match_id).load()
+
+    def __iter__(self):
+        """
+        Stream ``(match_id, resp)`` in storage order, reading each segment
+        sequentially.
+        """
+        by_segment = {}
+        for match_id, (segment, offset, length) in self._index.items():
+            by_segment.setdefault(segment, []).append((offset, length,
+                                                       match_id))
+        for segment in sorted(by_segment):
+            with (self.path / _segment_name(segment)).open('rb') as f:
+                pos = 0
+                for offset, length, match_id in sorted(by_segment[segment]):
+                    if offset != pos:
+                        f.seek(offset)
+                    data = f.read(length)
+                    pos = offset + length
+                    yield match_id, json.loads(
+                        zlib.decompress(data).decode('utf-8'))
+
+    def append(self, resp):
+        """
+        Add a match. Matches already in the archive are left unchanged.
+
+        Returns
+        -------
+        added : bool
+        """
+        match_id = int(resp['match_id'])
+        if match_id in self._index:
+            return False
+        data = zlib.compress(json.dumps(resp).encode('utf-8'), self.level)
+
+        seg_path = self.path / _segment_name(self._segment)
+        if seg_path.exists() and seg_path.stat().st_size >= self.segment_bytes:
+            self._segment += 1
+            seg_path = self.path / _segment_name(self._segment)
+        with seg_path.open('ab') as f:
+            offset = f.tell()
+            f.write(data)
+        # the record is on disk before the index points at it
+        with (self.path / INDEX).open('a') as f:
+            f.write('{} {} {} {}\n'.format(match_id, self._segment, offset,
+                                           len(data)))
+        self._index[match_id] = (self._segment, offset, len(data))
+        return True
+
+    def extend(self, resps):
+        """
+        Append many matches. Returns the number added.
+        """
+        return sum(self.append(resp) for resp in resps)
+
+
+def pack(directory, archive_path, **kwargs):
+    """
+    Copy every ``<match_id>.json`` in ``directory`` into an archive.
+
+    Returns
+    -------
+    archive : MatchArchive
+    """
+    from dota.helpers import cached_games
+
+    archive = MatchArchive(archive_path, **kwargs)
+    for p in sorted(cached_games(directory), key=lambda x: str(x)):
+        with p.open() as f:
+            archive.append(json.load(f))
+    return archive
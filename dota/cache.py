@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+"""
+On-disk cache of API responses.
+"""
+import os
+import json
+import hashlib
+import pathlib
+import tempfile
+import threading
+from collections import OrderedDict
+
+
+class ResponseCache:
+    """
+    A persistent, size-bounded cache of JSON responses keyed by endpoint
+    and query parameters.
+
+    Parameters
+    ----------
+    directory : str or Path
+        where entries are stored, one file per entry. Created if missing.
+    max_bytes : int
+        byte budget for all entries. The least recently used entries are
+        evicted once it is exceeded. Defaults to 1 GB.
+
+    Attributes
+    ----------
+    hits, misses : int
+        lookup counters since creation.
+
+    Notes
+    -----
+    Entries are immutable: ``set`` on a key that is already cached is a
+    no-op. Only cache responses that can't change, e.g. details of finished
+    matches. Recency is tracked through file modification times, so it
+    survives restarts.
+
+    The ``key`` parameter is never part of the cache key.
+    """
+
+    def __init__(self, directory, max_bytes=2 ** 30):
+        self.directory = pathlib.Path(os.path.expanduser(str(directory)))
+        if not self.directory.exists():
+            self.directory.mkdir(parents=True)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        entries = []
+        for p in self.directory.iterdir():
+            if p.suffix == '.json':
+                st = p.stat()
+                entries.append((st.st_mtime, p.stem, st.st_size))
+        # oldest first
+        self._entries = OrderedDict((stem, size) for _, stem, size
+                                    in sorted(entries))
+        self.nbytes = sum(self._entries.values())
+
+    @staticmethod
+    def make_key(url, params):
+        params = {k: v for k, v in params.items() if k != 'key'}
+        raw = json.dumps([url, sorted((k, str(v)) for k, v in params.items())])
+        return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+    def _path(self, key):
+        return self.directory / (key + '.json')
+
+    def get(self, url, params):
+        """
+        The cached response for ``url`` and ``params``, or None.
+        """
+        key = self.make_key(url, params)
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        path = self._path(key)
+        try:
+            with path.open() as f:
+                resp = json.load(f)
+            os.utime(str(path), None)
+        except (OSError, ValueError):  # removed or truncated on disk
+            with self._lock:
+                self.nbytes -= self._entries.pop(key, 0)
+                self.hits -= 1
+                self.misses += 1
+            return None
+        return resp
+
+    def set(self, url, params, resp):
+        key = self.make_key(url, params)
+        with self._lock:
+            if key in self._entries:
+                return
+        data = json.dumps(resp)
+        path = self._path(key)
+        # a temp file per writer: concurrent sets of a key don't share one
+        with tempfile.NamedTemporaryFile('w', dir=str(self.directory),
+                                         suffix='.tmp', delete=False) as f:
+            f.write(data)
+        os.replace(f.name, str(path))
+        with self._lock:
+            if key in self._entries:  # another writer got here first
+                return
+            size = path.stat().st_size
+            self._entries[key] = size
+            self.nbytes += size
+            self._evict()
+
+    def _evict(self):
+        while self.nbytes > self.max_bytes and len(self._entries) > 1:
+            key, size = self._entries.popitem(last=False)
+            self.nbytes -= size
+            try:
+                self._path(key).unlink()
+            except OSError:
+                pass
+
+    def __contains__(self, key):
+        url, params = key
+        return self.make_key(url, params) in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses,
+                'entries': len(self), 'bytes': self.nbytes}
@@ -0,0 +1,332 @@
+# -*- coding: utf-8 -*-
+"""
+Columnar export of the match corpus, partitioned by patch and league.
+
+An export is a directory of Parquet (or Feather) files, one subdirectory
+per table and one per partition::
+
+    export/
+        games/patch=6.80/league=0/part-00000.parquet
+        player_games/patch=6.80/league=0/part-00000.parquet
+        picks_bans/patch=6.80/league=0/part-00000.parquet
+
+``export`` appends new matches as new part files; matches already in the
+``games`` table are skipped. A chunk's files are written under temporary
+names and renamed once all three tables are written, so a crash doesn't
+leave rows that a rerun would write again. ``read`` only opens the partitions asked for
+and only reads the columns asked for.
+
+Requires pyarrow.
+
+Examples
+--------
+>>> from dota import export
+>>> export.export(CachedGames('~/sandbox/dota/data/pro/').paths(), 'export')
+>>> export.read('export', 'player_games', columns=['hero', 'kills'],
+...             patches=['6.80'])
+"""
+import os
+import re
+import pathlib
+from itertools import islice
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow  # noqa
+except ImportError:
+    pyarrow = None
+
+from dota import api, patches
+
+TABLES = ('games', 'player_games', 'picks_bans')
+FORMATS = {'parquet': '.parquet', 'feather': '.feather'}
+PARTITIONS = ('patch', 'league')
+UNKNOWN_PATCH = 'unknown'
+TMP_PREFIX = '.tmp-'
+
+GAME_KEYS = ['match_id', 'start_time', 'duration', 'radiant_win',
+             'radiant_team_id', 'dire_team_id', 'game_mode', 'lobby_type',
+             'first_blood_time', 'human_players']
+
+
+def _require_pyarrow():
+    if pyarrow is None:
+        raise ImportError("dota.export requires pyarrow.")
+
+#-----------------------------------------------------------------------------
+# Building the tables
+
+
+def _resp(game):
+    if isinstance(game, (dict, api.DetailsResponse)):
+        return api._as_resp(game)
+    return api.DetailsResponse.from_json(game).resp
+
+
+def _known_id(game):
+    """
+    The match id of ``game`` if it can be had without reading the file,
+    e.g. from a ``<match_id>.json`` name, else None.
+    """
+    if isinstance(game, (dict, api.DetailsResponse)):
+        return int(api._as_resp(game)['match_id'])
+    found = re.search(r'(\d+)$', pathlib.Path(str(game)).stem)
+    return int(found.group(1)) if found else None
+
+
+def games_frame(resps):
+    """
+    One row per match, with its ``patch`` and ``league``.
+    """
+    df = pd.DataFrame({k: [r.get(k, np.nan) for r in resps]
+                       for k in GAME_KEYS}, columns=GAME_KEYS)
+    for col in ['radiant_team_id', 'dire_team_id']:
+        df[col] = df[col].astype(np.float64)
+    df['radiant_win'] = df['radiant_win'].astype(bool)
+    df['patch'] = patches.label(df['start_time'].values,
+                                default=UNKNOWN_PATCH)
+    df['league'] = [int(r.get('leagueid', 0)) for r in resps]
+    return df
+
+
+def player_games_frame(resps):
+    """
+    One row per player per match, as in ``api.match_reports``.
+    """
+    df = api.match_reports(resps).reset_index()
+    df['account_id'] = df['account_id'].astype(np.float64)
+    return df
+
+
+def picks_bans_frame(resps):
+    """
+    One row per pick or ban of captains mode matches.
+    """
+    cols = ['match_id', 'order', 'is_pick', 'hero_id', 'team']
+    rows = [(r['match_id'], pb['order'], bool(pb['is_pick']), pb['hero_id'],
+             pb['team'])
+            for r in resps for pb in (r.get('picks_bans') or [])]
+    df = pd.DataFrame(rows, columns=cols)
+    return df.astype({'match_id': np.int64, 'order': np.int64,
+                      'is_pick': bool, 'hero_id': np.int64,
+                      'team': np.int64})
+
+
+def tables(resps):
+    """
+    The exported tables for ``resps``, keyed by name. Every table has
+    ``patch`` and ``league`` columns.
+    """
+    games = games_frame(resps)
+    keys = games.set_index('match_id')[list(PARTITIONS)]
+    out = {'games': games}
+    for name, df in [('player_games', player_games_frame(resps)),
+                     ('picks_bans', picks_bans_frame(resps))]:
+        out[name] = df.join(keys, on='match_id')
+    return out
+
+#-----------------------------------------------------------------------------
+# Writing
+
+
+def _partition_dir(root, table, patch, league):
+    return root / table / 'patch={}'.format(patch) / 'league={}'.format(league)
+
+
+def _next_part(directory, ext):
+    n = len(list(directory.glob('part-*' + ext)))
+    return directory / 'part-{:05d}{}'.format(n, ext)
+
+
+def _write(df, path, format):
+    df = df.reset_index(drop=True)
+    if format == 'parquet':
+        df.to_parquet(str(path), index=False)
+    else:
+        df.to_feather(str(path))
+
+
+def _stage_partitions(df, root, table, format):
+    """
+    Write ``df`` to temporary files next to where ``write_partitions``
+    puts them.
+
+    Returns
+    -------
+    staged : list of (temporary, final) Paths
+    """
+    _require_pyarrow()
+    root = pathlib.Path(str(root))
+    ext = FORMATS[format]
+    staged = []
+    for (patch, league), part in df.groupby(list(PARTITIONS)):
+        directory = _partition_dir(root, table, patch, league)
+        if not directory.exists():
+            directory.mkdir(parents=True)
+        path = _next_part(directory, ext)
+        tmp = directory / (TMP_PREFIX + path.name)
+        _write(part.drop(list(PARTITIONS), axis=1), tmp, format)
+        staged.append((tmp, path))
+    return staged
+
+
+def _publish(staged):
+    for tmp, path in staged:
+        os.replace(str(tmp), str(path))
+    return [path for _, path in staged]
+
+
+def _remove_staged(root):
+    # left by an export that crashed before publishing its chunk
+    for tmp in pathlib.Path(str(root)).glob('*/patch=*/league=*/' +
+                                            TMP_PREFIX + '*'):
+        tmp.unlink()
+
+
+def write_partitions(df, root, table, format='parquet'):
+    """
+    Append ``df`` to ``table``, one new part file per patch and league.
+    The partition columns are stored in the path, not the file.
+
+    Returns
+    -------
+    paths : list of Paths written
+    """
+    return _publish(_stage_partitions(df, root, table, format))
+
+
+def exported_match_ids(root):
+    """
+    Match ids already in the export at ``root``.
+    """
+    if not (pathlib.Path(str(root)) / 'games').exists():
+        return set()
+    return set(read(root, 'games', columns=['match_id'])['match_id'])
+
+
+def export(games, root, format='parquet', chunksize=1000, verbose=True):
+    """
+    Append ``games`` to the export at ``root``, skipping matches it
+    already has (without reading them if their file name has the id).
+
+    Parameters
+    ----------
+    games : iterable of Paths, dicts or DetailsResponses
+    root : str or Path
+    format : {'parquet', 'feather'}
+    chunksize : int
+        matches per part file (per partition).
+    verbose : bool
+
+    Returns
+    -------
+    n_games : int
+        matches added.
+    """
+    _require_pyarrow()
+    if format not in FORMATS:
+        raise ValueError("format must be one of {}".format(sorted(FORMATS)))
+    root = pathlib.Path(str(root))
+    _remove_staged(root)
+    done = exported_match_ids(root)
+    games = iter(games)
+    n = 0
+    while True:
+        chunk = list(islice(games, chunksize))
+        if not chunk:
+            break
+        resps = []
+        for game in chunk:
+            if _known_id(game) in done:
+                continue
+            resp = _resp(game)
+            if resp['match_id'] not in done:
+                done.add(resp['match_id'])
+                resps.append(resp)
+        if not resps:
+            continue
+        dfs = tables(resps)
+        # a chunk's files only get their final names once all tables are
+        # written, games last: a match counts as exported once it's there
+        staged = [_stage_partitions(dfs[name], root, name, format)
+                  for name in ['player_games', 'picks_bans', 'games']]
+        for files in staged:
+            _publish(files)
+        n += len(resps)
+        if verbose:
+            print("Exported {} games.".format(n))
+    return n
+
+#-----------------------------------------------------------------------------
+# Reading
+
+
+def _partition_value(directory, key):
+    return directory.name[len(key) + 1:]
+
+
+def partitions(root, table):
+    """
+    ``(patch, league, directory)`` for each partition of ``table``.
+    """
+    out = []
+    for p_dir in sorted((pathlib.Path(str(root)) / table).glob('patch=*')):
+        for l_dir in sorted(p_dir.glob('league=*')):
+            out.append((_partition_value(p_dir, 'patch'),
+                        int(_partition_value(l_dir, 'league')), l_dir))
+    return out
+
+
+def _read_file(path, columns):
+    if path.suffix == '.parquet':
+        return pd.read_parquet(str(path), columns=columns)
+    return pd.read_feather(str(path), columns=columns)
+
+
+def read(root, table, columns=None, patches=None, leagues=None):
+    """
+    Read ``table`` from the export at ``root``.
+
+    Parameters
+    ----------
+    root : str or Path
+    table : str
+        one of ``TABLES``.
+    columns : list of str, optional
+        columns to read, which may include 'patch' and 'league'. All if
+        None.
+    patches : list of str, optional
+        only read these patches.
+    leagues : list of int, optional
+        only read these league ids.
+
+    Returns
+    -------
+    df : DataFrame
+    """
+    _require_pyarrow()
+    if table not in TABLES:
+        raise ValueError("table must be one of {}".format(TABLES))
+    file_columns = None if columns is None else \
+        [c for c in columns if c not in PARTITIONS] or ['match_id']
+    frames = []
+    for patch, league, directory in partitions(root, table):
+        if patches is not None and patch not in patches:
+            continue
+        if leagues is not None and league not in leagues:
+            continue
+        for path in sorted(directory.glob('part-*')):
+            if path.suffix not in FORMATS.values():
+                continue
+            df = _read_file(path, file_columns)
+            df['patch'] = patch
+            df['league'] = league
+            frames.append(df)
+    if not frames:
+        return pd.DataFrame(columns=columns or [])
+    df = pd.concat(frames, ignore_index=True)
+    if columns is not None:
+        df = df[list(columns)]
+    return df
@@ -1,7 +1,10 @@
 # -*- coding: utf-8 -*-
+import os
 import re
+import json
 import pathlib
 from itertools import chain
+from collections import deque
 try:
     from io import StringIO
 except ImportError:
@@ -11,6 +14,9 @@ import numpy as np
 import pandas as pd
 
 import dota.api as a
+from dota import archive
+
+N_PICKS_BANS = 20  # picks and bans of a captains mode draft
 
 
 def cached_games(directory, regex=r"[\w\/]*?(\d+)\.json"):
@@ -20,23 +26,200 @@ def cached_games(directory, regex=r"[\w\/]*?(\d+)\.json"):
     Parameters
     ----------
     directory : str or pathlib.Path
+        a directory of JSON files or a ``dota.archive`` directory.
     regex : str. Alternative regex. Used to match games
 
     Returns
     -------
 
     match_ids : iterable of Paths
+        or of ``ArchiveEntry`` for an archive, which have the same
+        ``stem`` and ``open()``.
+
+    See Also
+    --------
+    CachedGames : persisted, incremental version for repeated lookups.
 
     """
     if not isinstance(directory, (pathlib.Path, pathlib.PosixPath,
                                   pathlib.WindowsPath)):
         directory = pathlib.Path(directory)
 
+    if archive.is_archive(directory):
+        return iter(archive.MatchArchive(directory).entries())
+
     regex = re.compile(regex)
     match_ids = filter(lambda x: regex.match(str(x)), directory.iterdir())
     return match_ids
 
 
+class CachedGames:
+    """
+    Set-like view of the match ids stored in ``directory``, backed by a
+    manifest persisted in the directory.
+
+    Parameters
+    ----------
+    directory : str or pathlib.Path
+        a directory of JSON files or a ``dota.archive`` directory.
+    regex : str
+        matched against file names; group 1 is the match id.
+
+    Notes
+    -----
+    The manifest (``.manifest.json``) records the directory's mtime along
+    with the match id of each file. ``refresh`` (run on creation) lists the
+    directory only if its mtime changed since, and only regex-matches names
+    it hasn't seen. Lookups never touch the filesystem.
+
+    For an archive directory the archive index is the manifest.
+
+    Examples
+    --------
+    cached = CachedGames('~/sandbox/dota/data/pro/')
+    547519680 in cached
+    new = cached.paths(i for i in cached if i not in stored)
+    """
+
+    FILENAME = '.manifest.json'
+
+    def __init__(self, directory, regex=r"[\w\/]*?(\d+)\.json"):
+        self.directory = pathlib.Path(os.path.expanduser(str(directory)))
+        self.regex = re.compile(regex)
+        self._archive = None
+        self._mtime = None
+        self._by_name = {}  # file name -> match_id
+        self._by_id = {}    # match_id -> file name
+        if archive.is_archive(self.directory):
+            self._archive = archive.MatchArchive(self.directory)
+        else:
+            self._load()
+            self.refresh()
+
+    @property
+    def manifest_path(self):
+        return self.directory / self.FILENAME
+
+    def _load(self):
+        try:
+            with self.manifest_path.open() as f:
+                manifest = json.load(f)
+            self._mtime = manifest['mtime_ns']
+            self._by_name = {k: int(v) for k, v in manifest['files'].items()}
+        except (OSError, ValueError, KeyError, TypeError):
+            # missing or torn; rebuilt by refresh
+            self._mtime, self._by_name = None, {}
+        self._by_id = {v: k for k, v in self._by_name.items()}
+
+    def _save(self):
+        try:
+            # rewritten in place: doesn't change the directory's mtime
+            with self.manifest_path.open('w') as f:
+                json.dump({'mtime_ns': self._mtime, 'files': self._by_name},
+                          f)
+        except OSError:  # read-only data dir; rescan next time
+            pass
+
+    def refresh(self):
+        """
+        Pick up files added to (or removed from) the directory since the
+        manifest was written.
+
+        Returns
+        -------
+        added : int
+        """
+        if self._archive is not None:
+            before = len(self._archive)
+            self._archive = archive.MatchArchive(self.directory)
+            return len(self._archive) - before
+
+        if not self.manifest_path.exists():
+            # creating the manifest bumps the directory's mtime, so do it
+            # before reading the mtime we record.
+            try:
+                self.manifest_path.touch()
+            except OSError:
+                pass
+        # read before listing: files added in between bump it again and
+        # are picked up next time rather than missed
+        mtime = os.stat(str(self.directory)).st_mtime_ns
+        if mtime == self._mtime:
+            return 0
+
+        names = set(os.listdir(str(self.directory)))
+        names.discard(self.FILENAME)
+        removed = set(self._by_name) - names
+        for name in removed:
+            match_id = self._by_name.pop(name)
+            # several names can hold one match id (5.json, details5.json)
+            if self._by_id.get(match_id) == name:
+                del self._by_id[match_id]
+        if removed:
+            for name, match_id in self._by_name.items():
+                self._by_id.setdefault(match_id, name)
+        added = 0
+        for name in names - set(self._by_name):
+            m = self.regex.match(name)
+            if m is None:
+                continue
+            match_id = int(m.group(1))
+            self._by_name[name] = match_id
+            self._by_id[match_id] = name
+            added += 1
+        self._mtime = mtime
+        self._save()
+        return added
+
+    def __contains__(self, match_id):
+        if self._archive is not None:
+            return match_id in self._archive
+        return int(match_id) in self._by_id
+
+    def __len__(self):
+        if self._archive is not None:
+            return len(self._archive)
+        return len(self._by_id)
+
+    def __iter__(self):
+        if self._archive is not None:
+            return iter(self._archive.match_ids())
+        return iter(list(self._by_id))
+
+    def path(self, match_id):
+        """
+        The Path (or ``ArchiveEntry``) holding ``match_id``.
+        """
+        if self._archive is not None:
+            return self._archive.entry(match_id)
+        return self.directory / self._by_id[int(match_id)]
+
+    def paths(self, match_ids=None):
+        """
+        Paths (or ``ArchiveEntry``s) for ``match_ids``, all games if None.
+        """
+        if match_ids is None:
+            if self._archive is not None:
+                return self._archive.entries()
+            match_ids = sorted(self._by_id)
+        return [self.path(x) for x in match_ids]
+
+
+def match_writer(directory):
+    """
+    A function ``write(resp)`` storing a match in ``directory``: appended
+    to it if it's a ``dota.archive``, otherwise as ``<match_id>.json``.
+    """
+    directory = pathlib.Path(str(directory))
+    if archive.is_archive(directory):
+        return archive.MatchArchive(directory).append
+
+    def write(resp):
+        with (directory / (str(resp['match_id']) + '.json')).open('w') as f:
+            json.dump(resp, f)
+    return write
+
+
 def open_or_stringIO(f, as_string=False):
     """
     Useful for testing, but not sure how good it actually is.
@@ -51,6 +234,21 @@ def open_or_stringIO(f, as_string=False):
         return StringIO(f)
 
 
+def bounded_map(pool, fn, iterable, ahead):
+    """
+    ``pool.map`` that yields in submission order but keeps at most
+    ``ahead`` results in flight, so a slow consumer (e.g. the single
+    writer to a store or database) doesn't pile them up.
+    """
+    pending = deque()
+    for item in iterable:
+        pending.append(pool.submit(fn, item))
+        if len(pending) >= ahead:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
 def pb_team_id(df, order=0):
     return df.team_id_f.iloc[order]
 
@@ -101,15 +299,192 @@ def pb_previous_pbs(df, order=0):
 def pb_only_complete_drafts(df):
     """
     Remove any matches where at least one team_id is NaN.
-    Or where the draft has fewer that 20 picks / bans.
+    Or where the draft has fewer that 20 picks / bans (or repeats an
+    order).
+
+    See Also
+    --------
+    pb_draft_report : the per-match checks behind this.
+    """
+    by_match = df['match_id']
+    size = by_match.groupby(by_match).transform('size')
+    missing = df['team_id'].isnull().groupby(by_match).transform('any')
+    dupes = df.duplicated(['match_id', 'order']).groupby(
+        by_match).transform('any')
+    good = (size == N_PICKS_BANS) & ~missing.astype(bool) & \
+        ~dupes.astype(bool)
+    return df[good.values]
+
+
+def pb_draft_report(df):
+    """
+    Validate every draft in a picks / bans frame.
+
+    Parameters
+    ----------
+    df : DataFrame
+        one row per pick or ban, with ``match_id``, ``order`` and
+        ``team_id``.
+
+    Returns
+    -------
+    report : DataFrame
+        indexed by match_id, with ``picks_bans`` (rows), ``missing_team_id``
+        (rows with a NaN team_id), ``duplicate_orders`` (rows repeating an
+        earlier order of the same match) and ``complete``, which is what
+        ``pb_only_complete_drafts`` keeps.
+    """
+    by_match = df['match_id']
+    report = pd.DataFrame({
+        'picks_bans': by_match.groupby(by_match).size(),
+        'missing_team_id': df['team_id'].isnull().groupby(by_match).sum(),
+        'duplicate_orders': df.duplicated(['match_id', 'order']).groupby(
+            by_match).sum()},
+        columns=['picks_bans', 'missing_team_id', 'duplicate_orders'])
+    report = report.astype(np.int64)
+    report['complete'] = ((report['picks_bans'] == N_PICKS_BANS) &
+                          (report['missing_team_id'] == 0) &
+                          (report['duplicate_orders'] == 0))
+    return report
+
+#-----------------------------------------------------------------------------
+# Draft matrices
+
+
+class DraftMatrix:
+    """
+    Picks and bans of many matches as dense ``(n_matches, 20)`` arrays,
+    one row per match and one column per ``order``.
+
+    Parameters
+    ----------
+    match_ids : array (n_matches,)
+    heroes, sides, team_ids : int arrays (n_matches, 20)
+        hero, side (0 Radiant, 1 Dire) and team of each pick / ban.
+        ``fill`` where a draft has no pick / ban at that order.
+    is_pick : bool array (n_matches, 20)
+    fill : int
+
+    Examples
+    --------
+    dm = DraftMatrix.from_frame(df)
+    dm.previous()      # (n, 20, 20): heroes picked / banned before order k
+    dm.opponent_ids()  # (n, 20)
     """
-    good_ids = (~pd.isnull(df['team_id'])).groupby(df['match_id']).all()
-    good_ids = good_ids[good_ids].index
 
-    full_drafts = df.groupby('match_id').apply(len)
-    full_drafts = full_drafts[full_drafts == 20].index
-    good_ids = good_ids & full_drafts
-    return df.query('match_id in @good_ids')
+    def __init__(self, match_ids, heroes, sides, team_ids, is_pick, fill=-1):
+        self.match_ids = match_ids
+        self.heroes = heroes
+        self.sides = sides
+        self.team_ids = team_ids
+        self.is_pick = is_pick
+        self.fill = fill
+
+    def __len__(self):
+        return len(self.match_ids)
+
+    def __repr__(self):
+        return "<DraftMatrix of {} drafts>".format(len(self))
+
+    @classmethod
+    def from_frame(cls, df, hero='hero_id_f', team_id='team_id_f',
+                   fill=-1):
+        """
+        Build from a picks / bans frame (one row per pick or ban, with
+        ``match_id``, ``order``, ``team``, ``is_pick`` and the ``hero``
+        and ``team_id`` columns), in one pass.
+        """
+        order = df['order'].values.astype(np.int64)
+        if len(order) and (order.min() < 0 or order.max() >= N_PICKS_BANS):
+            raise ValueError("order must be in [0, {})".format(N_PICKS_BANS))
+        rows, match_ids = pd.factorize(df['match_id'], sort=True)
+        shape = (len(match_ids), N_PICKS_BANS)
+
+        def dense(values, dtype, empty):
+            out = np.full(shape, empty, dtype=dtype)
+            out[rows, order] = values
+            return out
+
+        def ints(col):
+            return df[col].fillna(fill).values.astype(np.int64)
+
+        team_ids = ints(team_id) if team_id in df else np.full(len(df), fill)
+        return cls(np.asarray(match_ids),
+                   dense(ints(hero), np.int64, fill),
+                   dense(ints('team'), np.int64, fill),
+                   dense(team_ids, np.int64, fill),
+                   dense(df['is_pick'].values.astype(bool), bool, False),
+                   fill=fill)
+
+    @property
+    def complete(self):
+        """
+        Boolean (n_matches,): every order has a pick / ban with a team.
+        """
+        return ((self.heroes != self.fill) &
+                (self.team_ids != self.fill)).all(1)
+
+    def opponent_ids(self):
+        """
+        ``(n_matches, 20)`` team id of the other side at each order;
+        ``pb_opponent_id`` for every draft and order at once.
+        """
+        n = len(self)
+        by_side = np.full((n, 2), self.fill, dtype=np.int64)
+        rows, cols = np.nonzero((self.sides == 0) | (self.sides == 1))
+        by_side[rows, self.sides[rows, cols]] = self.team_ids[rows, cols]
+        other = np.where(self.sides == 1, 0, 1)
+        out = by_side[np.arange(n)[:, None], other]
+        out[self.sides == self.fill] = self.fill
+        return out
+
+    def previous(self):
+        """
+        ``(n_matches, 20, 20)`` tensor: ``[i, k, j]`` is the hero picked or
+        banned at order ``j`` of draft ``i`` if ``j < k``, else ``fill``;
+        ``pb_previous_pbs`` for every draft and order at once.
+        """
+        before = np.tri(N_PICKS_BANS, k=-1, dtype=bool)  # [k, j]: j < k
+        return np.where(before[None], self.heroes[:, None, :], self.fill)
+
+    def previous_onehot(self, n_heroes=None):
+        """
+        ``(n_matches, 20, n_heroes)`` bool: hero ``h`` was picked or banned
+        before order ``k``. Heroes should be factorized (0 .. n_heroes - 1).
+        """
+        if n_heroes is None:
+            n_heroes = self.heroes.max() + 1
+        n = len(self)
+        seen = np.zeros((n, N_PICKS_BANS, n_heroes), dtype=bool)
+        rows, orders = np.nonzero(self.heroes != self.fill)
+        seen[rows, orders, self.heroes[rows, orders]] = True
+        # strictly before: shift by one order, then accumulate
+        out = np.zeros_like(seen)
+        out[:, 1:] = np.logical_or.accumulate(seen[:, :-1], axis=1)
+        return out
+
+    def to_frame(self):
+        """
+        One row per match and order with ``hero``, ``team``, ``team_id``,
+        ``opp_id``, ``is_pick`` and the previous picks / bans as
+        ``pb_0 .. pb_19`` (``fill`` for orders not yet reached).
+        """
+        n = len(self)
+        index = pd.MultiIndex.from_product(
+            [self.match_ids, np.arange(N_PICKS_BANS)],
+            names=['match_id', 'order'])
+        df = pd.DataFrame({'hero': self.heroes.ravel(),
+                           'team': self.sides.ravel(),
+                           'team_id': self.team_ids.ravel(),
+                           'opp_id': self.opponent_ids().ravel(),
+                           'is_pick': self.is_pick.ravel()},
+                          index=index,
+                          columns=['hero', 'team', 'team_id', 'opp_id',
+                                   'is_pick'])
+        prev = self.previous().reshape(n * N_PICKS_BANS, N_PICKS_BANS)
+        for j in range(N_PICKS_BANS):
+            df['pb_{}'.format(j)] = prev[:, j]
+        return df
 
 #-----------------------------------------------------------------------------
 # Feature extraction
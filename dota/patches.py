@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+"""
+Game patches and when they went live.
+
+``patches.json`` lists each patch with a stable ``patch_id`` and the UTC
+``start_time`` of the first second it applies to (midnight US Central on
+the release date). A match belongs to the latest patch that started at or
+before its ``start_time``. Supporting a new patch means adding an entry
+with the next ``patch_id``; ``dota.sql.orm`` picks it up and restamps
+games when a database is opened.
+
+Examples
+--------
+>>> from dota import patches
+>>> patches.label([1393904594])
+array(['6.80'], dtype=object)
+"""
+import json
+from os.path import dirname, abspath, join
+
+import numpy as np
+
+PATH = join(dirname(abspath(__file__)), 'patches.json')
+
+_patches = None
+
+
+def load():
+    """
+    List of ``{'patch_id', 'patch', 'start_time', 'date'}`` dicts, oldest
+    first.
+    """
+    global _patches
+    if _patches is None:
+        with open(PATH) as f:
+            _patches = sorted(json.load(f), key=lambda x: x['start_time'])
+    return _patches
+
+
+def names():
+    return [p['patch'] for p in load()]
+
+
+def start_times():
+    return np.array([p['start_time'] for p in load()], dtype=np.int64)
+
+
+def _lookup(values, times, default):
+    times = np.asarray(times, dtype=np.int64)
+    pos = np.searchsorted(start_times(), times, side='right') - 1
+    out = np.array(values, dtype=object).take(np.maximum(pos, 0))
+    out = out.reshape(times.shape)
+    out[pos < 0] = default
+    return out
+
+
+def label(times, default=None):
+    """
+    Vectorized start_time (unix seconds) -> patch name. Matches before the
+    first known patch get ``default``.
+    """
+    return _lookup(names(), times, default)
+
+
+def patch_id(time):
+    """
+    The ``patch_id`` of a match that started at ``time``, or None.
+    """
+    return _lookup([p['patch_id'] for p in load()], [time], None)[0]
@@ -0,0 +1,248 @@
+# -*- coding: utf-8 -*-
+"""
+Array-backed id registries for heroes, items and abilities.
+
+The Web API refers to heroes, items and abilities by integer id. A
+``Registry`` stores names and attributes in dense NumPy arrays indexed by
+id, so translating a whole column is a single ``take``.
+
+Examples
+--------
+>>> from dota import registry
+>>> heroes = registry.heroes()
+>>> heroes.names([1, 2])
+array(['antimage', 'axe'], dtype=object)
+>>> registry.items().attribute('cost', report[['item_0', 'item_1']].values)
+"""
+import threading
+
+import numpy as np
+import pandas as pd
+
+from dota import static
+
+
+class Registry:
+    """
+    Integer id <-> name lookup with per-id attributes.
+
+    Parameters
+    ----------
+    ids : array-like of int
+        non-negative ids.
+    names : array-like of str
+        ``names[i]`` is the name of ``ids[i]``.
+    attributes : dict, optional
+        attribute name -> array-like aligned with ``ids``.
+    kind : str
+        what's registered, e.g. 'hero'. Only used in reprs.
+
+    Notes
+    -----
+    Unknown ids (including negative ones and NaN) map to ``default`` /
+    missing values rather than raising, since match data often has ids
+    (e.g. 0 for an empty item slot) that aren't registered.
+    """
+
+    def __init__(self, ids, names, attributes=None, kind=''):
+        ids = np.asarray(ids, dtype=np.int64)
+        if len(ids) and ids.min() < 0:
+            raise ValueError("ids must be non-negative")
+        size = ids.max() + 1 if len(ids) else 0
+        self.kind = kind
+        self.ids_ = ids
+        self._names = np.empty(size, dtype=object)
+        self._names[ids] = list(names)
+        self._known = np.zeros(size, dtype=bool)
+        self._known[ids] = True
+        self._name_index = pd.Index(list(names))
+        if not self._name_index.is_unique:
+            raise ValueError("names must be unique")
+
+        self._attributes = {}
+        for attr, values in (attributes or {}).items():
+            values = np.asarray(values)
+            if values.dtype.kind in 'iub':
+                values = values.astype(np.float64)
+            elif values.dtype.kind in 'SU':
+                values = values.astype(object)
+            dense = np.empty(size, dtype=values.dtype)
+            dense[:] = np.nan if values.dtype.kind == 'f' else None
+            dense[ids] = values
+            self._attributes[attr] = dense
+
+    def __repr__(self):
+        return "<Registry of {} {}s>".format(len(self), self.kind)
+
+    def __len__(self):
+        return len(self.ids_)
+
+    def __contains__(self, id_):
+        return bool(self.known(id_))
+
+    def __getitem__(self, id_):
+        if id_ not in self:
+            raise KeyError(id_)
+        return self._names[id_]
+
+    @property
+    def attributes(self):
+        return sorted(self._attributes)
+
+    def _positions(self, ids):
+        """
+        Positions into the dense arrays, and a mask of the known ones.
+        """
+        ids = np.asarray(ids)
+        if ids.dtype.kind == 'f':
+            valid = ~np.isnan(ids)
+            ids = np.where(valid, ids, -1).astype(np.int64)
+        else:
+            ids = ids.astype(np.int64)
+        in_range = (ids >= 0) & (ids < len(self._names))
+        pos = np.where(in_range, ids, 0)
+        known = in_range & self._known.take(pos) if len(self._names) \
+            else np.zeros(ids.shape, dtype=bool)
+        return pos, known
+
+    def known(self, ids):
+        """
+        Boolean array: is each id registered.
+        """
+        return self._positions(ids)[1]
+
+    def names(self, ids, default=None):
+        """
+        Vectorized id -> name.
+
+        Parameters
+        ----------
+        ids : array-like of int
+            any shape.
+        default : object
+            value for unknown ids. If callable it's called with the id.
+        """
+        ids = np.asarray(ids)
+        pos, known = self._positions(ids)
+        out = self._names.take(pos) if len(self._names) else \
+            np.empty(ids.shape, dtype=object)
+        if not known.all():
+            out = out.copy()
+            if callable(default):
+                missing = ~known
+                out[missing] = [default(x) for x in ids[missing]]
+            else:
+                out[~known] = default
+        return out
+
+    def ids(self, names, default=-1):
+        """
+        Vectorized name -> id. Unknown names get ``default``.
+        """
+        names = np.asarray(names, dtype=object)
+        pos = self._name_index.get_indexer(names.ravel())
+        out = np.where(pos >= 0, self.ids_.take(np.maximum(pos, 0)), default)
+        return out.reshape(names.shape)
+
+    def attribute(self, attr, ids):
+        """
+        Vectorized id -> attribute. Unknown ids get NaN (numeric
+        attributes) or None.
+        """
+        values = self._attributes[attr]
+        pos, known = self._positions(ids)
+        out = values.take(pos) if len(values) else \
+            np.empty(pos.shape, dtype=values.dtype)
+        if not known.all():
+            out = out.copy()
+            out[~known] = np.nan if values.dtype.kind == 'f' else None
+        return out
+
+    def to_frame(self):
+        """
+        All registered entries as a DataFrame indexed by id.
+        """
+        df = pd.DataFrame({'name': self._names.take(self.ids_)},
+                          index=pd.Index(self.ids_, name='id'))
+        for attr in self.attributes:
+            df[attr] = self._attributes[attr].take(self.ids_)
+        return df.sort_index()
+
+
+#-----------------------------------------------------------------------------
+# Registries built from the static data
+
+
+def _build_heroes():
+    names_to_id = static.load('_hero_names_to_id')
+    heroes = static.load('_heroes')
+    names = sorted(names_to_id, key=names_to_id.get)
+    info = [heroes.get(name, {}) for name in names]
+    roles = static.load('_hero_roles')
+    attack = {'DOTA_UNIT_CAP_MELEE_ATTACK': 'melee',
+              'DOTA_UNIT_CAP_RANGED_ATTACK': 'ranged'}
+    primary = {'DOTA_ATTRIBUTE_STRENGTH': 'strength',
+               'DOTA_ATTRIBUTE_AGILITY': 'agility',
+               'DOTA_ATTRIBUTE_INTELLECT': 'intellect'}
+    role_values = np.empty(len(names), dtype=object)
+    role_values[:] = [tuple(roles.get(name, ())) for name in names]
+    attributes = {
+        'roles': role_values,
+        'attack_type': np.array([attack.get(d.get('AttackCapabilities'))
+                                 for d in info], dtype=object),
+        'primary_attribute': np.array([primary.get(d.get('AttributePrimary'))
+                                       for d in info], dtype=object)}
+    return Registry([names_to_id[n] for n in names], names, attributes,
+                    kind='hero')
+
+
+def _build_items():
+    items = static.load('_items')
+    names = sorted(items, key=lambda k: int(items[k]['ID']))
+    cost = [float(items[n].get('ItemCost', np.nan)) for n in names]
+    attributes = {'cost': np.array(cost),
+                  'quality': np.array([items[n].get('ItemQuality')
+                                       for n in names], dtype=object)}
+    return Registry([int(items[n]['ID']) for n in names], names, attributes,
+                    kind='item')
+
+
+def _build_abilities():
+    abilities = static.load('_abilities')
+    names = sorted(abilities, key=lambda k: int(abilities[k]['ID']))
+    return Registry([int(abilities[n]['ID']) for n in names], names,
+                    kind='ability')
+
+
+_builders = {'heroes': _build_heroes,
+             'items': _build_items,
+             'abilities': _build_abilities}
+_registries = {}
+_lock = threading.Lock()
+
+
+def get(kind):
+    """
+    The registry for ``kind`` ('heroes', 'items' or 'abilities'), built
+    on first use.
+    """
+    try:
+        return _registries[kind]
+    except KeyError:
+        pass
+    with _lock:
+        if kind not in _registries:
+            _registries[kind] = _builders[kind]()
+    return _registries[kind]
+
+
+def heroes():
+    return get('heroes')
+
+
+def items():
+    return get('items')
+
+
+def abilities():
+    return get('abilities')
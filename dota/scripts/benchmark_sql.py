@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+"""
+Time the cookbook queries in ``dota.sql.orm`` with and without the
+declared indexes, on a synthetic database.
+
+    python -m dota.scripts.benchmark_sql --matches 20000
+"""
+import os
+import time
+import shutil
+import argparse
+import tempfile
+
+import numpy as np
+from sqlalchemy import or_
+from sqlalchemy.orm import sessionmaker
+
+from dota.sql import orm
+from dota.sql.orm import Game, PlayerGame
+
+parser = argparse.ArgumentParser("Benchmark the SQL indexes.")
+parser.add_argument("--matches", type=int, default=20000,
+                    help="Synthetic matches to load.")
+parser.add_argument("--repeat", type=int, default=3,
+                    help="Best of this many runs per query.")
+parser.add_argument("--seed", type=int, default=0)
+
+
+def synthetic_matches(n, seed=0):
+    """
+    ``n`` random GetMatchDetails-like dicts spread over patches 6.78-6.80,
+    ~2000 players, ~100 teams and ~100 heroes.
+    """
+    rng = np.random.RandomState(seed)
+    start = rng.randint(1370322000, 1400000000, size=n)
+    for i in range(n):
+        accounts = rng.choice(2000, size=10, replace=False) + 1
+        heroes = rng.choice(100, size=10, replace=False) + 1
+        teams = rng.choice(100, size=2, replace=False) + 1
+        players = [{'account_id': int(a), 'hero_id': int(h),
+                    'player_slot': slot if slot < 5 else 128 + slot - 5,
+                    'level': 25, 'denies': 5, 'gold': 1000, 'item_0': 1,
+                    'item_1': 2, 'item_2': 3, 'item_3': 4, 'item_4': 5,
+                    'item_5': 6, 'gold_spent': 10000, 'deaths': 5,
+                    'hero_damage': 10000, 'assists': 10,
+                    'gold_per_min': 500, 'hero_healing': 0,
+                    'last_hits': 100, 'xp_per_min': 500, 'tower_damage': 1000,
+                    'kills': 5, 'leaver_status': 0}
+                   for slot, (a, h) in enumerate(zip(accounts, heroes))]
+        yield {'match_id': i + 1, 'match_seq_num': i + 1,
+               'start_time': int(start[i]), 'leagueid': int(rng.randint(5)),
+               'lobby_type': 1, 'game_mode': 2, 'positive_votes': 0,
+               'negative_votes': 0, 'radiant_win': bool(rng.randint(2)),
+               'duration': 2400, 'first_blood_time': 60,
+               'tower_status_dire': 0, 'tower_status_radiant': 0,
+               'barracks_status_radiant': 0, 'barracks_status_dire': 0,
+               'human_players': 10, 'players': players,
+               'radiant_team_id': int(teams[0]),
+               'radiant_name': 'team{}'.format(teams[0]),
+               'dire_team_id': int(teams[1]),
+               'dire_name': 'team{}'.format(teams[1])}
+
+
+QUERIES = {
+    'count_player_games': lambda s: orm.count_player_games(s),
+    'count_by player/game': lambda s: orm.count_by(s, 'player', 'game'),
+    'filter_by_patch 6.79': lambda s: orm.filter_by_patch(
+        s, start='6.79', stop='6.80').count(),
+    'games of hero': lambda s: s.query(PlayerGame.match_id).filter(
+        PlayerGame.hero_id == 7).order_by(PlayerGame.match_id).all(),
+    'games of player': lambda s: s.query(PlayerGame.match_id).filter(
+        PlayerGame.account_id == 42).order_by(PlayerGame.match_id).all(),
+    'games of team': lambda s: s.query(Game.match_id).filter(
+        or_(Game.radiant_team_id == 7, Game.dire_team_id == 7)).all(),
+    'games of league': lambda s: s.query(Game).filter(
+        Game.leagueid == '3').count(),
+}
+
+
+def time_queries(session, repeat=3):
+    times = {}
+    for name, query in QUERIES.items():
+        best = float('inf')
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            query(session)
+            best = min(best, time.perf_counter() - t0)
+        times[name] = best
+    return times
+
+
+def main():
+    args = parser.parse_args()
+    directory = tempfile.mkdtemp()
+    try:
+        engine = orm.make_engine('sqlite:///' +
+                                 os.path.join(directory, 'bench.db'))
+        orm.bulk_add_to_db(engine, synthetic_matches(args.matches, args.seed),
+                           batch_size=5000)
+        session = sessionmaker(bind=engine)()
+
+        orm.drop_indexes(engine)
+        without = time_queries(session, args.repeat)
+        orm.create_indexes(engine)
+        with_ = time_queries(session, args.repeat)
+        session.close()
+        engine.dispose()
+    finally:
+        shutil.rmtree(directory)
+
+    print("{:<24}{:>12}{:>12}{:>10}".format('query', 'no index', 'indexed',
+                                            'speedup'))
+    for name in QUERIES:
+        print("{:<24}{:>11.1f}ms{:>10.1f}ms{:>9.1f}x".format(
+            name, without[name] * 1e3, with_[name] * 1e3,
+            without[name] / with_[name]))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+"""
+Bring a saved hero synergy (same team) or matchup (opposing teams)
+matrix up to date with a data directory. See ``dota.synergy``.
+"""
+import os
+import argparse
+
+from dota.synergy import MatchupMatrix, SynergyMatrix
+from dota.helpers import CachedGames
+
+KINDS = {'synergy': SynergyMatrix, 'matchup': MatchupMatrix}
+
+parser = argparse.ArgumentParser("Count hero pairs.")
+parser.add_argument("--kind", type=str, choices=sorted(KINDS),
+                    default='synergy')
+parser.add_argument("--data_dir", type=str, help="Path to data direcotry.",
+                    default='~/sandbox/dota/data/pro/')
+parser.add_argument("--out", type=str, help="Path to the .npz matrix.",
+                    default='~/sandbox/dota/data/pro/{kind}.npz')
+parser.add_argument("--chunksize", type=int, help="Games per worker task.",
+                    default=1000)
+parser.add_argument("--jobs", type=int, help="Processes counting games.",
+                    default=1)
+
+
+def main():
+    args = parser.parse_args()
+    out = os.path.expanduser(args.out.format(kind=args.kind))
+    cls = KINDS[args.kind]
+    sm = cls.load(out) if os.path.exists(out) else cls()
+    cached = CachedGames(os.path.expanduser(args.data_dir))
+    new_games = cached.paths(x for x in cached if x not in sm)
+    n = sm.update_games(new_games, chunksize=args.chunksize,
+                        n_jobs=args.jobs)
+    sm.save(out)
+    print("Added {} games.".format(n))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+"""
+Crawl every new match by walking forward through match sequence numbers.
+
+Picks up from the last checkpoint or, failing that, the highest
+``match_seq_num`` in the database. Each batch is written to the data
+directory and inserted into the database before the checkpoint moves on,
+so an interrupted crawl resumes where it stopped.
+"""
+import os
+import json
+import pathlib
+import argparse
+
+from sqlalchemy import func
+from sqlalchemy.orm import sessionmaker
+
+from dota import api
+from dota.helpers import match_writer
+from dota.sql import orm
+
+parser = argparse.ArgumentParser("Crawl new matches by sequence number.")
+parser.add_argument("--key_path", type=str, help="Path to JSON file with steam"
+                    " key.", default='~/Dropbox/bin/api-keys.txt')
+parser.add_argument("--data_dir", type=str, help='Path to data directory.',
+                    default='~/sandbox/dota/data/pro/')
+parser.add_argument("--checkpoint", type=str, help="Checkpoint file. Defaults"
+                    " to <data_dir>/seq_checkpoint.json", default=None)
+parser.add_argument("--start", type=int, help="Sequence number to start at "
+                    "if there's no checkpoint or database.", default=None)
+parser.add_argument("--n_batches", type=int, help="Stop after this many "
+                    "batches. Default: until caught up.", default=None)
+parser.add_argument("--rate", type=float, help="Requests per second.",
+                    default=1)
+parser.add_argument("--leagues_only", action='store_true',
+                    help="Only keep league matches.")
+
+
+def load_checkpoint(path):
+    """
+    The next sequence number to request, or None.
+    """
+    try:
+        with path.open() as f:
+            return json.load(f)['next_match_seq_num']
+    except (OSError, IOError, ValueError, KeyError):
+        return None
+
+
+def save_checkpoint(path, next_seq_num):
+    """
+    Atomically record the next sequence number to request.
+    """
+    tmp = path.with_suffix('.tmp')
+    with tmp.open('w') as f:
+        json.dump({'next_match_seq_num': next_seq_num}, f)
+    os.replace(str(tmp), str(path))
+
+
+def max_stored_seq_num(engine):
+    session = sessionmaker(bind=engine)()
+    try:
+        return session.query(func.max(orm.Game.match_seq_num)).scalar()
+    finally:
+        session.close()
+
+
+def write_matches(matches, data_path):
+    """
+    Store each match in ``data_path``, a directory of JSON files or a
+    ``dota.archive``.
+    """
+    write = match_writer(data_path)
+    for match in matches:
+        write(match)
+
+
+def crawl(h, data_path, engine=None, checkpoint_path=None, start=None,
+          n_batches=None, batch_size=100, keep=None):
+    """
+    Walk forward through match sequence numbers.
+
+    Parameters
+    ----------
+    h : API
+    data_path : Path
+        directory JSON files are written to, or a ``dota.archive``.
+    engine : sqlalchemy engine, optional
+        new matches are also added with ``orm.bulk_add_to_db``.
+    checkpoint_path : Path, optional
+        defaults to ``data_path / 'seq_checkpoint.json'``.
+    start : int, optional
+        used when there's neither a checkpoint nor a stored match.
+    n_batches : int, optional
+        stop after this many requests. Default is to stop when caught up.
+    batch_size : int
+        matches per request (at most 100).
+    keep : callable, optional
+        ``keep(match) -> bool``; other matches are skipped.
+
+    Returns
+    -------
+    next_seq_num : int
+        where the next crawl will start.
+    """
+    if not data_path.exists():
+        data_path.mkdir(parents=True)
+    if checkpoint_path is None:
+        checkpoint_path = data_path / 'seq_checkpoint.json'
+
+    next_seq = load_checkpoint(checkpoint_path)
+    if next_seq is None and engine is not None:
+        stored = max_stored_seq_num(engine)
+        if stored is not None:
+            next_seq = stored + 1
+    if next_seq is None:
+        next_seq = start
+    if next_seq is None:
+        raise ValueError("No checkpoint or stored games. Pass a `start`.")
+
+    i = 0
+    while n_batches is None or i < n_batches:
+        matches = h.get_match_history_by_seq_num(next_seq, batch_size)
+        if len(matches) == 0:
+            break
+        new = [m for m in matches if keep is None or keep(m)]
+        write_matches(new, data_path)
+        if engine is not None and new:
+            orm.bulk_add_to_db(engine, new, verbose=False)
+
+        next_seq = max(m['match_seq_num'] for m in matches) + 1
+        save_checkpoint(checkpoint_path, next_seq)
+        print("Added {} of {} matches. Next sequence number {}".format(
+              len(new), len(matches), next_seq))
+        i += 1
+    return next_seq
+
+
+def main():
+    args = parser.parse_args()
+    key_path = pathlib.Path(os.path.expanduser(args.key_path))
+    data_path = pathlib.Path(os.path.expanduser(args.data_dir))
+    checkpoint = args.checkpoint and pathlib.Path(
+        os.path.expanduser(args.checkpoint))
+
+    with key_path.open() as f:
+        key = json.load(f)['steam']
+
+    h = api.API(key, rate=args.rate)
+    engine = orm.make_engine("sqlite:///" + str(data_path / "pro.db"))
+    keep = (lambda m: int(m.get('leagueid', 0)) != 0) if args.leagues_only \
+        else None
+    crawl(h, data_path, engine=engine, checkpoint_path=checkpoint,
+          start=args.start, n_batches=args.n_batches, keep=keep)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+"""
+Export a data directory to Parquet / Feather files partitioned by patch
+and league. See ``dota.export``.
+"""
+import os
+import argparse
+
+from dota import export
+from dota.helpers import CachedGames
+
+parser = argparse.ArgumentParser("Export JSON DetailsResponses to columnar "
+                                 "files.")
+parser.add_argument("--data_dir", type=str, help="Path to data direcotry.",
+                    default='~/sandbox/dota/data/pro/')
+parser.add_argument("--export_dir", type=str, help="Path to the export.",
+                    default='~/sandbox/dota/data/pro/export/')
+parser.add_argument("--format", type=str, choices=sorted(export.FORMATS),
+                    default='parquet')
+parser.add_argument("--chunksize", type=int, help="Games per part file.",
+                    default=1000)
+
+
+def main():
+    args = parser.parse_args()
+    root = os.path.expanduser(args.export_dir)
+    cached = CachedGames(os.path.expanduser(args.data_dir))
+    # export skips the matches it already has
+    n = export.export(cached.paths(), root, format=args.format,
+                      chunksize=args.chunksize)
+    print("Added {} games.".format(n))
+
+if __name__ == '__main__':
+    main()
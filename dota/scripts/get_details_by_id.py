@@ -4,7 +4,7 @@ import pathlib
 import argparse
 
 from dota import api
-from dota.helpers import cached_games
+from dota.helpers import CachedGames, match_writer
 
 parser = argparse.ArgumentParser("Get new matches by account ID.")
 parser.add_argument("id", type=int, help="Steam ID. e.g.: 76561198102796812 "
@@ -13,6 +13,8 @@ parser.add_argument("--key_path", type=str, help="Path to JSON file with steam"
                     " key.", default='~/Dropbox/bin/api-keys.txt')
 parser.add_argument("--data_dir", type=str, help='Path to data directory.',
                     default='~/sandbox/dota/data/')
+parser.add_argument("--cache_dir", type=str, help="Directory for the on-disk"
+                    " response cache. No caching if omitted.", default=None)
 
 
 def argparser(args):
@@ -22,26 +24,29 @@ def argparser(args):
     return steam_id, key_path, data_dir
 
 
-def get_details(steam_id, key, data_dir):
+def get_details(steam_id, key, data_dir, cache_dir=None):
     """
     Take a steam_id and check for new games. Download details of any
     new games to data_dir. Primarily called from the command line.
+
+    If given, details are read from / written to the response cache in
+    ``cache_dir`` so rebuilding data_dir doesn't hit the network.
     """
-    cached = cached_games(data_dir)
+    cached = CachedGames(data_dir)
 
-    h = api.API(key)
+    h = api.API(key, cache=cache_dir)
     hr = h.get_match_history(account_id=steam_id)
-    new_ids = set(hr.match_ids) - set((int(x.stem.strip('details')) for x in cached))
+    new_ids = {x for x in hr.match_ids if x not in cached}
 
     if len(new_ids) == 0:
         print("No new matches for {}".format(steam_id))
 
     print("Fetching details on {} games".format(len(new_ids)))
 
+    write = match_writer(data_dir)
     for id_ in new_ids:
         dr = h.get_match_details(id_)
-        with (data_dir / (str(dr.match_id) + '.json')).open('w') as f:
-            json.dump(dr.resp, f)
+        write(dr.resp)
         print("Added {}.".format(id_))
 
 if __name__ == '__main__':
@@ -51,4 +56,4 @@ if __name__ == '__main__':
     with key_path.open() as f:
         key = json.load(f)['steam']
 
-    get_details(steam_id, key, data_dir)
+    get_details(steam_id, key, data_dir, cache_dir=args.cache_dir)
@@ -8,7 +8,7 @@ import pathlib
 from lxml import html
 
 from dota import api
-from dota.helpers import cached_games
+from dota.helpers import CachedGames, match_writer
 
 
 def fetch_new_match_ids(match_ids_path):
@@ -44,14 +44,19 @@ def fetch_new_match_ids(match_ids_path):
     return new_ids
 
 
-def get_new_details(match_ids, data_path):
+def get_new_details(match_ids, data_path, cache_dir=None):
+    """
+    Fetch details for matches in ``match_ids`` not already in ``data_path``.
+    With ``cache_dir``, previously fetched details are read from the
+    on-disk response cache instead of the network.
+    """
 
     with open(os.path.expanduser('~/') + 'Dropbox/bin/api-keys.txt') as f:
         key = json.load(f)['steam']
 
-    h = api.API(key=key)
+    h = api.API(key=key, cache=cache_dir)
 
-    cached = [int(x.stem) for x in cached_games(data_path)]  # fragile...
+    cached = CachedGames(data_path)
     new_matches = (x for x in match_ids if int(x) not in cached)
     details = {mid: h.get_match_details(mid) for mid in new_matches}
     return details
@@ -62,13 +67,14 @@ def write_new_details(details, data_path):
     if not data_path.exists():
         data_path.mkdir()
 
+    write = match_writer(data_path)
     for k in details:
-        with (data_path / (str(k) + '.json')).open('w') as f:
-            json.dump(details[k].resp, f)
+        write(details[k].resp)
 
 
 def get_pro_matches(id_store='pro_match_ids.txt',
-                    data_path='~/sandbox/dota/data/pro/'):
+                    data_path='~/sandbox/dota/data/pro/',
+                    cache_dir=None):
     """
     Find new match ids
 
@@ -77,6 +83,9 @@ def get_pro_matches(id_store='pro_match_ids.txt',
 
     id_store : str
     data_path : str
+    cache_dir : str, optional
+        directory of an on-disk response cache, e.g.
+        '~/sandbox/dota/data/cache/'. No cache by default.
     """
     id_store = pathlib.Path(id_store)
     data_path = pathlib.Path(os.path.expanduser(data_path))
@@ -95,7 +104,7 @@ def get_pro_matches(id_store='pro_match_ids.txt',
 
     #--------------------------------------------------------------------------
     # Get Match Details for new matches
-    details = get_new_details(match_ids, data_path)
+    details = get_new_details(match_ids, data_path, cache_dir=cache_dir)
     write_new_details(details, data_path)
 
     #--------------------------------------------------------------------------
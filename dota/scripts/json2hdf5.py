@@ -5,46 +5,326 @@ Given a data directory, convert all details responses to HDF5Store.
 
 import os
 import json
+import time
+from itertools import islice
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 import argparse
 
 import numpy as np
 import pandas as pd
 
-from dota import api
-from dota.helpers import cached_games
+from dota import api, registry
+from dota.helpers import CachedGames, bounded_map
 
 parser = argparse.ArgumentParser("Convert JSON DetailsResponses to HDF5.")
 parser.add_argument("--data_dir", type=str, help="Path to data direcotry.",
                     default='~/sandbox/dota/data/pro/')
 parser.add_argument("--hdf_store", type=str, help="Path to the HDF Store",
                     default='~/sandbox/dota/data/pro/pro.h5')
+parser.add_argument("--chunksize", type=int, help="Games formatted and "
+                    "appended per write.", default=1000)
+parser.add_argument("--jobs", type=int, help="Processes formatting games. "
+                    "The main process is the only writer.", default=1)
+
+
+SIDES = {0: 'radiant', 1: 'dire'}
+STATUSES = ['barracks_status', 'tower_status']
 
 
 def add_by_side(df, dr, item, side):
     """
     Modifies df in place.
+
+    Statuses are stored as their integer bitmask rather than the binary
+    strings ``dr.tower_status()`` / ``dr.barracks_status()`` return.
     """
     vals = getattr(dr, item)
     if callable(vals):
         vals = vals()
     if isinstance(vals, dict):
-        vals = vals.get(side, np.nan)
+        vals = vals.get(SIDES[side], np.nan)
+    if isinstance(vals, str):
+        vals = int(vals, 2)
 
     df.loc[(df.team == side), item] = vals
 
 
-def append_to_store(store, dfs, key='drs'):
+# Store layout. Data columns are indexed and can be used in ``where``
+# clauses (see ``select_matches``); other columns are only read.
+DATA_COLUMNS = ['match_id', 'hero', 'account_id', 'start_time', 'team']
+COMPLIB = 'blosc'  # or 'zlib' where PyTables lacks blosc
+COMPLEVEL = 5
+MAX_SELECTORS = 31  # longest list pandas matches inside the PyTables query
+
+
+def _ids_key(key):
+    # small node listing the match ids stored under ``key``
+    return key + '_match_ids'
+
+
+def _stored_dtypes(s, key):
+    return s.select(key, stop=0).dtypes
+
+
+def _match_dtypes(dfs, dtypes):
+    """
+    Cast ``dfs`` to the dtypes of an existing table, e.g. an integer
+    ``hero`` in stores written before it was stored as float.
+    """
+    for col, dtype in dtypes.items():
+        if col in dfs and dfs[col].dtype != dtype:
+            if dtype.kind in 'iu':
+                dfs[col] = dfs[col].fillna(0)
+            dfs[col] = dfs[col].astype(dtype)
+    return dfs
+
+
+def append_to_store(store, dfs, key='drs', data_columns=DATA_COLUMNS,
+                    complib=COMPLIB, complevel=COMPLEVEL):
+    """
+    Append formatted games to the table ``key`` in ``store``.
+
+    Parameters
+    ----------
+    store : str
+    dfs : list of DataFrames
+        output of ``format_df`` / ``format_dfs``.
+    key : str
+    data_columns : list of str
+        queryable, indexed columns. Only used when the table is created;
+        appends follow the existing table's data columns and dtypes.
+    complib, complevel :
+        compression, see ``pandas.HDFStore``.
+    """
     if dfs == []:
         return None
     dfs = pd.concat(dfs, ignore_index=True)
 
     # will be float if any NaN. Some won't have
     # NaNs so need to recast
-    cols = ['radiant_team_id', 'dire_team_id', 'account_id']
+    cols = ['radiant_team_id', 'dire_team_id', 'account_id', 'hero']
     dfs[cols] = dfs[cols].astype(np.float64)
 
-    dfs.to_hdf(str(store), key=key, append=True)
+    ids = pd.DataFrame({'match_id': dfs['match_id'].unique()})
+    with pd.HDFStore(str(store), complib=complib,
+                     complevel=complevel) as s:
+        if key in s:
+            data_columns = s.get_storer(key).data_columns
+            dfs = _match_dtypes(dfs, _stored_dtypes(s, key))
+            _backfill_ids(s, key)
+        s.append(key, dfs, data_columns=data_columns)
+        s.append(_ids_key(key), ids)
+
+
+def needs_migration(store, key='drs'):
+    """
+    Whether the table ``key`` predates ``DATA_COLUMNS``, so
+    ``select_matches`` can't filter on them. See ``migrate_store``.
+    """
+    with pd.HDFStore(str(store), mode='r') as s:
+        if key not in s:
+            return False
+        return not set(DATA_COLUMNS) <= set(s.get_storer(key).data_columns)
+
+
+def migrate_store(store, key='drs', chunksize=100000,
+                  complib=COMPLIB, complevel=COMPLEVEL):
+    """
+    Rewrite the table ``key`` of a store written before ``DATA_COLUMNS``
+    with those data columns and the current dtypes. The new store is
+    written next to ``store`` and replaces it once complete.
+    """
+    store = str(store)
+    tmp = store + '.migrating'
+    if os.path.exists(tmp):
+        os.remove(tmp)
+    with pd.HDFStore(store, mode='r') as old, \
+            pd.HDFStore(tmp, complib=complib, complevel=complevel) as new:
+        for df in old.select(key, chunksize=chunksize):
+            df = df.reset_index(drop=True)
+            df['hero'] = df['hero'].astype(np.float64)
+            new.append(key, df, data_columns=DATA_COLUMNS)
+            new.append(_ids_key(key),
+                       pd.DataFrame({'match_id': df['match_id'].unique()}))
+    os.replace(tmp, store)
+
+
+def select_matches(store, hero=None, time_range=None, match_id=None,
+                   account_id=None, team=None, columns=None, key='drs'):
+    """
+    Select rows from the games table, filtering in the PyTables query
+    so only matching rows are read.
+
+    Parameters
+    ----------
+    store : str
+    hero : int, str or list of them
+        hero ids or names.
+    time_range : (start, end)
+        bounds on ``start_time``, inclusive. Either may be None.
+    match_id, account_id : int or list of int
+    team : {0, 1}
+        0 for Radiant, 1 for Dire.
+    columns : list of str
+        columns to return, all if None.
+    key : str
+
+    Returns
+    -------
+    df : DataFrame
+
+    Raises
+    ------
+    ValueError
+        if the store predates ``DATA_COLUMNS``; see ``migrate_store``.
+
+    Examples
+    --------
+    select_matches('pro.h5', hero='antimage',
+                   time_range=('2014-01-29', None))
+    """
+    # lists are bound by name ('col=values') rather than spelled out, which
+    # hits numexpr's operand limit. pandas filters lists longer than
+    # MAX_SELECTORS after reading and can't combine them with other terms,
+    # so those are narrowed to their range in the query and matched here.
+    where, post = [], {}
+
+    def member(column, values, name):
+        if len(values) <= MAX_SELECTORS:
+            where.append('{}={}'.format(column, name))
+        else:
+            where.append('{} >= {!r}'.format(column, min(values)))
+            where.append('{} <= {!r}'.format(column, max(values)))
+            post[column] = values
+
+    if hero is not None:
+        heroes = np.atleast_1d(hero)
+        if heroes.dtype.kind in 'OSU':
+            heroes = registry.heroes().ids(heroes)
+        heroes = sorted(set(heroes.astype(float).tolist()))
+        member('hero', heroes, 'heroes')
+    if time_range is not None:
+        start, end = time_range
+        if start is not None:
+            where.append('start_time >= {!r}'.format(
+                str(pd.Timestamp(start))))
+        if end is not None:
+            where.append('start_time <= {!r}'.format(str(pd.Timestamp(end))))
+    if match_id is not None:
+        match_ids = sorted(set(
+            np.atleast_1d(np.asarray(match_id, dtype=int)).tolist()))
+        member('match_id', match_ids, 'match_ids')
+    if account_id is not None:
+        account_ids = sorted(set(
+            np.atleast_1d(np.asarray(account_id, dtype=float)).tolist()))
+        member('account_id', account_ids, 'account_ids')
+    if team is not None:
+        where.append('team == {}'.format(int(team)))
+
+    if where and needs_migration(store, key):
+        raise ValueError("{} has no data columns to filter on; run "
+                         "migrate_store first.".format(store))
+    read = columns
+    if columns is not None and post:
+        read = list(columns) + [c for c in post if c not in columns]
+    with pd.HDFStore(str(store), mode='r') as s:
+        df = s.select(key, where=where or None, columns=read)
+    for column, values in post.items():
+        df = df[df[column].isin(values)]
+    if read is not columns:
+        df = df[list(columns)]
+    return df
+
+
+def stored_match_ids(store, key='drs'):
+    """
+    The match ids already in ``store``, read from the ``<key>_match_ids``
+    node written by ``append_to_store``.
+
+    Stores written before that node existed are read column-only once
+    and the node is added.
+    """
+    with pd.HDFStore(str(store)) as s:
+        if key not in s:
+            return set()
+        _backfill_ids(s, key)
+        return set(s.select(_ids_key(key))['match_id'])
+
+
+def _backfill_ids(s, key):
+    # add the ids node to a table written before it existed
+    if _ids_key(key) in s:
+        return
+    try:
+        ids = s.select_column(key, 'match_id').unique()
+    except (KeyError, ValueError):  # not a data column
+        ids = s.select(key, columns=['match_id'])['match_id'].unique()
+    s.append(_ids_key(key), pd.DataFrame({'match_id': ids}))
+
+
+def _chunks(iterable, size):
+    it = iter(iterable)
+    while True:
+        chunk = list(islice(it, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def format_chunk(games):
+    """
+    Load and format a chunk of games. Runs in worker processes for
+    ``convert(..., n_jobs=N)``.
+    """
+    return format_dfs([api.DetailsResponse.from_json(game) for game in games])
+
+
+def convert(games, store, chunksize=1000, key='drs', verbose=True, n_jobs=1):
+    """
+    Format ``games`` and append them to ``store``, ``chunksize`` games at a
+    time, so memory is bounded by the chunk rather than the backlog.
+
+    Parameters
+    ----------
+    games : iterable of Paths (or anything ``DetailsResponse.from_json``
+        takes)
+    store : str
+        path to the HDF5 store.
+    chunksize : int
+    key : str
+    verbose : bool
+        print progress and throughput after each chunk.
+    n_jobs : int
+        processes formatting chunks. The calling process is the only
+        writer, and chunks are appended in the order of ``games``, so the
+        store is the same as with the default of 1 (no pool).
+
+    Returns
+    -------
+    n_games : int
+    """
+    total = len(games) if hasattr(games, '__len__') else '?'
+    n = 0
+    t0 = time.time()
+
+    def write(frames):
+        nonlocal n
+        for df in frames:
+            append_to_store(store, [df], key=key)
+            n += df['match_id'].nunique()
+            if verbose:
+                elapsed = max(time.time() - t0, 1e-9)
+                print("{}/{} games ({:.1f} games/s)".format(n, total,
+                                                           n / elapsed))
+
+    chunks = _chunks(games, chunksize)
+    if n_jobs == 1:
+        write(map(format_chunk, chunks))
+    else:
+        with ProcessPoolExecutor(max_workers=n_jobs) as pool:
+            write(bounded_map(pool, format_chunk, chunks, ahead=2 * n_jobs))
+    return n
 
 
 def format_df(dr):
@@ -53,7 +333,7 @@ def format_df(dr):
     mr['team'] = mr.team.map({'Radiant': 0, 'Dire': 1})
     mr['hero'] = mr.hero.map(api._hero_names_to_id)
 
-    for item in ['barracks_status', 'tower_status']:
+    for item in STATUSES:
         for side in [0, 1]:
             add_by_side(mr, dr, item, side)
 
@@ -65,35 +345,69 @@ def format_df(dr):
     return mr
 
 
-def main():
+def format_dfs(drs):
+    """
+    Vectorized ``format_df`` over many DetailsResponses (or raw match
+    dicts), built from ``api.match_reports`` in one columnar pass.
 
-    args = parser.parse_args()
-    store = os.path.expanduser(args.hdf_store)
-    data_dir = Path(os.path.expanduser(args.data_dir))
+    Returns
+    -------
+    df : DataFrame
+        the concatenation of ``format_df`` for each match, sorted by
+        ``(match_id, team, hero)``, with a fresh integer index.
+    """
+    resps = [api._as_resp(dr) for dr in drs]
+    mr = api.match_reports(resps).reset_index()
+    mr['team'] = (mr['team'] == 'Dire').astype(np.int64)
+    hero = registry.heroes().ids(mr['hero'].values)
+    if (hero < 0).any():
+        hero = np.where(hero < 0, np.nan, hero)
+    mr['hero'] = hero
+
+    games = pd.DataFrame({'match_id': [r['match_id'] for r in resps],
+                          'dire_team_id': [r.get('dire_team_id')
+                                           for r in resps],
+                          'radiant_team_id': [r.get('radiant_team_id')
+                                              for r in resps],
+                          'duration': [r['duration'] for r in resps],
+                          'game_mod': [r.get('game_mode') for r in resps],
+                          'start_time': pd.to_datetime(
+                              [r['start_time'] for r in resps], unit='s',
+                              utc=True)},
+                         columns=['match_id', 'dire_team_id',
+                                  'radiant_team_id', 'duration', 'game_mod',
+                                  'start_time'])
+    status = ['{}_{}'.format(item, side) for item in STATUSES
+              for side in ('radiant', 'dire')]
+    for col in status:
+        games[col] = [r.get(col, np.nan) for r in resps]
+    games = games.drop_duplicates('match_id').set_index('match_id')
+    mr = mr.join(games, on='match_id')
 
-    cached = cached_games(data_dir)
+    # the player's own side, as in add_by_side
+    dire = (mr['team'] == 1).values
+    for item in STATUSES:
+        radiant = mr.pop('{}_radiant'.format(item)).values
+        mr[item] = np.where(dire, mr.pop('{}_dire'.format(item)).values,
+                            radiant).astype(np.float64)
+    return mr
 
-    # first time. Generate the store
-    if not os.path.isfile(store):
-        pd.HDFStore(store)
 
-    with pd.get_store(store) as s:
+def main():
 
-        try:
-            stored = s.select('drs')['match_id'].unique()
-        except KeyError:
-            stored = []
+    args = parser.parse_args()
+    store = os.path.expanduser(args.hdf_store)
+    data_dir = Path(os.path.expanduser(args.data_dir))
 
-    new_games = filter(lambda x: int(x.stem) not in stored, cached)
+    cached = CachedGames(data_dir)
+    if os.path.exists(store) and needs_migration(store):
+        print("Adding data columns to {}.".format(store))
+        migrate_store(store)
+    stored = stored_match_ids(store)
+    new_games = cached.paths(x for x in cached if x not in stored)
 
-    dfs = []
-    i = 0  # if no new games
-    for i, game in enumerate(new_games, 1):
-        dr = api.DetailsResponse.from_json(str(game))
-        dfs.append(format_df(dr))
-    else:
-        append_to_store(store, dfs)
-        print("Added {} games.".format(i))
+    n = convert(new_games, store, chunksize=args.chunksize, n_jobs=args.jobs)
+    print("Added {} games.".format(n))
 
 if __name__ == '__main__':
     main()
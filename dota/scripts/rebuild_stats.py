@@ -0,0 +1,22 @@
+# -*- coding: utf-8 -*-
+"""
+Recompute the hero / player / team aggregate tables of a database.
+"""
+import os
+import argparse
+
+from dota.sql import orm
+
+parser = argparse.ArgumentParser("Rebuild the SQL aggregate tables.")
+parser.add_argument("--db", type=str, help="Path to the SQLite database.",
+                    default='~/sandbox/dota/data/pro/pro.db')
+
+
+def main():
+    args = parser.parse_args()
+    engine = orm.make_engine('sqlite:///' + os.path.expanduser(args.db))
+    orm.rebuild_stats(engine)
+    engine.dispose()
+
+if __name__ == '__main__':
+    main()
@@ -1,19 +1,26 @@
 # -*- coding: utf-8 -*-
 import json
+import time
 import pathlib
-from datetime import datetime
+from itertools import islice
+from concurrent.futures import ProcessPoolExecutor
 
 import pandas as pd
+import sqlalchemy
 from sqlalchemy import (Boolean, Column, Integer, String, create_engine,
-                        ForeignKey, func)
+                        ForeignKey, Index, and_, bindparam, case, func,
+                        select, union_all)
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, relationship
 
-from dota import api
-from dota.helpers import cached_games
+from dota import api, patches
+from dota.helpers import CachedGames, bounded_map
 
 Base = declarative_base()
 
+# select(*columns) vs. the older select([columns])
+_SA14 = tuple(int(x) for x in sqlalchemy.__version__.split('.')[:2]) >= (1, 4)
+
 #-----------------------------------------------------------------------------
 # ORM Classes
 
@@ -21,6 +28,10 @@ Base = declarative_base()
 class PlayerGame(Base):
 
     __tablename__ = 'playergames'
+    __table_args__ = (
+        Index('ix_playergames_hero_id_match_id', 'hero_id', 'match_id'),
+        Index('ix_playergames_account_id_match_id', 'account_id', 'match_id'),
+    )
 
     match_id = Column(Integer, ForeignKey('games.match_id'), primary_key=True)
     account_id = Column(Integer, ForeignKey('players.account_id'), primary_key=True)
@@ -84,6 +95,13 @@ class PlayerGame(Base):
 class Game(Base):
 
     __tablename__ = 'games'
+    __table_args__ = (
+        Index('ix_games_start_time', 'start_time'),
+        Index('ix_games_leagueid', 'leagueid'),
+        Index('ix_games_radiant_team_id', 'radiant_team_id'),
+        Index('ix_games_dire_team_id', 'dire_team_id'),
+        Index('ix_games_patch_id', 'patch_id'),
+    )
 
     match_id = Column(Integer, primary_key=True)
     dire_team_id = Column(Integer, ForeignKey('teams.team_id'))
@@ -107,6 +125,7 @@ class Game(Base):
     barracks_status_radiant = Column(Integer)
     barracks_status_dire = Column(Integer)
     human_players = Column(Integer)
+    patch_id = Column(Integer, ForeignKey('patches.patch_id'))
 
     players = relationship("PlayerGame", backref="games")
     teams = relationship("TeamGame", backref="games")
@@ -131,11 +150,24 @@ class Game(Base):
         self.barracks_status_radiant = resp['barracks_status_radiant']
         self.barracks_status_dire = resp['barracks_status_dire']
         self.human_players = resp['human_players']
+        self.patch_id = patches.patch_id(self.start_time)
 
     def __repr__(self):
         return "<Game {}>".format(self.match_id)
 
 
+class Patch(Base):
+
+    __tablename__ = 'patches'
+
+    patch_id = Column(Integer, primary_key=True)
+    name = Column(String, unique=True, nullable=False)
+    start_time = Column(Integer, nullable=False)
+
+    def __repr__(self):
+        return "<Patch {}>".format(self.name)
+
+
 class Player(Base):
 
     __tablename__ = 'players'
@@ -166,6 +198,7 @@ class Team(Base):
 class TeamPlayer(Base):
 
     __tablename__ = 'teamplayers'
+    __table_args__ = (Index('ix_teamplayers_player_id', 'player_id'),)
 
     team_id = Column(Integer, ForeignKey('teams.team_id'), primary_key=True)
     player_id = Column(Integer, ForeignKey('players.account_id'), primary_key=True)
@@ -184,6 +217,7 @@ class TeamPlayer(Base):
 class TeamGame(Base):
 
     __tablename__ = 'teamgames'
+    __table_args__ = (Index('ix_teamgames_match_id', 'match_id'),)
 
     team_id = Column(Integer, ForeignKey('teams.team_id'), primary_key=True)
     match_id = Column(Integer, ForeignKey('games.match_id'), primary_key=True)
@@ -193,6 +227,68 @@ class TeamGame(Base):
         return "<Team {}. Game {}.".format(self.team_id,
                                            self.match_id)
 
+
+# Aggregates. Kept up to date by ``add_to_db`` and ``BulkLoader`` in the
+# same transaction as the inserts; ``rebuild_stats`` recomputes them.
+
+class HeroStats(Base):
+
+    __tablename__ = 'herostats'
+
+    hero_id = Column(Integer, primary_key=True)
+    games = Column(Integer, nullable=False, default=0)
+    wins = Column(Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return "<Hero {}. {}-{}>".format(self.hero_id, self.wins,
+                                         self.games - self.wins)
+
+
+class PlayerStats(Base):
+
+    __tablename__ = 'playerstats'
+
+    account_id = Column(Integer, ForeignKey('players.account_id'),
+                        primary_key=True)
+    games = Column(Integer, nullable=False, default=0)
+    wins = Column(Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return "<Player {}. {}-{}>".format(self.account_id, self.wins,
+                                           self.games - self.wins)
+
+
+class TeamStats(Base):
+
+    __tablename__ = 'teamstats'
+
+    team_id = Column(Integer, ForeignKey('teams.team_id'), primary_key=True)
+    games = Column(Integer, nullable=False, default=0)
+    wins = Column(Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return "<Team {}. {}-{}>".format(self.team_id, self.wins,
+                                         self.games - self.wins)
+
+
+class AbilityUpgrade(Base):
+
+    __tablename__ = 'ability_upgrades'
+    __table_args__ = (
+        Index('ix_ability_upgrades_hero_id_level', 'hero_id', 'level'),
+    )
+
+    match_id = Column(Integer, ForeignKey('games.match_id'), primary_key=True)
+    hero_id = Column(Integer, primary_key=True)
+    level = Column(Integer, primary_key=True)
+    account_id = Column(Integer)  # NULL for private accounts
+    ability_id = Column(Integer)
+    time = Column(Integer)
+
+    def __repr__(self):
+        return "<Game {}. Hero {} level {}: {}>".format(
+            self.match_id, self.hero_id, self.level, self.ability_id)
+
 #-----------------------------------------------------------------------------
 # Helper functions for manipulation the db
 
@@ -201,9 +297,141 @@ def make_engine(filepath='sqlite:///pro.db'):
 
     engine = create_engine(filepath)
     Base.metadata.create_all(engine)
+    added = add_missing_columns(engine)
+    create_indexes(engine)
+    if sync_patches(engine) or 'games.patch_id' in added:
+        stamp_patches(engine)
+    _ensure_stats(engine)
     return engine
 
 
+def add_missing_columns(engine):
+    """
+    ``ALTER TABLE ... ADD COLUMN`` for declared columns missing from
+    existing tables (``create_all`` only creates whole tables).
+
+    Returns
+    -------
+    added : list of str
+        ``table.column`` names.
+    """
+    inspector = sqlalchemy.inspect(engine)
+    added = []
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            existing = {c['name'] for c in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                conn.execute(sqlalchemy.text(
+                    'ALTER TABLE {} ADD COLUMN {} {}'.format(
+                        table.name, column.name,
+                        column.type.compile(engine.dialect))))
+                added.append('{}.{}'.format(table.name, column.name))
+    return added
+
+
+def sync_patches(engine):
+    """
+    Make the ``patches`` table match ``dota/patches.json``.
+
+    Returns
+    -------
+    changed : bool
+        whether any patch was added or its start time changed, in which
+        case games need restamping (``stamp_patches``).
+    """
+    table = Patch.__table__
+    changed = False
+    with engine.begin() as conn:
+        q = select(*table.columns) if _SA14 else select(list(table.columns))
+        existing = {r[0]: tuple(r) for r in conn.execute(q)}
+        for p in patches.load():
+            row = (p['patch_id'], p['patch'], p['start_time'])
+            if existing.get(row[0]) == row:
+                continue
+            if row[0] in existing:
+                conn.execute(table.delete().where(
+                    table.c.patch_id == row[0]))
+            conn.execute(table.insert(), [dict(zip(['patch_id', 'name',
+                                                    'start_time'], row))])
+            changed = True
+    return changed
+
+
+def stamp_patches(engine):
+    """
+    Set ``Game.patch_id`` of every game from its start time and the
+    ``patches`` table. New games are stamped at ingest; this backfills
+    existing databases and restamps after a patch is added.
+    """
+    games, table = Game.__table__, Patch.__table__
+    with engine.begin() as conn:
+        q = select(table.c.patch_id, table.c.start_time) if _SA14 else \
+            select([table.c.patch_id, table.c.start_time])
+        rows = sorted(conn.execute(q), key=lambda r: r[1])
+        before = games.c.start_time < rows[0][1] if rows else \
+            sqlalchemy.true()
+        conn.execute(games.update().where(before).values(patch_id=None))
+        for i, (patch_id, start) in enumerate(rows):
+            cond = games.c.start_time >= start
+            if i + 1 < len(rows):
+                cond = and_(cond, games.c.start_time < rows[i + 1][1])
+            conn.execute(games.update().where(cond).values(
+                patch_id=patch_id))
+
+
+def create_indexes(engine, analyze=True):
+    """
+    Add any declared index missing from an existing database.
+
+    ``create_all`` only creates indexes along with their tables, so
+    databases made before an index was declared need this. It's a no-op
+    when they're all there (``make_engine`` calls it on every open).
+
+    Parameters
+    ----------
+    engine : sqlalchemy engine
+    analyze : bool
+        refresh the query planner's statistics (``ANALYZE``) if any index
+        was created.
+
+    Returns
+    -------
+    created : list of str
+        names of the indexes created.
+    """
+    existing = set()
+    inspector = sqlalchemy.inspect(engine)
+    for table in Base.metadata.sorted_tables:
+        existing.update(ix['name'] for ix in
+                        inspector.get_indexes(table.name))
+    created = []
+    for table in Base.metadata.sorted_tables:
+        for index in sorted(table.indexes, key=lambda ix: ix.name):
+            if index.name not in existing:
+                index.create(engine)
+                created.append(index.name)
+    if created and analyze and engine.dialect.name in ('sqlite',
+                                                       'postgresql'):
+        with engine.begin() as conn:
+            conn.execute(sqlalchemy.text('ANALYZE'))
+    return created
+
+
+def drop_indexes(engine):
+    """
+    Drop the declared indexes, e.g. before a very large load or to
+    benchmark without them. ``create_indexes`` puts them back.
+    """
+    inspector = sqlalchemy.inspect(engine)
+    for table in Base.metadata.sorted_tables:
+        existing = {ix['name'] for ix in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name in existing:
+                index.drop(engine)
+
+
 def add_to_db(engine, games):
     """
     engine : sqlalchemy engine
@@ -213,11 +441,16 @@ def add_to_db(engine, games):
     session = Session()
 
     gs = []
+    deltas = _empty_deltas()
+    upgrades = []
     for g in games:
 
         with g.open() as f:
             d = api.DetailsResponse(json.load(f))
 
+        rows = match_rows(d.resp)
+        _merge_deltas(deltas, stat_deltas(rows))
+        upgrades.extend(rows['ability_upgrades'])
         game = Game(d.resp)
         gs.append(game)
         pgs = []
@@ -260,11 +493,284 @@ def add_to_db(engine, games):
         session.add_all(pgs)
         session.add_all(pls)
     session.add_all(gs)
+    session.flush()
+    if upgrades:
+        cols = _columns(AbilityUpgrade)
+        session.connection().execute(AbilityUpgrade.__table__.insert(),
+                                     [dict(zip(cols, r)) for r in upgrades])
+    _apply_stats(session.connection(), deltas)
     session.commit()
     return session
 
 
-def update_db(data_path):
+#-----------------------------------------------------------------------------
+# Bulk loading
+
+_PRIVATE = 4294967295
+
+# insertion order respects the foreign keys
+BULK_TABLES = ['teams', 'players', 'games', 'teamplayers', 'playergames',
+               'ability_upgrades']
+
+
+def _columns(model):
+    return [c.name for c in model.__table__.columns]
+
+
+def _valid_account(account_id):
+    return not (account_id is None or pd.isnull(account_id) or
+                account_id == _PRIVATE)
+
+
+def match_rows(resp):
+    """
+    Normalize one match into plain row tuples.
+
+    Parameters
+    ----------
+    resp : dict
+        a GetMatchDetails result
+
+    Returns
+    -------
+    rows : dict
+        table name -> list of tuples, in the column order of that table's
+        model. Players with private account ids are dropped.
+    """
+    match_id = resp['match_id']
+    game = Game(resp)
+    rows = {'games': [tuple(getattr(game, c) for c in _columns(Game))],
+            'teams': [], 'players': [], 'teamplayers': [], 'playergames': [],
+            'ability_upgrades': _upgrade_rows(resp)}
+
+    pg_columns = _columns(PlayerGame)[2:]
+    for player in resp['players']:
+        account_id = player.get('account_id')
+        if not _valid_account(account_id):
+            continue
+        rows['players'].append((account_id, None))
+        rows['playergames'].append(
+            (match_id, account_id) + tuple(player[c] for c in pg_columns))
+
+    for side in ['radiant', 'dire']:
+        team_id = resp.get(side + '_team_id')
+        if team_id is None:
+            continue
+        rows['teams'].append((team_id, resp.get(side + '_name')))
+        for player in resp['players']:
+            account_id = player.get('account_id')
+            on_side = (player['player_slot'] < 5) == (side == 'radiant')
+            if on_side and _valid_account(account_id):
+                rows['teamplayers'].append((team_id, account_id))
+    return rows
+
+
+def _upgrade_rows(resp):
+    cols = api.upgrade_columns([resp])
+    account_id = cols['account_id'].astype(object)
+    account_id[account_id == -1] = None
+    cols['account_id'] = account_id
+    # ints, not numpy scalars, for the DB-API
+    return list(zip(*(cols[c].tolist() for c in _columns(AbilityUpgrade))))
+
+
+def _load_resp(game):
+    if isinstance(game, dict):
+        return game
+    with game.open() as f:
+        return json.load(f)
+
+
+class BulkLoader:
+    """
+    Insert matches with Core-level executemany in batches.
+
+    Parameters
+    ----------
+    engine : sqlalchemy engine
+    batch_size : int
+        number of matches per transaction.
+
+    Notes
+    -----
+    The keys of existing games, teams, players and team-players are read
+    once up front, so no per-row queries are issued. Rows already known
+    are skipped in Python; on SQLite inserts are also ``INSERT OR IGNORE``.
+    Player games and ability upgrades are only ever added with their (new)
+    match, so their keys aren't tracked; that would hold ~10 keys per match
+    of the whole corpus in memory.
+
+    Examples
+    --------
+    loader = BulkLoader(engine)
+    for resp in resps:
+        loader.add(match_rows(resp))
+    stats = loader.close()
+    """
+
+    _keys = {'games': 1, 'teams': 1, 'players': 1, 'teamplayers': 2,
+             'playergames': 0, 'ability_upgrades': 0}
+
+    def __init__(self, engine, batch_size=1000):
+        self.engine = engine
+        self.batch_size = batch_size
+        self.tables = {t: Base.metadata.tables[t] for t in BULK_TABLES}
+        self.columns = {t: [c.name for c in self.tables[t].columns]
+                        for t in BULK_TABLES}
+        self.known = self._preload()
+        self.pending = {t: [] for t in BULK_TABLES}
+        self.pending_stats = _empty_deltas()
+        self.n_pending = 0
+        self.n_games = 0
+        self.n_rows = 0
+        self.start = time.time()
+
+    def _preload(self):
+        known = {}
+        with self.engine.connect() as conn:
+            for name in BULK_TABLES:
+                n = self._keys[name]
+                if n == 0:
+                    known[name] = None
+                    continue
+                cols = list(self.tables[name].primary_key.columns)[:n]
+                rows = conn.execute(select(*cols) if _SA14 else
+                                    select(cols)).fetchall()
+                known[name] = {r[0] if n == 1 else tuple(r) for r in rows}
+        return known
+
+    def _key(self, name, row):
+        n = self._keys[name]
+        return row[0] if n == 1 else tuple(row[:n])
+
+    def add(self, rows):
+        """
+        Queue the rows of one match (see ``match_rows``). Duplicate
+        matches are ignored.
+        """
+        match_id = rows['games'][0][0]
+        if match_id in self.known['games']:
+            return
+        for name in BULK_TABLES:
+            known = self.known[name]
+            if known is None:
+                self.pending[name].extend(rows[name])
+                continue
+            for row in rows[name]:
+                key = self._key(name, row)
+                if key in known:
+                    continue
+                known.add(key)
+                self.pending[name].append(row)
+        _merge_deltas(self.pending_stats, stat_deltas(rows))
+        self.n_pending += 1
+        if self.n_pending >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """
+        Write queued rows in one transaction.
+        """
+        if not self.n_pending:
+            return
+        with self.engine.begin() as conn:
+            self._write(conn)
+        self.n_games += self.n_pending
+        self.n_pending = 0
+
+    def _write(self, conn):
+        for name in BULK_TABLES:
+            rows = self.pending[name]
+            if not rows:
+                continue
+            table = self.tables[name]
+            stmt = table.insert()
+            if conn.dialect.name == 'sqlite':
+                stmt = stmt.prefix_with('OR IGNORE')
+            cols = self.columns[name]
+            conn.execute(stmt, [dict(zip(cols, row)) for row in rows])
+            self.n_rows += len(rows)
+            self.pending[name] = []
+        _apply_stats(conn, self.pending_stats)
+        self.pending_stats = _empty_deltas()
+
+    def stats(self):
+        elapsed = time.time() - self.start
+        return {'games': self.n_games, 'rows': self.n_rows,
+                'seconds': elapsed,
+                'rows_per_sec': self.n_rows / elapsed if elapsed else 0.}
+
+    def close(self):
+        """
+        Flush and return ``stats()``.
+        """
+        self.flush()
+        return self.stats()
+
+
+def decode_match(game):
+    """
+    Load a match (Path or dict) and normalize it into row tuples. Runs in
+    worker processes for ``bulk_add_to_db(..., n_jobs=N)``.
+    """
+    return match_rows(_load_resp(game))
+
+
+def decode_matches(games):
+    """
+    ``decode_match`` over a chunk of games.
+    """
+    return [decode_match(game) for game in games]
+
+
+def bulk_add_to_db(engine, games, batch_size=1000, verbose=True, n_jobs=1,
+                   chunksize=64):
+    """
+    Bulk version of ``add_to_db``.
+
+    Parameters
+    ----------
+    engine : sqlalchemy engine
+    games : iterable of Paths or dicts
+        JSON files of, or already decoded, GetMatchDetails results.
+    batch_size : int
+        matches per transaction.
+    verbose : bool
+        print a rows per second summary.
+    n_jobs : int
+        number of processes decoding and normalizing matches. The calling
+        process is the only writer to the database. Defaults to 1 (no
+        pool).
+    chunksize : int
+        matches sent to a worker at a time when ``n_jobs > 1``. At most
+        ``2 * n_jobs`` chunks are decoded ahead of the writer.
+
+    Returns
+    -------
+    stats : dict
+        games, rows, seconds and rows_per_sec.
+    """
+    loader = BulkLoader(engine, batch_size=batch_size)
+    if n_jobs == 1:
+        for rows in map(decode_match, games):
+            loader.add(rows)
+    else:
+        # at most 2 chunks per worker decoded ahead of the writer
+        games = iter(games)
+        chunks = iter(lambda: list(islice(games, chunksize)), [])
+        with ProcessPoolExecutor(max_workers=n_jobs) as pool:
+            for batch in bounded_map(pool, decode_matches, chunks,
+                                     ahead=2 * n_jobs):
+                for rows in batch:
+                    loader.add(rows)
+    stats = loader.close()
+    if verbose:
+        print("Inserted {games} games ({rows} rows) in {seconds:.1f}s. "
+              "{rows_per_sec:.0f} rows/s".format(**stats))
+    return stats
+
+
+def update_db(data_path, batch_size=1000, n_jobs=1):
     """
     Create an engine and session, query for existing game ids.
     Add new files in data dir to.
@@ -274,6 +780,10 @@ def update_db(data_path):
     ----------
     data_path : Path
         path to the pro match directory. Engine is at data_path / pro.db
+    batch_size : int
+        matches per transaction. See ``bulk_add_to_db``.
+    n_jobs : int
+        processes used to decode the JSON files. See ``bulk_add_to_db``.
     """
     engine = make_engine("sqlite:///" + str(data_path / "pro.db"))
 
@@ -284,12 +794,224 @@ def update_db(data_path):
         sql_games = set(list(zip(*session.query(Game.match_id).all()))[0])
     except IndexError:  # new db
         sql_games = set()
-    cached = cached_games(data_path.resolve())  # JSON files on disk
-    new_games = (x for x in cached if int(x.stem) not in sql_games)
+    cached = CachedGames(data_path.resolve())  # JSON files on disk
+    new_games = cached.paths(x for x in cached if x not in sql_games)
 
-    session = add_to_db(engine, new_games)
+    bulk_add_to_db(engine, new_games, batch_size=batch_size, n_jobs=n_jobs)
     return engine, session
 
+#-----------------------------------------------------------------------------
+# Aggregate tables
+
+STAT_TABLES = ['herostats', 'playerstats', 'teamstats']
+
+
+def _empty_deltas():
+    return {name: {} for name in STAT_TABLES}
+
+
+def _bump(counts, key, win):
+    games, wins = counts.get(key, (0, 0))
+    counts[key] = (games + 1, wins + int(win))
+
+
+def _merge_deltas(total, deltas):
+    for name in STAT_TABLES:
+        counts = total[name]
+        for key, (games, wins) in deltas[name].items():
+            g, w = counts.get(key, (0, 0))
+            counts[key] = (g + games, w + wins)
+
+
+def stat_deltas(rows):
+    """
+    Increments to the aggregate tables for the rows of one match.
+
+    Parameters
+    ----------
+    rows : dict
+        output of ``match_rows``.
+
+    Returns
+    -------
+    deltas : dict
+        table name -> {key: (games, wins)}.
+    """
+    game = dict(zip(_columns(Game), rows['games'][0]))
+    radiant_win = bool(game['radiant_win'])
+    deltas = _empty_deltas()
+    cols = _columns(PlayerGame)
+    for row in rows['playergames']:
+        pg = dict(zip(cols, row))
+        win = (pg['player_slot'] < 5) == radiant_win
+        _bump(deltas['herostats'], pg['hero_id'], win)
+        _bump(deltas['playerstats'], pg['account_id'], win)
+    for side, win in [('radiant', radiant_win), ('dire', not radiant_win)]:
+        team_id = game[side + '_team_id']
+        if team_id is not None:
+            _bump(deltas['teamstats'], team_id, win)
+    return deltas
+
+
+def _apply_stats(conn, deltas, chunksize=500):
+    """
+    Add ``deltas`` to the aggregate tables: update the keys that exist,
+    insert the rest.
+    """
+    for name in STAT_TABLES:
+        counts = deltas[name]
+        if not counts:
+            continue
+        table = Base.metadata.tables[name]
+        key = list(table.primary_key.columns)[0]
+        keys = list(counts)
+        existing = set()
+        for i in range(0, len(keys), chunksize):  # bound the IN list
+            q = select(key) if _SA14 else select([key])
+            q = q.where(key.in_(keys[i:i + chunksize]))
+            existing.update(r[0] for r in conn.execute(q))
+        updates = [{'k': k, 'g': counts[k][0], 'w': counts[k][1]}
+                   for k in keys if k in existing]
+        inserts = [{key.name: k, 'games': counts[k][0], 'wins': counts[k][1]}
+                   for k in keys if k not in existing]
+        if updates:
+            stmt = table.update().where(key == bindparam('k')).values(
+                games=table.c.games + bindparam('g'),
+                wins=table.c.wins + bindparam('w'))
+            conn.execute(stmt, updates)
+        if inserts:
+            conn.execute(table.insert(), inserts)
+
+
+def _case(when, then, else_):
+    if _SA14:
+        return case((when, then), else_=else_)
+    return case([(when, then)], else_=else_)
+
+
+def _stat_selects():
+    pg, g = PlayerGame.__table__, Game.__table__
+    won = _case(((pg.c.player_slot < 5) == g.c.radiant_win), 1, 0)
+    joined = pg.join(g, pg.c.match_id == g.c.match_id)
+
+    def by(col):
+        cols = [col, func.count().label('games'), func.sum(won).label('wins')]
+        q = select(*cols) if _SA14 else select(cols)
+        return q.select_from(joined).group_by(col)
+
+    sides = []
+    for team_id, win in [(g.c.radiant_team_id, g.c.radiant_win),
+                         (g.c.dire_team_id, ~g.c.radiant_win)]:
+        cols = [team_id.label('team_id'), _case(win, 1, 0).label('won')]
+        q = select(*cols) if _SA14 else select(cols)
+        sides.append(q.where(team_id.isnot(None)))
+    sides = union_all(*sides).alias('sides')
+    cols = [sides.c.team_id, func.count().label('games'),
+            func.sum(sides.c.won).label('wins')]
+    teams = select(*cols) if _SA14 else select(cols)
+    teams = teams.group_by(sides.c.team_id)
+    return {'herostats': by(pg.c.hero_id),
+            'playerstats': by(pg.c.account_id),
+            'teamstats': teams}
+
+
+def rebuild_stats(engine):
+    """
+    Recompute the aggregate tables from ``games`` and ``playergames`` in
+    one transaction. Needed after writing to those tables by other means
+    than ``add_to_db`` / ``BulkLoader``.
+    """
+    selects = _stat_selects()
+    with engine.begin() as conn:
+        for name in STAT_TABLES:
+            table = Base.metadata.tables[name]
+            conn.execute(table.delete())
+            conn.execute(table.insert().from_select(
+                [c.name for c in table.columns], selects[name]))
+
+
+def _ensure_stats(engine):
+    # databases from before the aggregate tables existed
+    with engine.connect() as conn:
+        q = (select(func.count()) if _SA14 else select([func.count()]))
+        has_games = conn.execute(
+            q.select_from(Game.__table__)).scalar()
+        has_stats = conn.execute(
+            q.select_from(HeroStats.__table__)).scalar()
+    if has_games and not has_stats:
+        rebuild_stats(engine)
+
+
+def hero_stats(session, patch=None):
+    """
+    Games and wins per hero id, from the aggregate table.
+
+    Parameters
+    ----------
+    session : Session
+    patch : str, optional
+        only count games of this patch, e.g. '6.80'. These are counted
+        from ``playergames`` with an indexed ``patch_id`` filter.
+
+    Returns
+    -------
+    stats : DataFrame
+        indexed by hero_id, with games, wins and win_rate.
+    """
+    if patch is None:
+        return _stats_frame(session, HeroStats, 'hero_id')
+    patch_id = session.query(Patch.patch_id).filter(
+        Patch.name == patch).scalar()
+    if patch_id is None:
+        raise KeyError(patch)
+    won = _case(((PlayerGame.player_slot < 5) == Game.radiant_win), 1, 0)
+    rows = session.query(PlayerGame.hero_id, func.count(), func.sum(won)).\
+        join(Game, PlayerGame.match_id == Game.match_id).\
+        filter(Game.patch_id == patch_id).\
+        group_by(PlayerGame.hero_id).all()
+    df = pd.DataFrame(rows, columns=['hero_id', 'games', 'wins'])
+    df = df.set_index('hero_id')
+    df['win_rate'] = df['wins'] / df['games']
+    return df.sort_index()
+
+
+def player_stats(session):
+    return _stats_frame(session, PlayerStats, 'account_id')
+
+
+def team_stats(session):
+    return _stats_frame(session, TeamStats, 'team_id')
+
+
+def _stats_frame(session, model, key):
+    rows = session.query(getattr(model, key), model.games, model.wins).all()
+    df = pd.DataFrame(rows, columns=[key, 'games', 'wins']).set_index(key)
+    df['win_rate'] = df['wins'] / df['games']
+    return df.sort_index()
+
+
+def skill_builds(session, hero_id=None):
+    """
+    Stored skill builds, like ``api.skill_builds`` without the names.
+
+    Parameters
+    ----------
+    session : Session
+    hero_id : int, optional
+        only this hero's builds (uses the ``(hero_id, level)`` index).
+
+    Returns
+    -------
+    builds : DataFrame
+    """
+    cols = _columns(AbilityUpgrade)
+    query = session.query(*[getattr(AbilityUpgrade, c) for c in cols])
+    if hero_id is not None:
+        query = query.filter(AbilityUpgrade.hero_id == hero_id)
+    query = query.order_by(AbilityUpgrade.match_id, AbilityUpgrade.hero_id,
+                           AbilityUpgrade.level)
+    return pd.DataFrame(query.all(), columns=cols)
+
 #-----------------------------------------------------------------------------
 # Cookbookish stuff
 # Every function should have a session as the first parameter.
@@ -320,13 +1042,14 @@ def count_by(session, item, by):
     item = normalize(item)
     by = normalize(by)
 
-    # only working one.
-    dispatch = {('player', 'game'): PlayerGame.account_id}  #,
-                # ('team', 'game'): TeamGame.team_id,
-                # ('player', 'team'): TeamPlayer.player_id}
-    selector = dispatch[(item, by)]
-    count = session.query(func.count(selector), selector).group_by(selector).\
-        order_by(func.count(selector)).all()
+    # read from the aggregate tables
+    dispatch = {('player', 'game'): PlayerStats,
+                ('team', 'game'): TeamStats,
+                ('hero', 'game'): HeroStats}
+    model = dispatch[(item, by)]
+    key = list(model.__table__.primary_key.columns)[0]
+    count = session.query(model.games, getattr(model, key.name)).\
+        order_by(model.games).all()
     count = pd.DataFrame(count, columns=[item, by])
     count = count.set_index(by)[item].value_counts()
     count.name = item
@@ -334,12 +1057,28 @@ def count_by(session, item, by):
 
 
 def count_player_games(session):
-    count = session.query(func.count(PlayerGame.account_id), PlayerGame.account_id).\
-        group_by(PlayerGame.account_id).\
-        order_by(func.count(PlayerGame.account_id)).all()
+    count = session.query(PlayerStats.games, PlayerStats.account_id).\
+        order_by(PlayerStats.games).all()
     return count
 
 
+def patch_ids(session, start='6.80', stop=None):
+    """
+    ``patch_id``s of the patches from ``start`` up to (not including)
+    ``stop``, or all later patches if ``stop`` is None.
+    """
+    known = session.query(Patch.name, Patch.patch_id).\
+        order_by(Patch.start_time).all()
+    names = [name for name, _ in known]
+    for patch in [start] + ([stop] if stop else []):
+        if patch not in names:
+            msg = "Expected one of {}. Got {} instead".format(names, patch)
+            raise KeyError(msg)
+    lo = names.index(start)
+    hi = names.index(stop) if stop else len(names)
+    return [patch_id for _, patch_id in known[lo:hi]]
+
+
 def filter_by_patch(session, start='6.80', stop=None):
     """
 
@@ -359,17 +1098,7 @@ def filter_by_patch(session, start='6.80', stop=None):
     Query
 
     """
-    cutoff_times = {'6.80': int(datetime(2014, 1, 29).strftime('%s')),
-                    '6.79': int(datetime(2013, 10, 1).strftime('%s')),
-                    '6.78': int(datetime(2013, 6, 4).strftime('%s'))}
-    try:
-        start_s = cutoff_times[start]
-    except KeyError:
-        msg = ("Expected one of {}. Got {} instead".format(cutoff_times.keys(),
-                                                           start))
-        raise KeyError(msg)
-    query = session.query(Game).filter(Game.start_time > start_s)
-    if stop:
-        stop_s = cutoff_times[stop]
-        query = query.filter(Game.start_time < stop_s)
-    return query
+    ids = patch_ids(session, start, stop)
+    if len(ids) == 1:
+        return session.query(Game).filter(Game.patch_id == ids[0])
+    return session.query(Game).filter(Game.patch_id.in_(ids))
@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+"""
+Lazily loaded static game data: heroes, abilities and items.
+
+Each table is built from one of the JSON files shipped with the package
+the first time it's asked for. The built tables are pickled to a cache
+directory (``$DOTA_CACHE_DIR``, default ``~/.cache/dota``) keyed by a hash
+of the source file, so later processes skip JSON parsing entirely and
+tables whose source isn't needed are never read.
+
+Examples
+--------
+>>> from dota import static
+>>> static.load('_hero_id_to_names')[1]
+'antimage'
+"""
+import os
+import json
+import pickle
+import hashlib
+import threading
+from os.path import dirname, abspath
+
+_DATA_DIR = dirname(abspath(__file__))
+
+SOURCES = {'heroes': _DATA_DIR + "/heroes_parsed.json",
+           'current_heroes': _DATA_DIR + "/current_heroes.json",
+           'abilities': _DATA_DIR + "/abilities_parsed.json",
+           'items': _DATA_DIR + "/items_parsed.json"}
+
+
+def _build_heroes(heroes):
+    hero_roles = {x: heroes[x].get('Role') for x in heroes}
+    hero_roles = {hero: role.split(',') for hero, role in hero_roles.items()
+                  if role is not None}  # drops base
+    return {'_heroes': heroes, '_hero_roles': hero_roles}
+
+
+def _build_current_heroes(current):
+    # updated hero list
+    d = current['heroes']
+    names_to_id = {x['name'].split('npc_dota_hero_')[1]: x['id'] for x in d}
+    id_to_names = {v: k for k, v in names_to_id.items()}
+    return {'_hero_names_to_id': names_to_id,
+            '_hero_id_to_names': id_to_names}
+
+
+def _build_abilities(abilities):
+    return {'_abilities': abilities,
+            '_ability_id_to_name': {v['ID']: k for k, v in abilities.items()},
+            '_ability_name_to_id': {k: v['ID'] for k, v in abilities.items()}}
+
+
+def _build_items(items):
+    return {'_items': items,
+            '_item_id_to_name': {v['ID']: k for k, v in items.items()},
+            '_item_name_to_id': {k: v['ID'] for k, v in items.items()}}
+
+
+_BUILDERS = {'heroes': _build_heroes,
+             'current_heroes': _build_current_heroes,
+             'abilities': _build_abilities,
+             'items': _build_items}
+
+# table name -> source it's built from
+TABLES = {'_heroes': 'heroes',
+          '_hero_roles': 'heroes',
+          '_hero_names_to_id': 'current_heroes',
+          '_hero_id_to_names': 'current_heroes',
+          '_abilities': 'abilities',
+          '_ability_id_to_name': 'abilities',
+          '_ability_name_to_id': 'abilities',
+          '_items': 'items',
+          '_item_id_to_name': 'items',
+          '_item_name_to_id': 'items'}
+
+_loaded = {}
+_lock = threading.Lock()
+
+
+def cache_dir():
+    return os.path.expanduser(os.environ.get('DOTA_CACHE_DIR',
+                                             '~/.cache/dota'))
+
+
+def _cache_path(source, raw):
+    digest = hashlib.sha1(raw).hexdigest()[:16]
+    return os.path.join(cache_dir(), '{}-{}.pkl'.format(source, digest))
+
+
+def _load_source(source):
+    with open(SOURCES[source], 'rb') as f:
+        raw = f.read()
+    path = _cache_path(source, raw)
+    try:
+        with open(path, 'rb') as f:
+            return pickle.load(f)
+    except (OSError, IOError, EOFError, pickle.UnpicklingError):
+        pass
+
+    tables = _BUILDERS[source](json.loads(raw.decode('utf-8')))
+    try:
+        os.makedirs(dirname(path), exist_ok=True)
+        tmp = path + '.{}.tmp'.format(os.getpid())
+        with open(tmp, 'wb') as f:
+            pickle.dump(tables, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+    except (OSError, IOError):  # read-only home; just don't cache
+        pass
+    return tables
+
+
+def load(name):
+    """
+    Get the static table ``name`` (one of ``TABLES``), loading its source
+    on first use.
+    """
+    try:
+        return _loaded[name]
+    except KeyError:
+        pass
+    source = TABLES[name]
+    with _lock:
+        if name not in _loaded:
+            _loaded.update(_load_source(source))
+    return _loaded[name]
+
+
+def loaded():
+    """
+    Names of the tables loaded so far.
+    """
+    return set(_loaded)
+
+
+def clear():
+    """
+    Forget loaded tables (the on-disk cache is kept).
+    """
+    with _lock:
+        _loaded.clear()
@@ -0,0 +1,611 @@
+# -*- coding: utf-8 -*-
+"""
+Hero pair statistics kept as dense count matrices.
+
+``SynergyMatrix`` counts, for every pair of heroes, the games they played
+on the same team and how many of those they won. ``MatchupMatrix`` counts
+the games hero A played against hero B and how many A won. Counts are
+kept per ``(patch, league)`` partition so queries can be restricted to
+either. The diagonal holds each hero's own games and wins.
+
+Matrices are updated incrementally from match responses, from the SQL
+database or from the HDF5 store, persisted with ``save`` / ``load``
+(``.npz``) and merged with ``+=``, e.g. from one matrix per worker
+process. Each match is only ever counted once.
+
+Examples
+--------
+>>> from dota.synergy import SynergyMatrix
+>>> sm = SynergyMatrix()
+>>> sm.update(resps)
+>>> sm.save('synergy.npz')
+>>> games, wins = sm.lookup([1, 1], [2, 5], patch='6.80')
+>>> sm.pairs(patch='6.80', min_games=20).head()
+>>> mm = MatchupMatrix.load('matchup.npz')
+>>> rate, low, high = mm.interval(hero_ids, enemy_ids, method='bayes')
+"""
+import abc
+from itertools import islice
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from dota import api, patches, registry
+
+TEAM_SIZE = 5
+UNKNOWN_PATCH = 'unknown'
+
+
+def _n_heroes():
+    return int(registry.heroes().ids_.max()) + 1
+
+
+#-----------------------------------------------------------------------------
+# Intervals
+
+
+def wilson_interval(wins, games, z=1.96):
+    """
+    Vectorized Wilson score interval for ``wins / games``. NaN where
+    ``games`` is 0.
+
+    Returns
+    -------
+    low, high : arrays
+    """
+    wins = np.asarray(wins, dtype=np.float64)
+    games = np.asarray(games, dtype=np.float64)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        p = wins / games
+        denom = 1 + z ** 2 / games
+        center = (p + z ** 2 / (2 * games)) / denom
+        half = z * np.sqrt(p * (1 - p) / games + z ** 2 /
+                           (4 * games ** 2)) / denom
+    empty = games == 0
+    return (np.where(empty, np.nan, np.clip(center - half, 0, 1)),
+            np.where(empty, np.nan, np.clip(center + half, 0, 1)))
+
+
+def beta_interval(wins, games, z=1.96, prior=(1, 1)):
+    """
+    Vectorized credible interval of the Beta posterior of the win rate,
+    with a ``Beta(*prior)`` prior: the posterior mean +- ``z`` posterior
+    standard deviations, clipped to [0, 1]. A normal approximation, close
+    to the exact quantiles once there are a few dozen games.
+
+    Returns
+    -------
+    mean, low, high : arrays
+        posterior mean and interval; the prior's where ``games`` is 0.
+    """
+    wins = np.asarray(wins, dtype=np.float64)
+    a = wins + prior[0]
+    b = np.asarray(games, dtype=np.float64) - wins + prior[1]
+    mean = a / (a + b)
+    sd = np.sqrt(a * b / ((a + b) ** 2 * (a + b + 1)))
+    return (mean, np.clip(mean - z * sd, 0, 1),
+            np.clip(mean + z * sd, 0, 1))
+
+#-----------------------------------------------------------------------------
+# Counting
+
+
+def _resp(game):
+    if isinstance(game, (dict, api.DetailsResponse)):
+        return api._as_resp(game)
+    return api.DetailsResponse.from_json(game).resp
+
+
+def _match_id(game):
+    if hasattr(game, 'stem'):  # Path or ArchiveEntry
+        return int(game.stem)
+    return int(_resp(game)['match_id'])
+
+
+def _build_chunk(args):
+    cls, n_heroes, games = args
+    out = cls(n_heroes)
+    out.update(_resp(g) for g in games)
+    return out
+
+
+def _teams(match_id, side, hero):
+    """
+    Group per-player arrays into teams.
+
+    Returns
+    -------
+    first : int array (n_teams,)
+        position of the first player of each team in the inputs.
+    heroes : int array (n_teams, 5)
+        hero ids, -1 for empty slots.
+    side : int array (n_teams,)
+    """
+    keys = np.asarray(match_id, dtype=np.int64) * 2 + side
+    order = np.argsort(keys, kind='mergesort')
+    sorted_keys = keys[order]
+    team_keys, starts, inverse = np.unique(sorted_keys, return_index=True,
+                                           return_inverse=True)
+    rank = np.arange(len(order)) - starts[inverse]
+    heroes = np.full((len(team_keys), TEAM_SIZE), -1, dtype=np.int64)
+    keep = rank < TEAM_SIZE
+    heroes[inverse[keep], rank[keep]] = np.asarray(hero)[order][keep]
+    return order[starts], heroes, team_keys % 2
+
+
+class HeroPairCounts(metaclass=abc.ABCMeta):
+    """
+    Base class: ``(n_heroes, n_heroes)`` game and win counts per
+    ``(patch, league)`` partition. Subclasses define which pairs a team
+    contributes in ``_count``.
+
+    Parameters
+    ----------
+    n_heroes : int, optional
+        initial matrix size. Defaults to the largest registered hero id
+        + 1; grows as needed.
+    """
+
+    kind = None
+
+    def __init__(self, n_heroes=None):
+        self.n_heroes = _n_heroes() if n_heroes is None else n_heroes
+        self.parts = {}  # (patch, league) -> [games, wins, n_matches]
+        self.match_ids = set()
+        self._totals = {}
+
+    def __repr__(self):
+        return "<{} of {} matches in {} partitions>".format(
+            type(self).__name__, len(self.match_ids), len(self.parts))
+
+    def __len__(self):
+        return len(self.match_ids)
+
+    def __contains__(self, match_id):
+        return int(match_id) in self.match_ids
+
+    #-------------------------------------------------------------------------
+    # Updating
+
+    def _grow(self, n_heroes):
+        if n_heroes <= self.n_heroes:
+            return
+        for part in self.parts.values():
+            for i in (0, 1):
+                grown = np.zeros((n_heroes, n_heroes), dtype=np.int64)
+                grown[:self.n_heroes, :self.n_heroes] = part[i]
+                part[i] = grown
+        self.n_heroes = n_heroes
+
+    def _part(self, key):
+        if key not in self.parts:
+            shape = (self.n_heroes, self.n_heroes)
+            self.parts[key] = [np.zeros(shape, dtype=np.int64),
+                               np.zeros(shape, dtype=np.int64), 0]
+        return self.parts[key]
+
+    def _bincount(self, a, b, mask):
+        flat = (a * self.n_heroes + b)[mask]
+        return np.bincount(flat, minlength=self.n_heroes ** 2).reshape(
+            self.n_heroes, self.n_heroes)
+
+    @abc.abstractmethod
+    def _count(self, heroes, won):
+        """
+        ``(games, wins)`` increments for teams ``heroes`` (n, 2, 5): both
+        teams of each of n matches, side 0 first. ``won`` (n, 2).
+        """
+
+    def update_arrays(self, match_id, side, hero, win, patch, league):
+        """
+        Add matches given as per-player arrays (one entry per player).
+        Matches already counted are skipped.
+
+        Parameters
+        ----------
+        match_id, hero : int arrays
+        side : int array
+            0 Radiant, 1 Dire.
+        win : bool array
+            whether the player's team won.
+        patch : str array
+        league : int array
+
+        Returns
+        -------
+        added : int
+            number of new matches.
+        """
+        match_id = np.asarray(match_id, dtype=np.int64)
+        new = ~np.isin(match_id, np.fromiter(self.match_ids, np.int64,
+                                             len(self.match_ids)))
+        if not new.any():
+            return 0
+        side = np.asarray(side, dtype=np.int64)[new]
+        hero = np.asarray(hero, dtype=np.int64)[new]
+        win = np.asarray(win, dtype=bool)[new]
+        patch = np.asarray(patch, dtype=object)[new]
+        league = np.asarray(league, dtype=np.int64)[new]
+        match_id = match_id[new]
+        hero = np.where(hero > 0, hero, -1)  # 0: no hero (abandons)
+        if len(hero) and hero.max() >= self.n_heroes:
+            self._grow(int(hero.max()) + 1)
+
+        first, teams, team_side = _teams(match_id, side, hero)
+        # pair the two teams of each match, radiant first; a match with a
+        # missing side gets an empty team there
+        team_match = match_id[first]
+        matches, m_index = np.unique(team_match, return_inverse=True)
+        heroes = np.full((len(matches), 2, TEAM_SIZE), -1, dtype=np.int64)
+        heroes[m_index, team_side] = teams
+        won = np.zeros((len(matches), 2), dtype=bool)
+        won[m_index, team_side] = win[first]
+        m_first = np.zeros(len(matches), dtype=np.int64)
+        m_first[m_index] = first
+        keys = pd.MultiIndex.from_arrays([patch[m_first], league[m_first]])
+        codes, uniques = pd.factorize(keys)
+
+        for code, key in enumerate(uniques):
+            sel = codes == code
+            games, wins = self._count(heroes[sel], won[sel])
+            part = self._part(tuple(key))
+            part[0] += games
+            part[1] += wins
+            part[2] += int(sel.sum())
+        self.match_ids.update(matches.tolist())
+        self._totals = {}
+        return len(matches)
+
+    def update(self, matches):
+        """
+        Add matches from GetMatchDetails responses (dicts or
+        ``DetailsResponse``s).
+
+        Returns
+        -------
+        added : int
+        """
+        resps = {}
+        for match in matches:
+            resp = api._as_resp(match)
+            if int(resp['match_id']) not in self.match_ids:
+                resps.setdefault(int(resp['match_id']), resp)
+        resps = list(resps.values())
+        if not resps:
+            return 0
+        cols = api.player_columns(resps, keys=['player_slot'])
+        n_players = [len(r['players']) for r in resps]
+        side = (cols['player_slot'] >= 128).astype(np.int64)
+        win = (side == 0) == cols['radiant_win']
+        patch = np.repeat(patches.label([r['start_time'] for r in resps],
+                                        default=UNKNOWN_PATCH), n_players)
+        league = np.repeat([int(r.get('leagueid', 0)) for r in resps],
+                           n_players)
+        return self.update_arrays(cols['match_id'], side, cols['hero_id'],
+                                  win, patch, league)
+
+    def update_from_frame(self, df):
+        """
+        Add matches from a frame with one row per player, like
+        ``json2hdf5.select_matches`` returns: ``match_id``, ``team`` (0
+        Radiant, 1 Dire), ``hero`` (id), ``win`` and ``start_time``, and
+        optionally ``league``.
+
+        Returns
+        -------
+        added : int
+        """
+        start = df['start_time']
+        if start.dtype.kind == 'M':
+            start = start.values.astype('datetime64[s]')
+        start = np.asarray(start, dtype=np.int64)
+        league = df['league'].values if 'league' in df else \
+            np.zeros(len(df), dtype=np.int64)
+        hero = df['hero'].fillna(-1).values
+        return self.update_arrays(df['match_id'].values, df['team'].values,
+                                  hero, df['win'].values,
+                                  patches.label(start, UNKNOWN_PATCH),
+                                  league)
+
+    def update_from_store(self, store, key='drs', **kwargs):
+        """
+        Add matches from the HDF5 store written by ``json2hdf5``.
+        ``kwargs`` are passed to ``json2hdf5.select_matches``, e.g.
+        ``time_range``.
+
+        Returns
+        -------
+        added : int
+        """
+        from dota.scripts.json2hdf5 import select_matches
+
+        columns = ['match_id', 'team', 'hero', 'win', 'start_time']
+        df = select_matches(store, columns=columns, key=key, **kwargs)
+        return self.update_from_frame(df)
+
+    def update_from_sql(self, session):
+        """
+        Add matches from the SQL database (``dota.sql.orm``). Only players
+        with public accounts are stored there, so pairs with a private
+        player are missing.
+
+        Returns
+        -------
+        added : int
+        """
+        from dota.sql.orm import Game, Patch, PlayerGame
+
+        rows = session.query(PlayerGame.match_id, PlayerGame.hero_id,
+                             PlayerGame.player_slot, Game.radiant_win,
+                             Patch.name, Game.leagueid).\
+            join(Game, PlayerGame.match_id == Game.match_id).\
+            outerjoin(Patch, Game.patch_id == Patch.patch_id).all()
+        if not rows:
+            return 0
+        df = pd.DataFrame(rows, columns=['match_id', 'hero_id',
+                                         'player_slot', 'radiant_win',
+                                         'patch', 'league'])
+        side = (df['player_slot'].values >= 128).astype(np.int64)
+        win = (side == 0) == df['radiant_win'].values.astype(bool)
+        return self.update_arrays(df['match_id'].values, side,
+                                  df['hero_id'].values, win,
+                                  df['patch'].fillna(UNKNOWN_PATCH).values,
+                                  pd.to_numeric(df['league']).fillna(0).values)
+
+    def update_games(self, games, chunksize=1000, n_jobs=1):
+        """
+        Add matches from Paths (or anything ``DetailsResponse.from_json``
+        takes), ``chunksize`` at a time. With ``n_jobs`` > 1 each chunk is
+        counted in a worker process and merged here.
+
+        Returns
+        -------
+        added : int
+        """
+        seen = set(self.match_ids)
+
+        def new(game):
+            match_id = _match_id(game)
+            if match_id in seen:
+                return False
+            seen.add(match_id)
+            return True
+
+        games = filter(new, games)
+        chunks = iter(lambda: list(islice(games, chunksize)), [])
+        n = 0
+        if n_jobs == 1:
+            for chunk in chunks:
+                n += self.update(_resp(g) for g in chunk)
+            return n
+        with ProcessPoolExecutor(n_jobs) as pool:
+            args = ((type(self), self.n_heroes, chunk) for chunk in chunks)
+            for part in pool.map(_build_chunk, args):
+                n += len(part)
+                self += part
+        return n
+
+    #-------------------------------------------------------------------------
+    # Merging and persistence
+
+    def __iadd__(self, other):
+        if type(other) is not type(self):
+            raise TypeError("Can't merge {} into {}".format(
+                type(other).__name__, type(self).__name__))
+        overlap = self.match_ids & other.match_ids
+        if overlap:
+            raise ValueError("{} matches are counted in both, e.g. {}".format(
+                len(overlap), min(overlap)))
+        self._grow(other.n_heroes)
+        n = other.n_heroes
+        for key, (games, wins, n_matches) in other.parts.items():
+            part = self._part(key)
+            part[0][:n, :n] += games
+            part[1][:n, :n] += wins
+            part[2] += n_matches
+        self.match_ids |= other.match_ids
+        self._totals = {}
+        return self
+
+    def __add__(self, other):
+        out = type(self)(self.n_heroes)
+        out += self
+        out += other
+        return out
+
+    def save(self, path):
+        """
+        Write to ``path`` as a compressed ``.npz``.
+        """
+        keys = sorted(self.parts)
+        arrays = {'kind': np.array(self.kind),
+                  'patches': np.array([k[0] for k in keys], dtype=str),
+                  'leagues': np.array([k[1] for k in keys], dtype=np.int64),
+                  'n_matches': np.array([self.parts[k][2] for k in keys],
+                                        dtype=np.int64),
+                  'match_ids': np.array(sorted(self.match_ids),
+                                        dtype=np.int64)}
+        if keys:
+            arrays['games'] = np.stack([self.parts[k][0] for k in keys])
+            arrays['wins'] = np.stack([self.parts[k][1] for k in keys])
+        np.savez_compressed(str(path), **arrays)
+
+    @classmethod
+    def load(cls, path, n_heroes=None):
+        with np.load(str(path), allow_pickle=False) as f:
+            if str(f['kind']) != cls.kind:
+                raise ValueError("{} holds a {} matrix, not {}".format(
+                    path, f['kind'], cls.kind))
+            out = cls(n_heroes=0)
+            out.match_ids = set(f['match_ids'].tolist())
+            keys = list(zip(f['patches'].tolist(), f['leagues'].tolist()))
+            if keys:
+                games, wins = f['games'], f['wins']
+                out.n_heroes = games.shape[1]
+                for i, key in enumerate(keys):
+                    out.parts[key] = [games[i].astype(np.int64),
+                                      wins[i].astype(np.int64),
+                                      int(f['n_matches'][i])]
+        out._grow(_n_heroes() if n_heroes is None else n_heroes)
+        return out
+
+    #-------------------------------------------------------------------------
+    # Queries
+
+    def keys(self, patch=None, league=None):
+        """
+        The ``(patch, league)`` partitions matching the filters. Either
+        may be a single value or a list.
+        """
+        def ok(value, allowed):
+            if allowed is None:
+                return True
+            if np.ndim(allowed) == 0:
+                allowed = [allowed]
+            return value in allowed
+        return [k for k in sorted(self.parts)
+                if ok(k[0], patch) and ok(k[1], league)]
+
+    def counts(self, patch=None, league=None):
+        """
+        ``(games, wins)`` matrices summed over the matching partitions.
+        Cached until the next update.
+        """
+        keys = tuple(self.keys(patch, league))
+        if keys not in self._totals:
+            games = np.zeros((self.n_heroes, self.n_heroes), dtype=np.int64)
+            wins = np.zeros_like(games)
+            for k in keys:
+                games += self.parts[k][0]
+                wins += self.parts[k][1]
+            self._totals[keys] = games, wins
+        return self._totals[keys]
+
+    def lookup(self, a, b, patch=None, league=None):
+        """
+        Vectorized ``(games, wins)`` of hero ids ``a`` with ``b``.
+        """
+        games, wins = self.counts(patch, league)
+        a, b = np.asarray(a), np.asarray(b)
+        return games[a, b], wins[a, b]
+
+    def win_rate(self, patch=None, league=None):
+        """
+        ``wins / games`` matrix, NaN where there are no games.
+        """
+        games, wins = self.counts(patch, league)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(games > 0, wins / games, np.nan)
+
+    def interval(self, a, b, patch=None, league=None, method='wilson',
+                 z=1.96, prior=(1, 1)):
+        """
+        Vectorized win rate of ``a`` with (or against) ``b`` and its
+        interval.
+
+        Parameters
+        ----------
+        a, b : int arrays
+            hero ids.
+        patch, league : optional
+            see ``keys``.
+        method : {'wilson', 'bayes'}
+            ``wilson_interval`` or ``beta_interval``. For 'bayes' the rate
+            is the posterior mean.
+        z : float
+            width, in standard normal quantiles.
+        prior : (alpha, beta)
+            Beta prior for 'bayes'.
+
+        Returns
+        -------
+        rate, low, high : arrays
+        """
+        games, wins = self.lookup(a, b, patch, league)
+        if method == 'wilson':
+            with np.errstate(invalid='ignore', divide='ignore'):
+                rate = np.where(games > 0, wins / games, np.nan)
+            return (rate,) + wilson_interval(wins, games, z)
+        elif method == 'bayes':
+            return beta_interval(wins, games, z, prior)
+        raise ValueError("method must be 'wilson' or 'bayes'")
+
+    def pairs(self, patch=None, league=None, min_games=1):
+        """
+        Long frame of hero pairs with at least ``min_games`` games:
+        ``hero_a``, ``hero_b`` (ids and names), ``games``, ``wins`` and
+        ``win_rate``.
+        """
+        games, wins = self.counts(patch, league)
+        a, b = np.nonzero(self._pair_mask() & (games >= max(min_games, 1)))
+        heroes = registry.heroes()
+        df = pd.DataFrame({'hero_a': a, 'hero_b': b,
+                           'name_a': heroes.names(a, default=str),
+                           'name_b': heroes.names(b, default=str),
+                           'games': games[a, b], 'wins': wins[a, b]},
+                          columns=['hero_a', 'hero_b', 'name_a', 'name_b',
+                                   'games', 'wins'])
+        df['win_rate'] = df['wins'] / df['games']
+        return df
+
+    def _pair_mask(self):
+        return np.ones((self.n_heroes, self.n_heroes), dtype=bool)
+
+
+class SynergyMatrix(HeroPairCounts):
+    """
+    Same-team hero pairs. ``games[a, b]`` counts matches where ``a`` and
+    ``b`` were teammates and ``wins[a, b]`` those they won; symmetric.
+    ``games[a, a]`` / ``wins[a, a]`` are hero ``a``'s own totals.
+    """
+
+    kind = 'synergy'
+
+    def _count(self, heroes, won):
+        teams = heroes.reshape(-1, TEAM_SIZE)
+        won = won.ravel()
+        a = teams[:, :, None]
+        b = teams[:, None, :]
+        valid = (a >= 0) & (b >= 0)
+        a, b = np.broadcast_arrays(a, b)
+        games = self._bincount(a, b, valid)
+        wins = self._bincount(a, b, valid & won[:, None, None])
+        return games, wins
+
+    def _pair_mask(self):
+        # each unordered pair once, without the diagonal
+        return np.triu(np.ones((self.n_heroes, self.n_heroes), dtype=bool),
+                       k=1)
+
+
+class MatchupMatrix(HeroPairCounts):
+    """
+    Opposing-team hero pairs. ``games[a, b]`` counts matches where ``a``
+    faced ``b`` and ``wins[a, b]`` those ``a`` won, so
+    ``wins[a, b] + wins[b, a] == games[a, b]``. ``games[a, a]`` /
+    ``wins[a, a]`` are hero ``a``'s own totals.
+    """
+
+    kind = 'matchup'
+
+    def _count(self, heroes, won):
+        # each side against the other: (n, 2, 5, 1) vs (n, 2, 1, 5)
+        a = heroes[:, :, :, None]
+        b = heroes[:, ::-1, None, :]
+        valid = (a >= 0) & (b >= 0)
+        a, b = np.broadcast_arrays(a, b)
+        games = self._bincount(a, b, valid)
+        wins = self._bincount(a, b, valid & won[:, :, None, None])
+
+        played = heroes >= 0
+        diag = np.arange(self.n_heroes)
+        games[diag, diag] += np.bincount(heroes[played],
+                                         minlength=self.n_heroes)
+        wins[diag, diag] += np.bincount(heroes[played & won[:, :, None]],
+                                        minlength=self.n_heroes)
+        return games, wins
+
+    def _pair_mask(self):
+        # ordered pairs: a vs b and b vs a are both listed
+        return ~np.eye(self.n_heroes, dtype=bool)
@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+"""
+A local stand-in for api.steampowered.com, for tests that exercise the
+network code without a key or a connection.
+"""
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from urllib.parse import urlparse, parse_qs
+
+
+class _Server(ThreadingMixIn, HTTPServer):
+    daemon_threads = True  # don't wait on idle keep-alive connections
+
+
+class FakeSteam:
+    """
+    Serve canned JSON on localhost.
+
+    Parameters
+    ----------
+    handler : callable
+        ``handler(path, params) -> (status, body)`` where params is a dict
+        of query parameters (single values) and body is JSON-serializable.
+
+    Attributes
+    ----------
+    url : str
+        base url of the server, e.g. ``http://127.0.0.1:12345``
+    requests : list
+        (path, params) of every request received.
+    """
+
+    def __init__(self, handler):
+        self.handler = handler
+        self.requests = []
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'  # keep-alive
+
+            def do_GET(self):
+                parsed = urlparse(self.path)
+                params = {k: v[0] for k, v in parse_qs(parsed.query).items()}
+                fake.requests.append((parsed.path, params))
+                status, body = fake.handler(parsed.path, params)
+                body = json.dumps(body).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = _Server(('127.0.0.1', 0), Handler)
+        self.url = 'http://127.0.0.1:{}'.format(self.server.server_port)
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self.server.shutdown()
+        self.server.server_close()
@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+"""
+Copies of the details_response.json fixture renumbered into distinct
+matches, for tests that need more than one game.
+"""
+import copy
+import json
+
+DETAILS = 'details_response.json'
+
+_details = None
+
+
+def details():
+    """
+    A fresh copy of the fixture's GetMatchDetails result.
+    """
+    global _details
+    if _details is None:
+        with open(DETAILS) as f:
+            _details = json.load(f)
+    return copy.deepcopy(_details)
+
+
+def fake_match(match_id, **fields):
+    """
+    The fixture as match ``match_id``, with the top-level ``fields``
+    replaced.
+    """
+    resp = details()
+    resp['match_id'] = match_id
+    resp.update(fields)
+    return resp
+
+
+def fake_matches(match_ids, **fields):
+    """
+    ``fake_match`` for each of ``match_ids``. Callable ``fields`` are
+    called with the match's position, e.g. ``radiant_win=lambda i: i % 2``.
+    """
+    return [fake_match(match_id, **{k: v(i) if callable(v) else v
+                                    for k, v in fields.items()})
+            for i, match_id in enumerate(match_ids)]
@@ -1,7 +1,10 @@
 # -*- coding: utf-8 -*-
 import os
+import copy
 import json
 import unittest
+import warnings
+from unittest.mock import MagicMock
 
 try:
     from io import StringIO
@@ -13,7 +16,13 @@ import pandas as pd
 import pandas.util.testing as tm
 from pandas.util.testing import network
 
-from dota.api import API, HistoryResponse, DetailsResponse
+from requests.exceptions import HTTPError
+
+from dota.api import (API, HistoryResponse, HistoryAccumulator,
+                      DetailsResponse, TokenBucket, match_reports,
+                      skill_builds)
+from fake_steam import FakeSteam
+from fixtures import fake_matches
 
 
 class TestAPI(unittest.TestCase):
@@ -51,6 +60,128 @@ class TestAPI(unittest.TestCase):
         self.assertEqual(team.team_id, TEAM)
 
 
+class TestSession(unittest.TestCase):
+
+    def setUp(self):
+        with open('details_response.json') as f:
+            self.details = json.load(f)
+        self.statuses = []
+
+    def handler(self, path, params):
+        status = self.statuses.pop(0) if self.statuses else 200
+        return status, {'result': self.details}
+
+    def test_pool_config(self):
+        h = API('fake', pool_size=4, retries=2)
+        adapter = h.session.get_adapter(API.MATCH_URL)
+        self.assertEqual(adapter._pool_maxsize, 4)
+        self.assertEqual(adapter.max_retries.total, 2)
+        self.assertIn(429, adapter.max_retries.status_forcelist)
+
+    def test_connection_reuse(self):
+        h = API('fake')
+        self.assertEqual(h.connection_stats(),
+                         {'requests': 0, 'connections': 0, 'reused': 0})
+        with FakeSteam(self.handler) as fake:
+            h.MATCH_URL = fake.url + '/match'
+            for i in range(3):
+                dr = h.get_match_details(547519680)
+        self.assertEqual(dr.match_id, 547519680)
+        self.assertEqual(fake.requests[0][1]['key'], 'fake')
+        self.assertEqual(h.connection_stats(),
+                         {'requests': 3, 'connections': 1, 'reused': 2})
+
+    def test_retry(self):
+        self.statuses = [503, 429]
+        h = API('fake', backoff_factor=0)
+        with FakeSteam(self.handler) as fake:
+            h.MATCH_URL = fake.url + '/match'
+            dr = h.get_match_details(547519680)
+        self.assertEqual(dr.match_id, 547519680)
+        self.assertEqual(len(fake.requests), 3)
+
+    def test_retries_exhausted(self):
+        self.statuses = [503] * 2
+        h = API('fake', retries=1, backoff_factor=0)
+        with FakeSteam(self.handler) as fake:
+            h.MATCH_URL = fake.url + '/match'
+            with self.assertRaises(HTTPError):
+                h.get_match_details(547519680)
+
+    def test_rate_includes_retries(self):
+        self.statuses = [503, 503]
+        h = API('fake', backoff_factor=0, rate=4)
+        now = [0]
+        slept = []
+
+        def sleep(t):
+            slept.append(t)
+            now[0] += t
+
+        h.bucket._clock = lambda: now[0]
+        h.bucket._sleep = sleep
+        h.bucket._last = 0
+        with FakeSteam(self.handler) as fake:
+            h.MATCH_URL = fake.url + '/match'
+            h.get_match_details(547519680)
+        self.assertEqual(len(fake.requests), 3)
+        # first attempt uses the initial token; both retries wait for one
+        self.assertEqual(slept, [.25, .25])
+
+    def test_retries_exhausted_429(self):
+        self.statuses = [429] * 2
+        h = API('fake', retries=1, backoff_factor=0)
+        with FakeSteam(self.handler) as fake:
+            h.MATCH_URL = fake.url + '/match'
+            with self.assertRaises(HTTPError):
+                h.get_match_details(547519680)
+        self.assertEqual(len(fake.requests), 2)
+
+
+class TestHistoryPaging(unittest.TestCase):
+
+    N = 60
+
+    def handler(self, path, params):
+        start = int(params.get('start_at_match_id', self.N))
+        ids = list(range(start, max(start - 25, 0), -1))
+        return 200, {'result': {'status': 1,
+                                'num_results': len(ids),
+                                'total_results': self.N,
+                                'results_remaining': max(start - 25, 0),
+                                'matches': [{'match_id': i} for i in ids]}}
+
+    def test_iter_history_pages(self):
+        h = API('fake')
+        with FakeSteam(self.handler) as fake:
+            h.HISTORY_URL = fake.url + '/history'
+            pages = h.iter_history_pages(account_id=1)
+            first = next(pages)
+            # lazy: only the first page has been requested
+            self.assertEqual(len(fake.requests), 1)
+            self.assertEqual(first.match_ids[0], self.N)
+            rest = list(pages)
+        self.assertEqual([len(p) for p in [first] + rest], [25, 25, 10])
+        self.assertEqual(fake.requests[1][1]['start_at_match_id'], '35')
+
+    def test_iter_matches(self):
+        h = API('fake')
+        with FakeSteam(self.handler) as fake:
+            h.HISTORY_URL = fake.url + '/history'
+            ids = [m['match_id'] for m in h.iter_matches(account_id=1)]
+        self.assertEqual(ids, list(range(self.N, 0, -1)))
+
+    def test_get_match_history(self):
+        h = API('fake')
+        with FakeSteam(self.handler) as fake:
+            h.HISTORY_URL = fake.url + '/history'
+            hist = h.get_match_history(account_id=1)
+        self.assertEqual(hist.match_ids, list(range(self.N, 0, -1)))
+        self.assertEqual(hist.num_results, self.N)
+        self.assertEqual(hist.results_remaining, 0)
+        self.assertIs(hist.helper, h)
+
+
 class TestHistoryResponse(unittest.TestCase):
 
     def setUp(self):
@@ -69,6 +200,65 @@ class TestHistoryResponse(unittest.TestCase):
     def test_len(self):
         self.assertEqual(len(self.hr), len(self.hr.match_ids))
 
+    def test_accumulator(self):
+        expected = self.hr + self.hr + self.hr
+        acc = HistoryAccumulator()
+        for i in range(3):
+            acc.add(self.hr)
+        result = acc.result()
+        self.assertEqual(result.match_ids, expected.match_ids)
+        self.assertEqual(result.num_results, expected.num_results)
+        self.assertEqual(result.total_results, expected.total_results)
+        self.assertEqual(result.results_remaining, expected.results_remaining)
+        self.assertEqual(result.status, expected.status)
+
+    def test_accumulator_empty(self):
+        with self.assertRaises(ValueError):
+            HistoryAccumulator().result()
+
+    def test_get_all_match_details_concurrent(self):
+        bad = self.hr.match_ids[0]
+
+        def get_match_details(match_id):
+            if match_id == bad:
+                raise HTTPError
+            return match_id
+
+        helper = MagicMock(get_match_details=get_match_details, bucket=None)
+        with warnings.catch_warnings(record=True) as w:
+            warnings.simplefilter('always')
+            result = self.hr.get_all_match_details(helper=helper, n_jobs=4,
+                                                   rate=1000)
+        expected = {k: k for k in self.hr.match_ids if k != bad}
+        self.assertEqual(result, expected)
+        self.assertEqual([str(x.message) for x in w],
+                         ["HTTPError on {}".format(bad)])
+
+    def test_get_all_match_details_cancels_on_error(self):
+        calls = []
+
+        def get_match_details(match_id):
+            calls.append(match_id)
+            raise KeyError(match_id)
+
+        helper = MagicMock(get_match_details=get_match_details, bucket=None)
+        with self.assertRaises(KeyError):
+            self.hr.get_all_match_details(helper=helper, n_jobs=1, rate=1000)
+        self.assertEqual(len(calls), 1)
+        calls[:] = []
+        with self.assertRaises(KeyError):
+            self.hr.get_all_match_details(helper=helper, n_jobs=2, rate=20)
+        self.assertLess(len(calls), len(self.hr.match_ids))
+
+    def test_get_all_match_details_two_buckets(self):
+        helper = MagicMock(bucket=TokenBucket(10))
+        with self.assertRaises(ValueError):
+            self.hr.get_all_match_details(helper=helper, bucket=TokenBucket(5))
+
+    def test_get_all_match_details_needs_helper(self):
+        with self.assertRaises(ValueError):
+            self.hr.get_all_match_details()
+
     # def test_to_json(self):
 
     #     d = {1234: DetailsResponse({'radiant_win': True,
@@ -84,12 +274,58 @@ class TestHistoryResponse(unittest.TestCase):
     #     os.remove(test_to_json.json)
 
 
+class TestTokenBucket(unittest.TestCase):
+
+    def setUp(self):
+        self.now = 0
+        self.slept = []
+
+        def sleep(t):
+            self.slept.append(t)
+            self.now += t
+
+        self.bucket = TokenBucket(4, clock=lambda: self.now, sleep=sleep)
+
+    def test_acquire(self):
+        for i in range(3):
+            self.bucket.acquire()
+        self.assertEqual(self.slept, [.25, .25])
+
+    def test_refill_capped(self):
+        self.bucket.acquire()
+        self.now += 10
+        self.bucket.acquire()
+        self.bucket.acquire()
+        self.assertEqual(self.slept, [.25])
+
+    def test_bad_rate(self):
+        with self.assertRaises(ValueError):
+            TokenBucket(0)
+
+
 class TestDetailsResponse(unittest.TestCase):
 
     def setUp(self):
         with open('details_response.json') as f:
             self.dr = DetailsResponse(json.load(f))
 
+    def test_lazy(self):
+        self.assertFalse(hasattr(self.dr, '__dict__'))
+        self.assertIs(self.dr.start_time, self.dr.start_time)
+        self.assertIs(self.dr.hero_id_to_names,
+                      DetailsResponse(self.dr.resp).hero_id_to_names)
+        self.assertIsNone(self.dr.picks_bans)
+        self.assertEqual(self.dr.league_id, 0)
+
+    def test_private_account_id(self):
+        resp = {'radiant_win': True, 'match_id': 1,
+                'players': [{'account_id': 4294967295, 'player_slot': 0},
+                            {'account_id': 2, 'player_slot': 128}]}
+        dr = DetailsResponse(resp)
+        self.assertTrue(pd.isnull(dr.player_ids['radiant'][0]))
+        self.assertEqual(dr.player_ids['dire'], [2])
+        self.assertTrue(pd.isnull(dr.resp['players'][0]['account_id']))
+
     def test_match_report(self):
         result = self.dr.match_report().iloc[:2]
         d = {'gold': {(547519680, 'Dire', 'bounty_hunter'): 16, (547519680, 'Dire', 'crystal_maiden'): 1626},
@@ -117,6 +353,42 @@ class TestDetailsResponse(unittest.TestCase):
         expected = result.reindex_axis(result.columns, axis=1)
         tm.assert_frame_equal(result, expected)
 
+    def test_match_reports(self):
+        resps = fake_matches([3, 2, 1], radiant_win=lambda i: bool(i % 2))
+        expected = pd.concat([DetailsResponse(copy.deepcopy(r))
+                              .match_report() for r in resps]).sort_index()
+        tm.assert_frame_equal(match_reports(resps), expected)
+        result = match_reports([DetailsResponse(r) for r in resps])
+        tm.assert_frame_equal(result, expected)
+
+    def test_skill_build(self):
+        player = self.dr.resp['players'][0]
+        name = self.dr.hero_id_to_names[player['hero_id']]
+        result = self.dr.skill_build(name)
+        self.assertEqual(list(result.columns), ['ability', 'level', 'time'])
+        self.assertEqual(list(result.level),
+                         [u['level'] for u in player['ability_upgrades']])
+        tm.assert_frame_equal(self.dr.skill_build(player['hero_id']), result)
+
+        everyone = self.dr.skill_build('all')
+        n = sum(len(p['ability_upgrades']) for p in self.dr.resp['players'])
+        self.assertEqual(len(everyone), n)
+        self.assertEqual(everyone.hero.nunique(), 10)
+
+    def test_skill_builds(self):
+        result = skill_builds(fake_matches([2, 1]))
+        self.assertEqual(len(result), 2 * len(self.dr.skill_build('all')))
+        self.assertEqual(result.match_id.iloc[0], 1)
+        self.assertTrue(result.groupby(['match_id', 'hero_id'])['level'].apply(
+            lambda x: x.is_monotonic_increasing).all())
+        # private accounts are NaN
+        private = [p['hero_id'] for p in self.dr.resp['players']
+                   if pd.isnull(p['account_id'])]
+        self.assertTrue(private)
+        is_private = result.hero_id.isin(private)
+        self.assertTrue(result.loc[is_private, 'account_id'].isnull().all())
+        self.assertTrue(result.loc[~is_private, 'account_id'].notnull().all())
+
     def test_format_df(self):
         data = [{'hero_damage': 26610,
                  'denies': 20,
@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+import json
+import pickle
+import pathlib
+import shutil
+import tempfile
+import unittest
+
+from dota.api import DetailsResponse
+from dota.archive import MatchArchive, is_archive, pack
+from dota.helpers import cached_games, match_writer
+from fixtures import fake_match
+
+
+class TestArchive(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = pathlib.Path(tempfile.mkdtemp())
+        self.path = self.dir / 'archive'
+
+    def tearDown(self):
+        shutil.rmtree(str(self.dir))
+
+    def test_append_get(self):
+        a = MatchArchive(self.path, segment_bytes=1)
+        self.assertTrue(is_archive(self.path))
+        self.assertEqual(a.extend(fake_match(i) for i in [3, 1, 2]), 3)
+        self.assertFalse(a.append(fake_match(1)))
+        self.assertEqual(len(a), 3)
+        self.assertIn(2, a)
+        self.assertEqual(a.get(2)['match_id'], 2)
+        # one record per segment with a 1 byte budget
+        self.assertEqual(len(list(self.path.glob('segment-*.dat'))), 3)
+
+        # reopened from the index
+        a = MatchArchive(self.path)
+        self.assertEqual(a.get(1)['match_id'], 1)
+        self.assertEqual([m for m, resp in a], [3, 1, 2])
+
+    def test_torn_index(self):
+        a = MatchArchive(self.path)
+        a.append(fake_match(1))
+        with (self.path / 'index.txt').open('a') as f:
+            f.write('2 0 ')
+        self.assertEqual(MatchArchive(self.path).match_ids(), [1])
+
+    def test_append_after_crash(self):
+        a = MatchArchive(self.path)
+        a.append(fake_match(1))
+        a.append(fake_match(2))
+        index = self.path / 'index.txt'
+        text = index.read_text()
+        index.write_text(text[:-3])  # crash while writing match 2's line
+
+        a = MatchArchive(self.path)
+        self.assertEqual(a.match_ids(), [1])
+        self.assertTrue(a.append(fake_match(3)))
+        self.assertTrue(index.read_text().endswith('\n'))
+        a = MatchArchive(self.path)
+        self.assertEqual(sorted(a.match_ids()), [1, 3])
+        self.assertEqual(a.get(3)['match_id'], 3)
+
+    def test_index_past_segment_end(self):
+        a = MatchArchive(self.path)
+        a.append(fake_match(1))
+        # the index line made it to disk, the record didn't
+        with (self.path / 'index.txt').open('a') as f:
+            f.write('2 0 {} 100\n'.format(a.entry(1).length))
+        a = MatchArchive(self.path)
+        self.assertEqual(a.match_ids(), [1])
+        a.append(fake_match(2))
+        self.assertEqual(MatchArchive(self.path).get(2)['match_id'], 2)
+
+    def test_cached_games(self):
+        a = MatchArchive(self.path)
+        a.extend(fake_match(i) for i in [1, 2])
+        entries = list(cached_games(self.path))
+        self.assertEqual(sorted(int(x.stem) for x in entries), [1, 2])
+        dr = DetailsResponse.from_json(entries[0])
+        self.assertEqual(dr.match_id, int(entries[0].stem))
+        # picklable, for process pools
+        entry = pickle.loads(pickle.dumps(entries[1]))
+        self.assertEqual(entry.load()['match_id'], 2)
+
+    def test_match_writer(self):
+        MatchArchive(self.path)
+        match_writer(self.path)(fake_match(5))
+        self.assertIn(5, MatchArchive(self.path))
+
+        match_writer(self.dir)(fake_match(6))
+        self.assertTrue((self.dir / '6.json').exists())
+
+    def test_pack(self):
+        for i in [1, 2]:
+            with (self.dir / '{}.json'.format(i)).open('w') as f:
+                json.dump(fake_match(i), f)
+        a = pack(self.dir, self.path)
+        self.assertEqual(sorted(a.match_ids()), [1, 2])
@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+import json
+import shutil
+import pathlib
+import tempfile
+import threading
+import unittest
+
+from dota.api import API
+from dota.cache import ResponseCache
+from fake_steam import FakeSteam
+
+URL = 'https://example.com/GetMatchDetails/'
+
+
+class TestResponseCache(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_get_set(self):
+        c = ResponseCache(self.dir)
+        self.assertIsNone(c.get(URL, {'match_id': 1}))
+        c.set(URL, {'match_id': 1, 'key': 'a'}, {'match_id': 1})
+        # api key isn't part of the cache key
+        self.assertEqual(c.get(URL, {'match_id': 1, 'key': 'b'}),
+                         {'match_id': 1})
+        self.assertEqual((c.hits, c.misses), (1, 1))
+        self.assertIn((URL, {'match_id': 1}), c)
+
+    def test_immutable(self):
+        c = ResponseCache(self.dir)
+        c.set(URL, {'match_id': 1}, {'a': 1})
+        c.set(URL, {'match_id': 1}, {'a': 2})
+        self.assertEqual(c.get(URL, {'match_id': 1}), {'a': 1})
+
+    def test_concurrent_set(self):
+        c = ResponseCache(self.dir)
+        barrier = threading.Barrier(8)
+
+        def set_():
+            barrier.wait()
+            c.set(URL, {'match_id': 1}, {'a': 1})
+
+        threads = [threading.Thread(target=set_) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(len(c), 1)
+        self.assertEqual(c.nbytes, len(json.dumps({'a': 1})))
+        self.assertEqual([p.suffix for p in pathlib.Path(self.dir).iterdir()],
+                         ['.json'])
+
+    def test_persistent(self):
+        ResponseCache(self.dir).set(URL, {'match_id': 1}, {'a': 1})
+        c = ResponseCache(self.dir)
+        self.assertEqual(len(c), 1)
+        self.assertEqual(c.get(URL, {'match_id': 1}), {'a': 1})
+
+    def test_lru_eviction(self):
+        size = len(json.dumps({'a': 1}))
+        c = ResponseCache(self.dir, max_bytes=2 * size)
+        c.set(URL, {'match_id': 1}, {'a': 1})
+        c.set(URL, {'match_id': 2}, {'a': 2})
+        c.get(URL, {'match_id': 1})  # 2 is now least recently used
+        c.set(URL, {'match_id': 3}, {'a': 3})
+        self.assertEqual(len(c), 2)
+        self.assertIsNone(c.get(URL, {'match_id': 2}))
+        self.assertEqual(c.get(URL, {'match_id': 1}), {'a': 1})
+        self.assertLessEqual(c.nbytes, c.max_bytes)
+
+
+class TestAPICache(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        with open('details_response.json') as f:
+            self.details = json.load(f)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_get_match_details_cached(self):
+        def handler(path, params):
+            if params['match_id'] == '1':
+                return 200, {'result': {'error': 'Match ID not found'}}
+            return 200, {'result': self.details}
+
+        h = API('fake', cache=self.dir)
+        with FakeSteam(handler) as fake:
+            h.MATCH_URL = fake.url + '/match'
+            for i in range(2):
+                dr = h.get_match_details(547519680)
+            self.assertEqual(dr.match_id, 547519680)
+            self.assertEqual(len(fake.requests), 1)
+            # errors aren't cached
+            for i in range(2):
+                with self.assertRaises(KeyError):
+                    h.get_match_details(1)
+            self.assertEqual(len(fake.requests), 3)
+        self.assertEqual(h.cache.hits, 1)
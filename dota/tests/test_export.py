@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+import json
+import pathlib
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from dota import export, patches
+import fixtures
+
+try:
+    import pyarrow  # noqa
+except ImportError:
+    pyarrow = None
+
+
+def fake_match(match_id, start_time, leagueid=0):
+    picks_bans = [{'is_pick': i % 2 == 0, 'hero_id': i + 1, 'team': i % 2,
+                   'order': i} for i in range(20)]
+    return fixtures.fake_match(match_id, start_time=start_time,
+                               leagueid=leagueid, picks_bans=picks_bans)
+
+
+class TestPatches(unittest.TestCase):
+
+    def test_label(self):
+        times = [1, 1370322000, 1380603599, 1393904594]
+        result = patches.label(times, default='unknown')
+        self.assertEqual(list(result), ['unknown', '6.78', '6.78', '6.80'])
+
+
+@unittest.skipIf(pyarrow is None, "requires pyarrow")
+class TestExport(unittest.TestCase):
+
+    def setUp(self):
+        self.root = pathlib.Path(tempfile.mkdtemp())
+        # two 6.79 matches (one in league 5), two 6.80
+        self.matches = [fake_match(1, 1385000000), fake_match(2, 1385000000, 5),
+                        fake_match(3, 1393904594), fake_match(4, 1393904594)]
+
+    def tearDown(self):
+        shutil.rmtree(str(self.root))
+
+    def test_partitions(self):
+        n = export.export(self.matches, self.root, verbose=False)
+        self.assertEqual(n, 4)
+        parts = [(p, l) for p, l, _ in export.partitions(self.root, 'games')]
+        self.assertEqual(parts, [('6.79', 0), ('6.79', 5), ('6.80', 0)])
+
+        games = export.read(self.root, 'games')
+        self.assertEqual(sorted(games.match_id), [1, 2, 3, 4])
+        pg = export.read(self.root, 'player_games')
+        self.assertEqual(len(pg), 40)
+        pb = export.read(self.root, 'picks_bans')
+        self.assertEqual(len(pb), 80)
+
+    def test_pruning(self):
+        export.export(self.matches, self.root, verbose=False)
+        result = export.read(self.root, 'player_games',
+                             columns=['match_id', 'kills', 'patch'],
+                             patches=['6.80'])
+        self.assertEqual(list(result.columns), ['match_id', 'kills', 'patch'])
+        self.assertEqual(sorted(result.match_id.unique()), [3, 4])
+        self.assertTrue((result.patch == '6.80').all())
+
+        result = export.read(self.root, 'games', columns=['match_id'],
+                             leagues=[5])
+        self.assertEqual(list(result.match_id), [2])
+
+    def test_append(self):
+        export.export(self.matches[:3], self.root, verbose=False)
+        n = export.export(self.matches, self.root, verbose=False)
+        self.assertEqual(n, 1)
+        self.assertEqual(sorted(export.read(self.root, 'games').match_id),
+                         [1, 2, 3, 4])
+        files = list((self.root / 'games').glob('patch=6.80/league=0/*'))
+        self.assertEqual(len(files), 2)
+
+    def test_crash_mid_chunk(self):
+        stage = export._stage_partitions
+
+        def crash_on_games(df, root, table, format):
+            if table == 'games':
+                raise KeyboardInterrupt
+            return stage(df, root, table, format)
+
+        with patch.object(export, '_stage_partitions', crash_on_games):
+            with self.assertRaises(KeyboardInterrupt):
+                export.export(self.matches, self.root, verbose=False)
+        self.assertEqual(export.exported_match_ids(self.root), set())
+        self.assertEqual(len(export.read(self.root, 'player_games')), 0)
+
+        self.assertEqual(export.export(self.matches, self.root,
+                                       verbose=False), 4)
+        self.assertEqual(len(export.read(self.root, 'player_games')), 40)
+        self.assertEqual(list(self.root.glob('*/*/*/' + export.TMP_PREFIX +
+                                             '*')), [])
+
+    def test_skips_exported_files(self):
+        data = pathlib.Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, str(data))
+        paths = []
+        for m in self.matches:
+            path = data / 'details{}.json'.format(m['match_id'])
+            with path.open('w') as f:
+                json.dump(m, f)
+            paths.append(path)
+        export.export(paths[:2], self.root, verbose=False)
+        with patch.object(export, '_resp', wraps=export._resp) as resp:
+            self.assertEqual(export.export(paths, self.root,
+                                           verbose=False), 2)
+        self.assertEqual(resp.call_count, 2)
+
+    def test_feather(self):
+        export.export(self.matches, self.root, format='feather',
+                      verbose=False)
+        result = export.read(self.root, 'player_games')
+        expected = export.player_games_frame(self.matches)
+        self.assertEqual(sorted(result.match_id), sorted(expected.match_id))
@@ -1,10 +1,14 @@
 # -*- coding: utf-8 -*-
 
 from pathlib import Path
+import os
+import shutil
+import tempfile
 import unittest
+from unittest import mock
 import io
 
-from dota.helpers import cached_games, open_or_stringIO
+from dota.helpers import CachedGames, cached_games, open_or_stringIO
 
 
 class TestHelpers(unittest.TestCase):
@@ -33,3 +37,71 @@ class TestHelpers(unittest.TestCase):
 
         stringobj = open_or_stringIO("1234.json", as_string=True)
         self.assertIsInstance(stringobj, io.StringIO)
+
+
+class TestCachedGames(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = Path(tempfile.mkdtemp())
+        for name in ['1234.json', 'details12345678.json', 'notes.txt']:
+            (self.dir / name).touch()
+
+    def tearDown(self):
+        shutil.rmtree(str(self.dir))
+
+    def test_contains(self):
+        cached = CachedGames(self.dir)
+        self.assertEqual(len(cached), 2)
+        self.assertIn(1234, cached)
+        self.assertIn('12345678', cached)
+        self.assertNotIn(5678, cached)
+        self.assertEqual(sorted(cached), [1234, 12345678])
+        self.assertEqual(cached.paths(),
+                         sorted(cached_games(self.dir)))
+        self.assertEqual(cached.path(1234), self.dir / '1234.json')
+
+    def test_persisted(self):
+        CachedGames(self.dir)
+        self.assertTrue((self.dir / CachedGames.FILENAME).exists())
+        # unchanged directory: loaded without listing it
+        with mock.patch('os.listdir', side_effect=AssertionError):
+            cached = CachedGames(self.dir)
+        self.assertEqual(sorted(cached), [1234, 12345678])
+
+    def test_refresh(self):
+        cached = CachedGames(self.dir)
+        (self.dir / '99.json').touch()
+        (self.dir / '1234.json').unlink()
+        self.assertEqual(cached.refresh(), 1)
+        self.assertEqual(sorted(cached), [99, 12345678])
+        self.assertEqual(sorted(CachedGames(self.dir)), [99, 12345678])
+
+    def test_file_added_while_listing(self):
+        listdir = os.listdir
+
+        def listdir_then_add(path):
+            names = listdir(path)
+            (self.dir / '77.json').touch()
+            return names
+
+        with mock.patch('os.listdir', side_effect=listdir_then_add):
+            cached = CachedGames(self.dir)
+        self.assertNotIn(77, cached)
+        self.assertIn(77, CachedGames(self.dir))
+
+    def test_names_sharing_an_id(self):
+        (self.dir / '1234.json').touch()
+        (self.dir / 'match1234.json').touch()
+        cached = CachedGames(self.dir)
+        (self.dir / '1234.json').unlink()
+        cached.refresh()
+        self.assertEqual(cached.path(1234), self.dir / 'match1234.json')
+        (self.dir / 'match1234.json').unlink()
+        cached.refresh()
+        self.assertNotIn(1234, cached)
+        self.assertEqual(sorted(cached), [12345678])
+
+    def test_torn_manifest(self):
+        with (self.dir / CachedGames.FILENAME).open('w') as f:
+            f.write('{"mtime_ns": ')
+        self.assertEqual(len(CachedGames(self.dir)), 2)
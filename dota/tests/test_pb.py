@@ -63,3 +63,99 @@ class TestExtraction(unittest.TestCase):
         bad = pd.concat([bad, self.df])
         result = h.pb_only_complete_drafts(bad)
         tm.assert_frame_equal(result, self.df, check_dtype=False)
+
+
+class TestDraftMatrix(unittest.TestCase):
+
+    def setUp(self):
+        pbs = ([False] * 4 + [True] * 4 + [False] * 4
+               + [True] * 4 + [False] * 2 + [True] * 2)
+        team = np.array([0, 1, 0, 1, 0, 1, 1, 0, 0, 1,
+                         0, 1, 1, 0, 1, 0, 1, 0, 1, 0])
+        one = pd.DataFrame({'hero_id_f': range(20), 'is_pick': pbs,
+                            'order': range(20), 'team': team,
+                            'team_id_f': team + 5, 'match_id': 1})
+        two = one.copy()
+        two['match_id'] = 2
+        two['hero_id_f'] = 19 - two['hero_id_f']
+        two['team_id_f'] = 6 - team  # side 0 is team 6 this time
+        # shuffled rows, partial third draft
+        third = one.iloc[:5].copy()
+        third['match_id'] = 0
+        self.drafts = [one, two]
+        self.df = pd.concat([two, third, one]).sample(frac=1, random_state=0)
+        self.dm = h.DraftMatrix.from_frame(self.df)
+
+    def test_arrays(self):
+        dm = self.dm
+        self.assertEqual(dm.heroes.shape, (3, 20))
+        tm.assert_numpy_array_equal(dm.match_ids, np.array([0, 1, 2]))
+        tm.assert_numpy_array_equal(dm.heroes[1], np.arange(20))
+        tm.assert_numpy_array_equal(dm.heroes[0, 5:], np.full(15, -1))
+        tm.assert_numpy_array_equal(dm.is_pick[1],
+                                    self.drafts[0].is_pick.values)
+        tm.assert_numpy_array_equal(dm.complete,
+                                    np.array([False, True, True]))
+
+    def test_matches_per_order_helpers(self):
+        opp = self.dm.opponent_ids()
+        prev = self.dm.previous()
+        for row, df in zip([1, 2], self.drafts):
+            for order in range(20):
+                self.assertEqual(opp[row, order],
+                                 h.pb_opponent_id(df, order=order))
+                self.assertEqual(self.dm.team_ids[row, order],
+                                 h.pb_team_id(df, order=order))
+                expected = h.pb_previous_pbs(df, order).values.ravel()
+                tm.assert_numpy_array_equal(prev[row, order, :order],
+                                            expected.astype(np.int64))
+                self.assertTrue((prev[row, order, order:] == -1).all())
+
+    def test_previous_onehot(self):
+        onehot = self.dm.previous_onehot(20)
+        self.assertEqual(onehot.shape, (3, 20, 20))
+        self.assertFalse(onehot[:, 0].any())
+        # draft 1 picks hero k at order k
+        tm.assert_numpy_array_equal(onehot[1, 7],
+                                    np.arange(20) < 7)
+        self.assertEqual(onehot[0, 19].sum(), 5)
+
+    def test_to_frame(self):
+        df = self.dm.to_frame()
+        self.assertEqual(len(df), 60)
+        row = df.loc[(2, 3)]
+        self.assertEqual(row['hero'], 16)
+        self.assertEqual(row['pb_0'], 19)
+        self.assertEqual(row['pb_3'], -1)
+
+
+class TestDraftReport(unittest.TestCase):
+
+    def setUp(self):
+        team = np.array([0, 1] * 10)
+        good = pd.DataFrame({'match_id': 1, 'order': range(20),
+                             'team_id': team.astype(float),
+                             'hero_id': range(20)})
+        short = good.iloc[:12].copy()
+        short['match_id'] = 2
+        missing = good.copy()
+        missing['match_id'] = 3
+        missing.loc[[2, 5], 'team_id'] = np.nan
+        dupes = good.copy()
+        dupes['match_id'] = 4
+        dupes.loc[19, 'order'] = 18
+        self.df = pd.concat([missing, good, dupes, short], ignore_index=True)
+
+    def test_report(self):
+        report = h.pb_draft_report(self.df)
+        self.assertEqual(list(report.index), [1, 2, 3, 4])
+        self.assertEqual(report.picks_bans.tolist(), [20, 12, 20, 20])
+        self.assertEqual(report.missing_team_id.tolist(), [0, 0, 2, 0])
+        self.assertEqual(report.duplicate_orders.tolist(), [0, 0, 0, 1])
+        self.assertEqual(report.complete.tolist(), [True, False, False,
+                                                    False])
+
+    def test_filter_matches_report(self):
+        result = h.pb_only_complete_drafts(self.df)
+        self.assertEqual(result.match_id.unique().tolist(), [1])
+        tm.assert_frame_equal(result, self.df[self.df.match_id == 1])
@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+import unittest
+
+import numpy as np
+from numpy import nan
+import numpy.testing as npt
+
+from dota import registry
+from dota.registry import Registry
+
+
+class TestRegistry(unittest.TestCase):
+
+    def setUp(self):
+        self.r = Registry([3, 1], ['c', 'a'], {'cost': [30, 10],
+                                               'kind': ['x', 'y']})
+
+    def test_names(self):
+        result = self.r.names([[1, 3], [2, 99]])
+        expected = np.array([['a', 'c'], [None, None]], dtype=object)
+        npt.assert_array_equal(result, expected)
+        npt.assert_array_equal(self.r.names([1, 99, -1], default=str),
+                               np.array(['a', '99', '-1'], dtype=object))
+        npt.assert_array_equal(self.r.names([1., nan]),
+                               np.array(['a', None], dtype=object))
+
+    def test_ids(self):
+        npt.assert_array_equal(self.r.ids(['c', 'b', 'a']), [3, -1, 1])
+
+    def test_attribute(self):
+        npt.assert_array_equal(self.r.attribute('cost', [3, 0, 1]),
+                               [30, nan, 10])
+        npt.assert_array_equal(self.r.attribute('kind', [1, 5]),
+                               np.array(['y', None], dtype=object))
+
+    def test_scalar(self):
+        self.assertEqual(self.r[3], 'c')
+        self.assertIn(1, self.r)
+        self.assertNotIn(2, self.r)
+        with self.assertRaises(KeyError):
+            self.r[2]
+
+    def test_to_frame(self):
+        df = self.r.to_frame()
+        self.assertEqual(df.index.tolist(), [1, 3])
+        self.assertEqual(df['name'].tolist(), ['a', 'c'])
+
+
+class TestStaticRegistries(unittest.TestCase):
+
+    def test_heroes(self):
+        heroes = registry.heroes()
+        self.assertIs(heroes, registry.heroes())
+        npt.assert_array_equal(heroes.names([1, 2]), ['antimage', 'axe'])
+        npt.assert_array_equal(heroes.ids(['axe']), [2])
+        self.assertEqual(heroes.attribute('attack_type', [1])[0], 'melee')
+        self.assertIn('Carry', heroes.attribute('roles', [1])[0])
+
+    def test_items(self):
+        items = registry.items()
+        self.assertEqual(items[1], 'blink')
+        self.assertEqual(items.attribute('cost', [1])[0], 2150)
+
+    def test_abilities(self):
+        self.assertEqual(registry.abilities()[5004], 'antimage_blink')
@@ -1,5 +1,9 @@
 # -*- coding: utf-8 -*-
+import copy
+import json
 import pathlib
+import shutil
+import tempfile
 import unittest
 from unittest.mock import patch
 from os.path import expanduser
@@ -17,8 +21,13 @@ import pandas as pd
 from pandas import Timestamp
 import pandas.util.testing as tm
 
+from dota import registry
 from dota.api import API, HistoryResponse, DetailsResponse
 from dota.scripts import get_details_by_id
+from dota.scripts import crawl_sequence
+from dota.sql import orm
+from fake_steam import FakeSteam
+from fixtures import fake_matches
 import dota.scripts.parsers as p
 import dota.scripts.json2hdf5 as h5
 
@@ -75,10 +84,67 @@ class TestGetByID(unittest.TestCase):
     def tearDown(self):
         pathlib.Path('details12345678.json').unlink()
         pathlib.Path('1234.json').unlink()
-        try:
-            pathlib.Path('12345.json').unlink()
-        except FileNotFoundError:
-            pass
+        for name in ['12345.json', '.manifest.json']:
+            try:
+                pathlib.Path(name).unlink()
+            except FileNotFoundError:
+                pass
+
+
+class TestCrawlSequence(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = pathlib.Path(tempfile.mkdtemp())
+        self.matches = fake_matches(range(100, 105),
+                                    match_seq_num=lambda i: 10 + i,
+                                    leagueid=lambda i: i % 2)
+
+    def tearDown(self):
+        shutil.rmtree(str(self.dir))
+
+    def handler(self, path, params):
+        start = int(params['start_at_match_seq_num'])
+        n = int(params['matches_requested'])
+        matches = [m for m in self.matches if m['match_seq_num'] >= start]
+        return 200, {'result': {'status': 1, 'matches': matches[:n]}}
+
+    def test_crawl(self):
+        engine = orm.make_engine('sqlite:///' + str(self.dir / 'pro.db'))
+        h = API('fake')
+        with FakeSteam(self.handler) as fake:
+            h.SEQUENCE_URL = fake.url + '/seq'
+            result = crawl_sequence.crawl(h, self.dir, engine=engine,
+                                          start=10, n_batches=1,
+                                          batch_size=2)
+            self.assertEqual(result, 12)
+            self.assertEqual(crawl_sequence.load_checkpoint(
+                self.dir / 'seq_checkpoint.json'), 12)
+            # resumes from the checkpoint, skips non-league games
+            result = crawl_sequence.crawl(h, self.dir, engine=engine,
+                                          batch_size=2,
+                                          keep=lambda m: m['leagueid'] != 0)
+        self.assertEqual(result, 15)
+        self.assertEqual([p['start_at_match_seq_num']
+                          for _, p in fake.requests], ['10', '12', '14', '15'])
+        self.assertEqual(sorted(int(p.stem) for p in self.dir.glob('1*.json')),
+                         [100, 101, 103])
+        self.assertEqual(crawl_sequence.max_stored_seq_num(engine), 13)
+
+    def test_resume_from_db(self):
+        engine = orm.make_engine('sqlite:///' + str(self.dir / 'pro.db'))
+        h = API('fake')
+        with FakeSteam(self.handler) as fake:
+            h.SEQUENCE_URL = fake.url + '/seq'
+            crawl_sequence.crawl(h, self.dir, engine=engine, start=10,
+                                 n_batches=1, batch_size=3)
+            (self.dir / 'seq_checkpoint.json').unlink()
+            result = crawl_sequence.crawl(h, self.dir, engine=engine)
+        self.assertEqual(result, 15)
+        self.assertEqual(fake.requests[1][1]['start_at_match_seq_num'], '13')
+
+    def test_needs_start(self):
+        with self.assertRaises(ValueError):
+            crawl_sequence.crawl(API('fake'), self.dir)
 
 
 # class TestGetProMatches(unittest.TestCase):
@@ -216,10 +282,10 @@ class TestHDF5(unittest.TestCase):
                  'assists': {0: 5, 5: 14},
                  'radiant_team_id': {0: None, 5: None},
                  'gold_spent': {0: 12185, 5: 11910},
-                 'tower_status': {0: nan, 5: nan},
+                 'tower_status': {0: 260., 5: 1844.},
                  'level': {0: 16, 5: 20},
-                 'start_time': {0: Timestamp('2014-03-04 03:43:14'),
-                                5: Timestamp('2014-03-04 03:43:14')},
+                 'start_time': {0: Timestamp('2014-03-04 03:43:14', tz='UTC'),
+                                5: Timestamp('2014-03-04 03:43:14', tz='UTC')},
                  'hero': {0: 62, 5: 102},
                  'player_slot': {0: 128, 5: 2},
                  'win': {0: False, 5: True},
@@ -231,9 +297,128 @@ class TestHDF5(unittest.TestCase):
                  'item_3': {0: 185, 5: 0},
                  'last_hits': {0: 56, 5: 67},
                  'denies': {0: 1, 5: 7},
-                 'barracks_status': {0: nan, 5: nan},
+                 'barracks_status': {0: 51., 5: 63.},
                  'gold': {0: 16, 5: 3527}}
 
         expected = pd.DataFrame(_data).sort_index(axis=1)
         result = h5.format_df(self.dr).sort_index(axis=1).loc[[0, 5]]
         tm.assert_frame_equal(result, expected)
+
+    def test_format_dfs(self):
+        resps = fake_matches([1, 2, 3], radiant_win=lambda i: bool(i % 2))
+        expected = pd.concat([h5.format_df(DetailsResponse(r)) for r in
+                              copy.deepcopy(resps)],
+                             ignore_index=True)
+        result = h5.format_dfs(resps)
+        tm.assert_frame_equal(result, expected, check_like=True)
+        self.assertTrue((result.start_time ==
+                         pd.Timestamp('2014-03-04 03:43:14', tz='UTC')).all())
+        self.assertEqual(sorted(result.tower_status.unique()), [260, 1844])
+
+    def test_convert(self):
+        tmp = pathlib.Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, str(tmp))
+        games = fake_matches(range(1, 6))
+        for resp in games:
+            with (tmp / '{}.json'.format(resp['match_id'])).open('w') as f:
+                json.dump(resp, f)
+        store = str(tmp / 'pro.h5')
+
+        self.assertEqual(h5.stored_match_ids(store), set())
+        paths = sorted(tmp.glob('*.json'))
+        n = h5.convert(paths, store, chunksize=2, verbose=False)
+        self.assertEqual(n, 5)
+        self.assertEqual(h5.stored_match_ids(store), {1, 2, 3, 4, 5})
+
+        result = pd.read_hdf(store, 'drs')
+        self.assertEqual(len(result), 50)
+        expected = h5.format_dfs(games)
+        tm.assert_series_equal(result['match_id'].reset_index(drop=True),
+                               expected['match_id'])
+
+    def test_convert_parallel(self):
+        tmp = pathlib.Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, str(tmp))
+        for resp in fake_matches(range(1, 8),
+                                 radiant_win=lambda i: bool(i % 2)):
+            with (tmp / '{}.json'.format(resp['match_id'])).open('w') as f:
+                json.dump(resp, f)
+        paths = sorted(tmp.glob('*.json'))
+
+        serial, parallel = str(tmp / 'serial.h5'), str(tmp / 'parallel.h5')
+        h5.convert(paths, serial, chunksize=2, verbose=False)
+        n = h5.convert(paths, parallel, chunksize=2, verbose=False, n_jobs=2)
+        self.assertEqual(n, 7)
+        tm.assert_frame_equal(pd.read_hdf(parallel, 'drs'),
+                              pd.read_hdf(serial, 'drs'))
+
+    def test_select_matches(self):
+        tmp = pathlib.Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, str(tmp))
+        start = self.dr.resp['start_time']
+        resps = fake_matches(range(1, 5),
+                             start_time=lambda i: start + i * 86400)
+        store = str(tmp / 'pro.h5')
+        h5.append_to_store(store, [h5.format_dfs(resps[:2])])
+        h5.append_to_store(store, [h5.format_dfs(resps[2:])])
+
+        with pd.HDFStore(store) as s:
+            self.assertEqual(sorted(s.get_storer('drs').data_columns),
+                             sorted(h5.DATA_COLUMNS))
+
+        result = h5.select_matches(store, hero=registry.heroes()[62])
+        self.assertEqual(len(result), 4)
+        self.assertTrue((result.hero == 62).all())
+
+        result = h5.select_matches(store, hero=[62, 102], team=0,
+                                   time_range=('2014-03-05', None),
+                                   columns=['match_id', 'hero', 'team'])
+        self.assertEqual(sorted(result.match_id.unique()), [2, 3, 4])
+        self.assertEqual(list(result.columns), ['match_id', 'hero', 'team'])
+        self.assertTrue(result.hero.isin([62, 102]).all())
+        self.assertTrue((result.team == 0).all())
+
+        result = h5.select_matches(store, match_id=[1, 4],
+                                   time_range=(None, '2014-03-05'))
+        self.assertEqual(list(result.match_id.unique()), [1])
+
+    def test_select_many_ids(self):
+        tmp = pathlib.Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, str(tmp))
+        resps = fake_matches(range(1, 151))
+        store = str(tmp / 'pro.h5')
+        h5.append_to_store(store, [h5.format_dfs(resps)])
+
+        ids = list(range(1, 301, 2))
+        result = h5.select_matches(store, match_id=ids,
+                                   columns=['match_id'])
+        self.assertEqual(sorted(result.match_id.unique()),
+                         list(range(1, 151, 2)))
+        result = h5.select_matches(store, match_id=range(40),
+                                   account_id=[82787032, 64741364],
+                                   hero=list(range(1, 120)))
+        self.assertEqual(len(result), 39 * 2)
+
+    def test_append_to_legacy_store(self):
+        tmp = pathlib.Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, str(tmp))
+        resps = fake_matches([1, 2, 3])
+        store = str(tmp / 'pro.h5')
+        # what append_to_store wrote before data columns: hero as int
+        legacy = h5.format_df(DetailsResponse(resps[0]))
+        cols = ['radiant_team_id', 'dire_team_id', 'account_id']
+        legacy[cols] = legacy[cols].astype(float)
+        legacy.to_hdf(store, key='drs', append=True)
+        self.assertTrue(h5.needs_migration(store))
+
+        h5.append_to_store(store, [h5.format_dfs(resps[1:2])])
+        self.assertEqual(h5.stored_match_ids(store), {1, 2})
+        with self.assertRaises(ValueError):
+            h5.select_matches(store, hero=62)
+
+        h5.migrate_store(store)
+        self.assertFalse(h5.needs_migration(store))
+        h5.append_to_store(store, [h5.format_dfs(resps[2:])])
+        result = h5.select_matches(store, hero=62)
+        self.assertEqual(sorted(result.match_id), [1, 2, 3])
+        self.assertEqual(h5.stored_match_ids(store), {1, 2, 3})
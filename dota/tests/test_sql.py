@@ -1,10 +1,17 @@
 # -*- coding: utf-8 -*-
+import json
+import pathlib
+import shutil
+import tempfile
 import unittest
 
+import sqlalchemy
 from sqlalchemy.orm import sessionmaker
+import pandas.util.testing as tm
 
 from dota.sql.orm import Game, Player, PlayerGame, Team
 from dota.sql import orm
+import fixtures
 
 
 class TestORM(unittest.TestCase):
@@ -46,10 +53,192 @@ class TestORM(unittest.TestCase):
                                      stop='6.80').all()
         self.assertEqual(len(result), 1)
 
+    def test_filter_by_patch_uses_patch_id(self):
+        game = fake_game(match_id=2, start_time=1390975201)
+        self.assertEqual(game.patch_id, 3)
+        self.session.add(game)
+        query = str(orm.filter_by_patch(self.session).statement)
+        self.assertIn('games.patch_id =', query)
+        self.assertNotIn('start_time', query.split('WHERE')[1])
+        with self.assertRaises(KeyError):
+            orm.filter_by_patch(self.session, start='6.81')
+
     def tearDown(self):
         self.session.close()
 
 
+def fake_matches(n=3):
+    """
+    Copies of the details_response.json fixture with distinct match ids.
+    Matches alternate between two teams.
+    """
+    matches = fixtures.fake_matches(
+        range(1, n + 1), match_seq_num=lambda i: i + 1,
+        radiant_team_id=lambda i: 10 + i % 2,
+        radiant_name=lambda i: 'team{}'.format(10 + i % 2),
+        dire_team_id=20, dire_name='team20')
+    for m in matches:
+        for i, p in enumerate(m['players']):
+            p['account_id'] = 1000 + i
+        m['players'][1]['account_id'] = 4294967295  # private
+    return matches
+
+
+class TestBulk(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = pathlib.Path(tempfile.mkdtemp())
+        self.engine = orm.make_engine('sqlite:///' + str(self.dir / 'a.db'))
+        self.matches = fake_matches()
+        self.paths = []
+        for m in self.matches:
+            path = self.dir / '{}.json'.format(m['match_id'])
+            with path.open('w') as f:
+                json.dump(m, f)
+            self.paths.append(path)
+
+    def tearDown(self):
+        self.engine.dispose()
+        shutil.rmtree(str(self.dir))
+
+    def counts(self, engine):
+        session = sessionmaker(bind=engine)()
+        result = {model.__tablename__: session.query(model).count()
+                  for model in [Game, Player, PlayerGame, Team,
+                                orm.TeamPlayer, orm.AbilityUpgrade]}
+        session.close()
+        return result
+
+    def test_bulk_add_to_db(self):
+        stats = orm.bulk_add_to_db(self.engine, self.paths, batch_size=2,
+                                   verbose=False)
+        self.assertEqual(stats['games'], 3)
+        expected = {'games': 3, 'players': 9, 'playergames': 27,
+                    'teams': 3, 'teamplayers': 13,
+                    'ability_upgrades': 3 * 194}
+        self.assertEqual(self.counts(self.engine), expected)
+        self.assertEqual(stats['rows'], sum(expected.values()))
+
+        # idempotent
+        stats = orm.bulk_add_to_db(self.engine, self.matches, verbose=False)
+        self.assertEqual(stats['rows'], 0)
+        self.assertEqual(self.counts(self.engine), expected)
+
+    def test_parallel_decode(self):
+        stats = orm.bulk_add_to_db(self.engine, self.paths, n_jobs=2,
+                                   chunksize=1, verbose=False)
+        self.assertEqual(stats['games'], 3)
+        other = orm.make_engine('sqlite:///' + str(self.dir / 'b.db'))
+        orm.bulk_add_to_db(other, self.paths, verbose=False)
+        self.assertEqual(self.counts(self.engine), self.counts(other))
+        other.dispose()
+
+    def test_update_db(self):
+        engine, session = orm.update_db(self.dir, n_jobs=2)
+        self.assertEqual(session.query(Game).count(), 3)
+        session.close()
+        engine.dispose()
+
+    def test_indexes(self):
+        inspector = sqlalchemy.inspect(self.engine)
+        names = {ix['name'] for ix in inspector.get_indexes('playergames')}
+        self.assertIn('ix_playergames_hero_id_match_id', names)
+        self.assertIn('ix_playergames_account_id_match_id', names)
+        self.assertEqual(orm.create_indexes(self.engine), [])
+
+    def test_create_indexes_migration(self):
+        orm.bulk_add_to_db(self.engine, self.paths, verbose=False)
+        orm.drop_indexes(self.engine)
+        inspector = sqlalchemy.inspect(self.engine)
+        self.assertEqual(inspector.get_indexes('games'), [])
+
+        created = orm.create_indexes(self.engine)
+        self.assertIn('ix_games_start_time', created)
+        self.assertEqual(sorted(created),
+                         sorted(ix.name for t in orm.Base.metadata.sorted_tables
+                                for ix in t.indexes))
+        plan = self.engine.execute(
+            'EXPLAIN QUERY PLAN SELECT match_id FROM playergames '
+            'WHERE hero_id = 62').fetchall()
+        self.assertIn('ix_playergames_hero_id_match_id', str(plan))
+
+    def stats(self, engine):
+        session = sessionmaker(bind=engine)()
+        result = {name: orm._stats_frame(session, model, key)
+                  for name, model, key in
+                  [('heroes', orm.HeroStats, 'hero_id'),
+                   ('players', orm.PlayerStats, 'account_id'),
+                   ('teams', orm.TeamStats, 'team_id')]}
+        session.close()
+        return result
+
+    def assert_stats_equal(self, a, b):
+        for name in a:
+            tm.assert_frame_equal(a[name], b[name])
+
+    def test_stats(self):
+        orm.bulk_add_to_db(self.engine, self.paths[:2], verbose=False)
+        orm.bulk_add_to_db(self.engine, self.paths, verbose=False)
+        stats = self.stats(self.engine)
+        # 9 public players in each of 3 matches
+        self.assertEqual(stats['players'].games.tolist(), [3] * 9)
+        self.assertEqual(stats['heroes'].games.sum(), 27)
+        self.assertEqual(stats['teams'].games.to_dict(), {10: 2, 11: 1,
+                                                           20: 3})
+        # the fixture is a radiant win
+        self.assertEqual(stats['teams'].wins.to_dict(), {10: 2, 11: 1,
+                                                          20: 0})
+
+        orm.rebuild_stats(self.engine)
+        self.assert_stats_equal(self.stats(self.engine), stats)
+
+        other = orm.make_engine('sqlite:///' + str(self.dir / 'b.db'))
+        orm.add_to_db(other, self.paths).close()
+        self.assert_stats_equal(self.stats(other), stats)
+        other.dispose()
+
+        session = sessionmaker(bind=self.engine)()
+        counts = orm.count_player_games(session)
+        self.assertEqual(sorted(counts), sorted(
+            (3, a) for a in stats['players'].index))
+        self.assertEqual(orm.count_by(session, 'player', 'game').to_dict(),
+                         {3: 9})
+        session.close()
+
+    def test_patch_migration(self):
+        orm.bulk_add_to_db(self.engine, self.paths, verbose=False)
+        self.engine.execute('update games set patch_id = null')
+        self.engine.execute('delete from patches')
+        self.engine.dispose()
+        engine = orm.make_engine('sqlite:///' + str(self.dir / 'a.db'))
+        self.assertEqual(engine.execute(
+            'select distinct patch_id from games').fetchall(), [(3,)])
+        self.assertEqual(engine.execute(
+            'select name from patches order by start_time').fetchall(),
+            [('6.78',), ('6.79',), ('6.80',)])
+
+        session = sessionmaker(bind=engine)()
+        self.assertEqual(orm.filter_by_patch(session, '6.80').count(), 3)
+        self.assertEqual(orm.filter_by_patch(session, '6.78',
+                                             '6.80').count(), 0)
+        by_patch = orm.hero_stats(session, patch='6.80')
+        tm.assert_frame_equal(by_patch, orm.hero_stats(session))
+        self.assertEqual(len(orm.hero_stats(session, patch='6.79')), 0)
+        session.close()
+        engine.dispose()
+
+    def test_same_as_add_to_db(self):
+        orm.bulk_add_to_db(self.engine, self.paths, verbose=False)
+        other = orm.make_engine('sqlite:///' + str(self.dir / 'b.db'))
+        orm.add_to_db(other, self.paths).close()
+        for table in ['games', 'playergames', 'players', 'teams',
+                      'ability_upgrades']:
+            q = 'select * from {} order by 1, 2'.format(table)
+            self.assertEqual(self.engine.execute(q).fetchall(),
+                             other.execute(q).fetchall())
+        other.dispose()
+
+
 def fake_playergame(**kwargs):
     d = {'match_id': 1,
          'account_id': 1,
@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+import os
+import shutil
+import tempfile
+import unittest
+
+from dota import static
+import dota.api as api
+
+
+class TestStatic(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self._env = os.environ.get('DOTA_CACHE_DIR')
+        os.environ['DOTA_CACHE_DIR'] = self.dir
+        static.clear()
+
+    def tearDown(self):
+        static.clear()
+        if self._env is None:
+            del os.environ['DOTA_CACHE_DIR']
+        else:
+            os.environ['DOTA_CACHE_DIR'] = self._env
+        shutil.rmtree(self.dir)
+
+    def test_lazy(self):
+        self.assertEqual(static.loaded(), set())
+        self.assertEqual(static.load('_hero_id_to_names')[1], 'antimage')
+        # only the tables built from current_heroes.json
+        self.assertEqual(static.loaded(),
+                         {'_hero_names_to_id', '_hero_id_to_names'})
+
+    def test_compiled_cache(self):
+        expected = static.load('_item_id_to_name')
+        self.assertEqual(len(os.listdir(self.dir)), 1)
+        static.clear()
+        static._BUILDERS['items'], builder = None, static._BUILDERS['items']
+        try:
+            # served from the pickle, the builder isn't called
+            self.assertEqual(static.load('_item_id_to_name'), expected)
+        finally:
+            static._BUILDERS['items'] = builder
+
+    def test_module_attribute(self):
+        self.assertIs(api._hero_roles, static.load('_hero_roles'))
+        with self.assertRaises(AttributeError):
+            api._not_a_table
+
+    def test_unknown(self):
+        with self.assertRaises(KeyError):
+            static.load('_nope')
@@ -0,0 +1,218 @@
+# -*- coding: utf-8 -*-
+import json
+import pathlib
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+from sqlalchemy.orm import sessionmaker
+
+from dota import synergy
+from dota.synergy import HeroPairCounts, MatchupMatrix, SynergyMatrix
+from dota.scripts import json2hdf5 as h5
+from dota.sql import orm
+from fixtures import fake_match
+
+class TestSynergyMatrix(unittest.TestCase):
+
+    def setUp(self):
+        self.sm = SynergyMatrix()
+        self.sm.update([fake_match(1), fake_match(2, radiant_win=False),
+                        fake_match(3, start_time=1380603600, leagueid=7)])
+
+    def test_update(self):
+        sm = self.sm
+        self.assertEqual(len(sm), 3)
+        self.assertEqual(sorted(sm.keys()), [('6.79', 7), ('6.80', 0)])
+        games, wins = sm.counts()
+        np.testing.assert_array_equal(games, games.T)
+        self.assertEqual(games[35, 11], 3)
+        self.assertEqual(wins[35, 11], 2)
+        self.assertEqual(games[62, 42], 3)
+        self.assertEqual(wins[62, 42], 1)
+        self.assertEqual(games[35, 62], 0)
+        self.assertEqual(games[35, 35], 3)
+        # 10 heroes, 3 matches: 3 * (2 * 5 * 5) ordered pairs incl. self
+        self.assertEqual(games.sum(), 150)
+
+        games, wins = sm.lookup([35, 62], [11, 39], patch='6.80')
+        np.testing.assert_array_equal(games, [2, 2])
+        np.testing.assert_array_equal(wins, [1, 1])
+        games, _ = sm.lookup(35, 11, league=7)
+        self.assertEqual(games, 1)
+
+    def test_base_is_abstract(self):
+        with self.assertRaises(TypeError):
+            HeroPairCounts()
+
+    def test_update_skips_counted(self):
+        self.assertEqual(self.sm.update([fake_match(1), fake_match(4)]), 1)
+        self.assertEqual(self.sm.counts()[0][35, 11], 4)
+        self.assertEqual(self.sm.update([fake_match(4)]), 0)
+
+    def test_win_rate_and_pairs(self):
+        rate = self.sm.win_rate(patch='6.80')
+        self.assertEqual(rate[35, 11], .5)
+        self.assertTrue(np.isnan(rate[35, 62]))
+
+        pairs = self.sm.pairs()
+        self.assertEqual(len(pairs), 2 * 10)
+        self.assertTrue((pairs.hero_a < pairs.hero_b).all())
+        self.assertEqual(pairs.games.sum(), 60)
+        self.assertEqual(len(self.sm.pairs(min_games=4)), 0)
+
+    def test_merge(self):
+        other = SynergyMatrix(n_heroes=10)
+        other.update([fake_match(4)])
+        self.assertGreater(other.n_heroes, 10)
+        merged = self.sm + other
+        self.assertEqual(len(merged), 4)
+        self.assertEqual(merged.counts()[0][35, 11], 4)
+        self.assertEqual(self.sm.counts()[0][35, 11], 3)
+
+        self.sm += other
+        self.assertEqual(len(self.sm), 4)
+        with self.assertRaises(ValueError):
+            self.sm += other
+
+    def test_save_load(self):
+        tmp = pathlib.Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, str(tmp))
+        path = tmp / 'synergy.npz'
+        self.sm.save(path)
+        loaded = SynergyMatrix.load(path)
+        self.assertEqual(loaded.match_ids, self.sm.match_ids)
+        self.assertEqual(sorted(loaded.parts), sorted(self.sm.parts))
+        for key, (games, wins, n) in self.sm.parts.items():
+            np.testing.assert_array_equal(loaded.parts[key][0], games)
+            np.testing.assert_array_equal(loaded.parts[key][1], wins)
+            self.assertEqual(loaded.parts[key][2], n)
+        self.assertEqual(loaded.update([fake_match(1)]), 0)
+
+        SynergyMatrix().save(tmp / 'empty.npz')
+        self.assertEqual(len(SynergyMatrix.load(tmp / 'empty.npz')), 0)
+
+    def test_update_games(self):
+        tmp = pathlib.Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, str(tmp))
+        paths = []
+        for i in range(1, 6):
+            path = tmp / '{}.json'.format(i)
+            with path.open('w') as f:
+                json.dump(fake_match(i, radiant_win=i % 2 == 0), f)
+            paths.append(path)
+        serial = SynergyMatrix()
+        self.assertEqual(serial.update_games(paths + paths[:1],
+                                             chunksize=2), 5)
+        parallel = SynergyMatrix()
+        parallel.update([fake_match(1, radiant_win=False)])
+        self.assertEqual(parallel.update_games(paths, chunksize=2,
+                                               n_jobs=2), 4)
+        self.assertEqual(parallel.match_ids, serial.match_ids)
+        for a, b in zip(parallel.counts(), serial.counts()):
+            np.testing.assert_array_equal(a, b)
+
+    def test_from_store(self):
+        tmp = pathlib.Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, str(tmp))
+        store = str(tmp / 'pro.h5')
+        h5.append_to_store(store, [h5.format_dfs(
+            [fake_match(1), fake_match(2, radiant_win=False)])])
+        sm = SynergyMatrix()
+        self.assertEqual(sm.update_from_store(store), 2)
+        np.testing.assert_array_equal(sm.counts(patch='6.80')[0],
+                                      self.sm.counts(patch='6.80')[0])
+        np.testing.assert_array_equal(sm.counts(patch='6.80')[1],
+                                      self.sm.counts(patch='6.80')[1])
+
+    def test_from_sql(self):
+        engine = orm.make_engine('sqlite:///:memory:')
+        orm.bulk_add_to_db(engine, [fake_match(1), fake_match(2)],
+                           verbose=False)
+        session = sessionmaker(bind=engine)()
+        sm = SynergyMatrix()
+        self.assertEqual(sm.update_from_sql(session), 2)
+        self.assertEqual(sm.keys(), [('6.80', 0)])
+        games, wins = sm.counts()
+        # only public accounts are stored
+        self.assertEqual(games[62, 39], 2)
+        self.assertEqual(wins[62, 39], 0)
+        self.assertEqual(games[35, 11], 0)
+        session.close()
+
+
+class TestMatchupMatrix(unittest.TestCase):
+
+    def setUp(self):
+        self.mm = MatchupMatrix()
+        self.mm.update([fake_match(1), fake_match(2, radiant_win=False),
+                        fake_match(3, radiant_win=False, leagueid=7)])
+
+    def test_update(self):
+        games, wins = self.mm.counts()
+        self.assertEqual(games[35, 62], 3)
+        self.assertEqual(wins[35, 62], 1)
+        self.assertEqual(wins[62, 35], 2)
+        np.testing.assert_array_equal(games, games.T)
+        off = ~np.eye(len(games), dtype=bool)
+        np.testing.assert_array_equal((wins + wins.T)[off], games[off])
+        self.assertEqual(games[35, 11], 0)  # teammates
+        self.assertEqual(games[35, 35], 3)
+        self.assertEqual(wins[35, 35], 1)
+        # 3 matches * 2 sides * 25 opponents + 3 * 10 own games
+        self.assertEqual(games.sum(), 180)
+
+        games, wins = self.mm.lookup([62, 35], [35, 62], league=0)
+        np.testing.assert_array_equal(games, [2, 2])
+        np.testing.assert_array_equal(wins, [1, 1])
+
+    def test_pairs(self):
+        pairs = self.mm.pairs()
+        self.assertEqual(len(pairs), 2 * 25)
+        self.assertEqual(pairs.wins.sum(), 75)
+
+    def test_interval(self):
+        rate, low, high = self.mm.interval([62, 35, 1], [35, 62, 2])
+        np.testing.assert_allclose(rate[:2], [2 / 3, 1 / 3])
+        self.assertTrue(((low[:2] < rate[:2]) & (rate[:2] < high[:2])).all())
+        self.assertTrue(np.isnan(rate[2]) and np.isnan(low[2]))
+
+        mean, low, high = self.mm.interval([62, 1], [35, 2], method='bayes')
+        np.testing.assert_allclose(mean, [.6, .5])
+        self.assertTrue(((0 <= low) & (low < mean) & (mean < high) &
+                         (high <= 1)).all())
+        with self.assertRaises(ValueError):
+            self.mm.interval(1, 2, method='frequentist')
+
+    def test_wilson_interval(self):
+        low, high = synergy.wilson_interval([50, 0], [100, 10])
+        np.testing.assert_allclose([low[0], high[0]], [.4038, .5962],
+                                   atol=1e-4)
+        self.assertEqual(low[1], 0)
+        self.assertGreater(high[1], 0)
+
+    def test_beta_interval(self):
+        mean, low, high = synergy.beta_interval([2, 0, 50], [3, 0, 100])
+        # Beta(3, 2): mean .6, sd .2; Beta(1, 1): sd 1 / sqrt(12)
+        np.testing.assert_allclose(mean, [.6, .5, .5])
+        np.testing.assert_allclose(low, [.6 - 1.96 * .2, 0,
+                                         .5 - 1.96 * .5 / np.sqrt(103)])
+        np.testing.assert_allclose(high, [.6 + 1.96 * .2, 1,
+                                          .5 + 1.96 * .5 / np.sqrt(103)])
+        mean, low, high = synergy.beta_interval(2, 3, z=1, prior=(2, 2))
+        np.testing.assert_allclose([mean, low, high],
+                                   [4 / 7, 4 / 7 - np.sqrt(12 / 392),
+                                    4 / 7 + np.sqrt(12 / 392)])
+
+    def test_save_load(self):
+        tmp = pathlib.Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, str(tmp))
+        self.mm.save(tmp / 'matchup.npz')
+        loaded = MatchupMatrix.load(tmp / 'matchup.npz')
+        for a, b in zip(loaded.counts(), self.mm.counts()):
+            np.testing.assert_array_equal(a, b)
+        with self.assertRaises(ValueError):
+            SynergyMatrix.load(tmp / 'matchup.npz')
+        with self.assertRaises(TypeError):
+            SynergyMatrix().__iadd__(self.mm)